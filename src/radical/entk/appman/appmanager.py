@@ -4,20 +4,23 @@ __author__    = 'Vivek Balasubramanian <vivek.balasubramaniana@rutgers.edu>'
 __license__   = 'MIT'
 
 import os
-import json
 import pika
 import time
 
+import functools     as ft
 import threading     as mt
 
 import radical.utils as ru
 
 from .. import exceptions as ree
+from .. import states
 
 from ..pipeline    import Pipeline
-from ..task        import Task
 from ..utils       import write_session_description
 from ..utils       import write_workflows
+from ..utils       import mq_utils
+from ..utils       import serializer
+from ..execman     import transport
 
 from .wfprocessor  import WFprocessor
 
@@ -101,6 +104,10 @@ class AppManager(object):
         self._prof   = ru.Profiler(name=name, path=path)
         self._report = ru.Reporter(name=name)
 
+        if self._serializer == 'msgpack' and not serializer.msgpack:
+            self._logger.warning('msgpack not available, using json')
+            self._serializer = 'json'
+
         self._report.info('EnTK session: %s\n' % self._sid)
         self._report.info('Creating AppManager')
         self._prof.prof('amgr_creat', uid=self._uid)
@@ -129,6 +136,14 @@ class AppManager(object):
 
         self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
 
+        # interval of the component health checks while waiting for the
+        # workflow to complete
+        self._watch_interval = float(os.getenv('ENTK_WATCH_INTERVAL', 1))
+
+        # in 'poll' consumer mode, the synchronizer backs off exponentially
+        # while the sync queues are empty, up to `_poll_idle` seconds
+        self._poll_idle = float(os.getenv('ENTK_POLL_IDLE', 0.1))
+
         self._logger.info('Application Manager initialized')
         self._prof.prof('amgr_created', uid=self._uid)
         self._report.ok('>>ok\n')
@@ -161,18 +176,89 @@ class AppManager(object):
         self._rts_config       = _if(rts_config,      config['rts_config'])
         self._rts              = _if(rts,             config['rts'])
 
-        credentials = pika.PlainCredentials(self._username, self._password)
-        self._rmq_conn_params = pika.connection.ConnectionParameters(
-                                        host=self._hostname,
-                                        port=self._port,
-                                        credentials=credentials)
+        # 'rabbitmq': route messages through the RabbitMQ broker,
+        # 'local'   : route messages through in-process queues (single node)
+        self._transport        = config.get('transport', 'rabbitmq')
+
+        if self._transport == 'local':
+            self._rmq_conn_params = transport.LocalConnectionParameters()
+
+        else:
+            credentials = pika.PlainCredentials(self._username, self._password)
+            self._rmq_conn_params = pika.connection.ConnectionParameters(
+                                            host=self._hostname,
+                                            port=self._port,
+                                            credentials=credentials)
 
         self._num_pending_qs   = config['pending_qs']
         self._num_completed_qs = config['completed_qs']
 
+        # 'poll': busy-poll queues via `basic_get`,
+        # 'push': let the broker deliver msgs via `basic_consume`
+        self._rmq_consumer     = config.get('rmq_consumer', 'poll')
+        self._rmq_prefetch     = config.get('rmq_prefetch', 64)
+
+        # serializer for task messages: 'json' or 'msgpack'
+        self._serializer       = config.get('serializer', 'json')
+
+        # number of tasks the task manager submits to the RTS at once
+        # (`0`: submit each bulk of tasks as a whole)
+        self._submit_chunk     = config.get('submit_chunk', 1024)
+
+        # number of processes converting tasks into RTS task descriptions
+        # (`0`: convert them in the task manager's submitting thread)
+        self._cud_workers      = config.get('cud_workers', 0)
+
+        # move the placeholders of completed pipelines in the task manager
+        # from memory to disk
+        self._evict_ph         = config.get('evict_placeholders', True)
+
+        # validate and initialize stages only once they become current
+        self._lazy_init        = config.get('lazy_init', False)
+
+        # 'transitions': report every state transition,
+        # 'progress'   : periodically report the progress of stages
+        self._report_mode      = config.get('report_mode', 'transitions')
+
+        # number of states retained in the state history of each pipeline,
+        # stage and task (`None`: unbounded)
+        self._state_history_limit = config.get('state_history_limit', None)
+
         if self._rts not in ['radical.pilot', 'mock']:
             raise ValueError('invalid RTS %s' % self._rts)
 
+        if self._serializer not in serializer.SERIALIZERS:
+            raise ValueError('invalid serializer %s' % self._serializer)
+
+        if self._transport not in transport.TRANSPORTS:
+            raise ValueError('invalid transport %s' % self._transport)
+
+        if self._rmq_consumer not in ['poll', 'push']:
+            raise ValueError('invalid RMQ consumer %s' % self._rmq_consumer)
+
+        if not isinstance(self._submit_chunk, int) or self._submit_chunk < 0:
+            raise ValueError('invalid submit_chunk %s' % self._submit_chunk)
+
+        if not isinstance(self._cud_workers, int) or self._cud_workers < 0:
+            raise ValueError('invalid cud_workers %s' % self._cud_workers)
+
+        if not isinstance(self._evict_ph, bool):
+            raise ValueError('invalid evict_placeholders %s' % self._evict_ph)
+
+        if not isinstance(self._lazy_init, bool):
+            raise ValueError('invalid lazy_init %s' % self._lazy_init)
+
+        if self._report_mode not in ['transitions', 'progress']:
+            raise ValueError('invalid report mode %s' % self._report_mode)
+
+        # a suspended pipeline resumes to the state before SUSPENDED, so at
+        # least the initial, the previous and the current state are retained
+        if self._state_history_limit is not None and \
+                (not isinstance(self._state_history_limit, int) or
+                 self._state_history_limit < 3):
+            raise ValueError('invalid state_history_limit %s'
+                            % self._state_history_limit)
+
 
     # --------------------------------------------------------------------------
     #
@@ -318,7 +404,7 @@ class AppManager(object):
                 raise ree.TypeError(expected_type=['Pipeline',
                                                    'set of Pipelines'],
                                     actual_type=type(p))
-            p._validate()
+            p._validate(lazy=self._lazy_init)
 
         # keep history
         self._workflows.append(workflow)
@@ -531,7 +617,7 @@ class AppManager(object):
             self._prof.prof('mqs_setup_start', uid=self._uid)
             self._logger.debug('Setting up mq connection and channel')
 
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
+            mq_connection = transport.connect(self._rmq_conn_params)
 
             mq_channel = mq_connection.channel()
 
@@ -560,6 +646,8 @@ class AppManager(object):
           #     f.write(q + '\n')
           # f.close()
 
+            mq_connection.close()
+
             self._mqs_setup = True
 
             self._logger.debug('All exchanges and queues are setup')
@@ -578,7 +666,7 @@ class AppManager(object):
         try:
             self._prof.prof('mqs_cleanup_start', uid=self._uid)
 
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
+            mq_connection = transport.connect(self._rmq_conn_params)
             mq_channel = mq_connection.channel()
 
             mq_channel.queue_delete(queue='%s-tmgr-to-sync' % self._sid)
@@ -594,6 +682,8 @@ class AppManager(object):
                 queue_name = '%s-completedq-%s' % (self._sid, i)
                 mq_channel.queue_delete(queue=queue_name)
 
+            mq_connection.close()
+
             self._prof.prof('mqs_cleanup_stop', uid=self._uid)
 
             self._mqs_setup = False
@@ -628,7 +718,13 @@ class AppManager(object):
                                 pending_queue=self._pending_queue,
                                 completed_queue=self._completed_queue,
                                 resubmit_failed=self._resubmit_failed,
-                                rmq_conn_params=self._rmq_conn_params)
+                                rmq_conn_params=self._rmq_conn_params,
+                                rmq_consumer=self._rmq_consumer,
+                                rmq_prefetch=self._rmq_prefetch,
+                                serializer=self._serializer,
+                                lazy_init=self._lazy_init,
+                                report_mode=self._report_mode,
+                                state_history_limit=self._state_history_limit)
         self._wfp.initialize_workflow()
         self._prof.prof('wfp_create_stop', uid=self._uid)
 
@@ -662,7 +758,13 @@ class AppManager(object):
                     pending_queue=self._pending_queue,
                     completed_queue=self._completed_queue,
                     rmgr=self._rmgr,
-                    rmq_conn_params=self._rmq_conn_params)
+                    rmq_conn_params=self._rmq_conn_params,
+                    rmq_consumer=self._rmq_consumer,
+                    rmq_prefetch=self._rmq_prefetch,
+                    serializer=self._serializer,
+                    submit_chunk=self._submit_chunk,
+                    cud_workers=self._cud_workers,
+                    evict_placeholders=self._evict_ph)
 
             self._task_manager.start_manager()
             self._task_manager.start_heartbeat()
@@ -674,35 +776,17 @@ class AppManager(object):
     #
     def _run_workflow(self):
 
-        active_pipe_count  = len(self._workflow)
-        finished_pipe_uids = list()
+        # We wait till all pipelines of the workflow are marked complete.  The
+        # WFprocessor wakes us up when that happens, in the meantime we check
+        # the health of the components every `_watch_interval` seconds.
+        state = self._rmgr.get_resource_allocation_state()
+        final = self._rmgr.get_completed_states()
 
-        # We wait till all pipelines of the workflow are marked
-        # complete
-        state      = self._rmgr.get_resource_allocation_state()
-        final      = self._rmgr.get_completed_states()
-        incomplete = self._wfp.workflow_incomplete()
-
-        while active_pipe_count and \
-              incomplete        and \
-              state not in final:
+        while state not in final and \
+              self._wfp.wait_workflow(timeout=self._watch_interval):
 
             state = self._rmgr.get_resource_allocation_state()
 
-            for pipe in self._workflow:
-
-                with pipe.lock:
-
-                    if pipe.completed and \
-                        pipe.uid not in finished_pipe_uids:
-
-                        finished_pipe_uids.append(pipe.uid)
-                        active_pipe_count -= 1
-
-                        self._logger.info('Pipe %s completed' % pipe.uid)
-                        self._logger.info('Active pipes %s' % active_pipe_count)
-
-
             if not self._sync_thread.is_alive() and \
                 self._cur_attempt <= self._reattempts:
 
@@ -723,12 +807,19 @@ class AppManager(object):
                 # workflow in the appmanager and start the processor.
 
                 self._prof.prof('wfp_recreate', uid=self._uid)
+                limit     = self._state_history_limit
                 self._wfp = WFprocessor(sid=self._sid,
                                         workflow=self._workflow,
                                         pending_queue=self._pending_queue,
                                         completed_queue=self._completed_queue,
                                         resubmit_failed=self._resubmit_failed,
-                                        rmq_conn_params=self._rmq_conn_params)
+                                        rmq_conn_params=self._rmq_conn_params,
+                                        rmq_consumer=self._rmq_consumer,
+                                        rmq_prefetch=self._rmq_prefetch,
+                                        serializer=self._serializer,
+                                        lazy_init=self._lazy_init,
+                                        report_mode=self._report_mode,
+                                        state_history_limit=limit)
 
                 self._logger.info('Restarting WFProcessor')
                 self._wfp.start_processor()
@@ -760,102 +851,120 @@ class AppManager(object):
                 self._cur_attempt += 1
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _apply_task_update(self, obj):
+        '''
+        Apply the state (and path) of a task dict (or task delta) received from
+        the task manager to the respective task in the workflow.  Returns the
+        updated task, or `None` if no update was needed.
+        '''
+
+        uid   = obj['uid']
+        state = obj['state']
+        path  = obj.get('path')
+
+        self._logger.info('Received %s with state %s' % (uid, state))
+
+        pipe, _, task = self._wfp._lookup(uid)
+
+        if not task:
+            self._logger.warning('Received update for unknown task %s' % uid)
+            return None
+
+        # the lock only covers the state change, logging happens outside
+        with pipe.lock:
+
+            if pipe.completed:
+                return None
+
+            # ignore repeated and stale updates, e.g., a SUBMITTING or EXECUTED
+            # update which arrives after the WFprocessor already dequeued the
+            # task as DONE
+            old_state = task.state
+            valid     = state in states._task_transitions[old_state]
+
+            if valid:
+                task.state = str(state)
+
+                if path:
+                    task.path = str(path)
+
+        if not valid:
+            self._logger.debug('Ignoring update of %s from %s to %s'
+                              % (uid, old_state, state))
+            return None
+
+        self._logger.debug('Found task %s in state %s' % (uid, state))
+
+        return task
+
+
     # --------------------------------------------------------------------------
     #
     def _task_update(self, msg, reply_to, corr_id, mq_channel, method_frame):
+        '''
+        Apply a single task update.  Updates are acknowledged even if they are
+        ignored, as the task manager waits for the ack of every update.
+        '''
+
+        task = self._apply_task_update(msg['object'])
+
+        mq_channel.basic_publish(
+                exchange='',
+                routing_key=reply_to,
+                properties=pika.BasicProperties(
+                    correlation_id=corr_id),
+                body='%s-ack' % msg['object']['uid'])
+
+        state = msg['object']['state']
+        self._prof.prof('pub_ack_state_%s' % state,
+                        uid=msg['object']['uid'])
+
+        mq_channel.basic_ack(
+                delivery_tag=method_frame.delivery_tag)
+
+        # in 'progress' mode, the WFprocessor reports the progress of stages
+        if task and self._report_mode == 'transitions':
+            self._report.ok('Update: ')
+            self._report.info('%s state: %s\n'
+                             % (task.luid, task.state))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _task_update_bulk(self, msg, reply_to, corr_id, mq_channel,
+                                method_frame):
+        '''
+        Apply a batch of task updates and acknowledge the batch as a whole.
+        As single updates, batches are always acknowledged, as the task manager
+        waits for the ack of every batch it sent.
+        '''
+
+        updated = list()
+        for obj in msg['objects']:
+            task = self._apply_task_update(obj)
+            if task:
+                updated.append(task)
+
+        mq_channel.basic_publish(
+                exchange='',
+                routing_key=reply_to,
+                properties=pika.BasicProperties(
+                    correlation_id=corr_id),
+                body='%d-ack' % len(msg['objects']))
 
-        completed_task = Task()
-        completed_task.from_dict(msg['object'])
-
-        self._logger.info('Received %s with state %s'
-                         % (completed_task.uid, completed_task.state))
-
-      # found_task = False
-
-        # Traverse the entire workflow to find the correct task
-        for pipe in self._workflow:
-
-            with pipe.lock:
-
-                if pipe.completed or \
-                    pipe.uid != completed_task.parent_pipeline['uid']:
-                    continue
-
-                for stage in pipe.stages:
-
-                    if stage.uid != completed_task.parent_stage['uid']:
-                        continue
-
-                    for task in stage.tasks:
-
-                        if completed_task.uid != task.uid or \
-                            completed_task.state == task.state:
-                            continue
-
-                        task.state = str(completed_task.state)
-                        self._logger.debug('Found task %s in state %s'
-                                          % (task.uid, task.state))
-
-                        if completed_task.path:
-                            task.path = str(completed_task.path)
-
-                        mq_channel.basic_publish(
-                                exchange='',
-                                routing_key=reply_to,
-                                properties=pika.BasicProperties(
-                                    correlation_id=corr_id),
-                                body='%s-ack' % task.uid)
-
-                        state = msg['object']['state']
-                        self._prof.prof('pub_ack_state_%s' % state,
-                                        uid=msg['object']['uid'])
-
-                        mq_channel.basic_ack(
-                                delivery_tag=method_frame.delivery_tag)
-
-                        self._report.ok('Update: ')
-                        self._report.info('%s state: %s\n'
-                                         % (task.luid, task.state))
-
-                      # found_task = True
-                        break
-
-                # if not found_task:
-                #
-                #     # If there was a Stage update, but the Stage was
-                #     # not found in any of the Pipelines. This
-                #     # means that this was a Stage that was added
-                #     # during runtime and the AppManager does not
-                #     # know about it. The current solution is going
-                #     # to be: add it to the workflow object in the
-                #     # AppManager via the synchronizer.
-                #
-                #     self._logger.info('Adding new task %s to \
-                #                         parent stage: %s'
-                #                         % (completed_task.uid,
-                #                         stage.uid))
-                #
-                #     self._prof.prof('adap_add_task_start',
-                #                     uid=completed_task.uid)
-                #     stage.add_tasks(completed_task)
-                #     self._prof.prof('adap_add_task_stop',
-                #                     uid=completed_task.uid)
-                #
-                #     mq_channel.basic_publish(exchange='',
-                #                 routing_key=reply_to,
-                #                 properties=pika.BasicProperties(
-                #                     correlation_id=corr_id),
-                #                 body='%s-ack' % completed_task.uid)
-                #
-                #     self._prof.prof('pub_ack_state_%s' %
-                #                 msg['object']['state'],
-                #                 uid=msg['object']['uid'])
-                #
-                #     mq_channel.basic_ack(
-                #         delivery_tag=method_frame.delivery_tag)
-                #     self._report.ok('Update: ')
-                #     self._report.info('%s state: %s\n' %
-                #     (completed_task.luid, completed_task.state))
+        for obj in msg['objects']:
+            self._prof.prof('pub_ack_state_%s' % obj['state'], uid=obj['uid'])
+
+        mq_channel.basic_ack(
+                delivery_tag=method_frame.delivery_tag)
+
+        if self._report_mode == 'transitions':
+            for task in updated:
+                self._report.ok('Update: ')
+                self._report.info('%s state: %s\n'
+                                 % (task.luid, task.state))
 
 
     # --------------------------------------------------------------------------
@@ -895,19 +1004,18 @@ class AppManager(object):
         self._prof.prof('sync_thread_start', uid=self._uid)
         self._logger.info('synchronizer thread started')
 
-        mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-        mq_channel = mq_connection.channel()
-
-        last  = time.time()
-        qname_t2s = '%s-tmgr-to-sync' % self._sid
-        qname_c2s = '%s-cb-to-sync'   % self._sid
+        mq_channel    = mq_utils.get_channel(self._rmq_conn_params,
+                                             self._prof, self._uid)
+        mq_connection = mq_channel.connection
 
-        while not self._terminate_sync.is_set():
+        # Messages between tmgr Main thread and synchronizer, and between
+        # callback thread and synchronizer -- only Task objects.  Acks are
+        # sent to the respective reverse queue.
+        queues = {'%s-tmgr-to-sync' % self._sid: '%s-sync-to-tmgr' % self._sid,
+                  '%s-cb-to-sync'   % self._sid: '%s-sync-to-cb'   % self._sid}
 
-            # --------------------------------------------------------------
-            # Messages between tmgr Main thread and synchronizer -- only
-            # Task objects
-            method_frame, props, body = mq_channel.basic_get(queue=qname_t2s)
+        # ----------------------------------------------------------------------
+        def sync_msg(reply_to, mq_channel, method_frame, props, body):
 
             # The message received is a JSON object with the following
             # structure:
@@ -915,49 +1023,73 @@ class AppManager(object):
             #         'type': 'Pipeline'/'Stage'/'Task',
             #         'object': json/dict
             #         }
-            if body:
+            # or, for batched updates, a list of objects of the same type:
+            # msg = {
+            #         'type': 'Pipeline'/'Stage'/'Task',
+            #         'objects': [json/dict, ...]
+            #         }
+            # Tasks are sent as deltas (uid, state, exit_code, path only).
+            msg  = serializer.loads(body)
+            objs = msg['objects'] if 'objects' in msg else [msg['object']]
 
-                msg   = json.loads(body)
-                uid   = msg['object']['uid']
-                state = msg['object']['state']
+            for obj in objs:
+                uid   = obj['uid']
+                state = obj['state']
 
                 self._prof.prof('sync_recv_obj_state_%s' % state, uid=uid)
                 self._logger.debug('recv %s in state %s (sync)' % (uid, state))
 
-                if msg['type'] == 'Task':
-                    self._task_update(msg, '%s-sync-to-tmgr' % self._sid,
-                            props.correlation_id, mq_channel, method_frame)
-
-
-            # --------------------------------------------------------------
-            # Messages between callback thread and synchronizer -- only
-            # Task objects
-            method_frame, props, body = mq_channel.basic_get(queue=qname_c2s)
+            if msg['type'] == 'Task':
+                if 'objects' in msg:
+                    self._task_update_bulk(msg, reply_to, props.correlation_id,
+                                           mq_channel, method_frame)
+                else:
+                    self._task_update(msg, reply_to, props.correlation_id,
+                                      mq_channel, method_frame)
+        # ----------------------------------------------------------------------
 
-            # The message received is a JSON object with the following structure:
-            # msg = {
-            #         'type': 'Pipeline'/'Stage'/'Task',
-            #         'object': json/dict
-            #         }
-            if body:
+        if self._rmq_consumer == 'push':
 
-                msg   = json.loads(body)
-                uid   = msg['object']['uid']
-                state = msg['object']['state']
+            # the broker pushes messages to us, we block until it does so
+            mq_channel.basic_qos(prefetch_count=self._rmq_prefetch)
 
-                self._prof.prof('sync_recv_obj_state_%s' % state, uid=uid)
-                self._logger.debug('recv %s in state %s (sync)' % (uid, state))
+            for qname, reply_to in queues.items():
+                mq_channel.basic_consume(ft.partial(sync_msg, reply_to),
+                                         queue=qname)
 
-                if msg['type'] == 'Task':
-                    self._task_update(msg, '%s-sync-to-cb' % self._sid,
-                            props.correlation_id, mq_channel, method_frame)
+            while not self._terminate_sync.is_set():
+                mq_connection.process_data_events(time_limit=1)
 
+        else:
 
-            # Appease pika cos it thinks the connection is dead
-            now = time.time()
-            if now - last >= self._rmq_ping_interval:
-                mq_connection.process_data_events()
-                last = now
+            last = time.time()
+            idle = 0.0
+            while not self._terminate_sync.is_set():
+
+                got = False
+                for qname, reply_to in queues.items():
+
+                    method_frame, props, body = mq_channel.basic_get(
+                                                                  queue=qname)
+                    if body:
+                        sync_msg(reply_to, mq_channel, method_frame, props,
+                                 body)
+                        got = True
+
+                if got:
+                    idle = 0.0
+                else:
+                    # back off while the sync queues are empty
+                    idle = min(max(2 * idle, 0.001), self._poll_idle)
+                    mq_connection.sleep(idle)
+
+                # Appease pika cos it thinks the connection is dead
+                now = time.time()
+                if now - last >= self._rmq_ping_interval:
+                    mq_connection.process_data_events()
+                    last = now
+
+        mq_utils.close_connection(self._rmq_conn_params, self._prof, self._uid)
 
         self._prof.prof('sync_thread_stop', uid=self._uid)
 
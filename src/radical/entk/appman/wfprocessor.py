@@ -5,15 +5,20 @@ __license__   = "MIT"
 
 
 import os
-import json
-import pika
 import time
+import itertools
 import threading
+import functools
+import collections
 
 import radical.utils as ru
 
 # EnTK imports
 from .. import states, Task
+from ..utils import mq_utils
+from ..utils import serializer
+from ..utils.ids import generate_ids
+from ..utils.history import StateHistory
 
 
 # ------------------------------------------------------------------------------
@@ -35,6 +40,21 @@ class WFprocessor(object):
         :resubmit_failed: (bool) True if failed tasks should be resubmitted
         :rmq_conn_params: (pika.connection.ConnectionParameters) object of
                           parameters necessary to connect to RabbitMQ
+        :rmq_consumer:    (str) 'poll' to fetch messages via `basic_get`,
+                          'push' to have them delivered via `basic_consume`
+        :rmq_prefetch:    (int) number of unacknowledged messages the broker
+                          pushes in advance ('push' consumer only)
+        :serializer:      (str) serializer for the workloads sent to the task
+                          manager: 'json' or 'msgpack'
+        :lazy_init:       (bool) validate stages and assign uids to stages and
+                          tasks only when a stage becomes current, instead of
+                          for the whole workflow on initialization
+        :report_mode:     (str) 'transitions' to report every state transition
+                          right away, 'progress' to report the progress of
+                          stages at a fixed rate, from a background thread
+        :state_history_limit: (int) maximum number of states retained in the
+                          state histories of the workflow's entities (`None`
+                          for no limit)
     """
 
     # --------------------------------------------------------------------------
@@ -45,7 +65,13 @@ class WFprocessor(object):
                  pending_queue,
                  completed_queue,
                  resubmit_failed,
-                 rmq_conn_params):
+                 rmq_conn_params,
+                 rmq_consumer='poll',
+                 rmq_prefetch=64,
+                 serializer='json',
+                 lazy_init=False,
+                 report_mode='transitions',
+                 state_history_limit=None):
 
         # Mandatory arguments
         self._sid             = sid
@@ -53,10 +79,22 @@ class WFprocessor(object):
         self._completed_queue = completed_queue
         self._resubmit_failed = resubmit_failed
         self._rmq_conn_params = rmq_conn_params
+        self._rmq_consumer    = rmq_consumer
+        self._rmq_prefetch    = rmq_prefetch
+        self._serializer      = serializer
+        self._lazy_init       = lazy_init
+        self._report_mode     = report_mode
+        self._history_limit   = state_history_limit
 
         # Assign validated workflow
         self._workflow = workflow
 
+        # uid -> (pipeline, stage, task) lookup table for all entities of the
+        # workflow which have a uid assigned.  Entries for stages and pipelines
+        # leave the fields of the lower levels set to `None`.  The table is
+        # shared with the AppManager's synchronizer.
+        self._uid_map = dict()
+
         # Create logger and profiler at their specific locations using the sid
         self._path = os.getcwd() + '/' + self._sid
         self._uid  = ru.generate_id('wfprocessor.%(item_counter)04d',
@@ -73,30 +111,283 @@ class WFprocessor(object):
         self._dequeue_thread    = None
         self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
 
+        # The enqueuer sleeps until it gets woken up by the dequeuer or by
+        # changes to the workflow, but checks for work at least every
+        # `_enqueue_timeout` seconds.
+        self._wakeup          = threading.Event()
+        self._enqueue_timeout = float(os.getenv('ENTK_ENQUEUE_TIMEOUT', 3))
+
+        # In 'poll' consumer mode, the dequeuer backs off exponentially while
+        # the completed queues are empty, up to `_poll_idle` seconds.
+        self._poll_idle       = float(os.getenv('ENTK_POLL_IDLE', 0.1))
+
+        # In 'progress' report mode, state transitions are buffered and then
+        # profiled, logged and summarized by the reporter thread every
+        # `_report_interval` seconds.
+        self._report_buf         = collections.deque()
+        self._report_interval    = float(os.getenv('ENTK_REPORT_INTERVAL', 1))
+        self._reporter_thread    = None
+        self._reporter_terminate = threading.Event()
+
+        # time of last stage completion per pipeline, used to measure the wait
+        # time until the next stage gets scheduled
+        self._stage_done_ts = dict()
+
+        # Ready frontier: pipelines which may have become schedulable since the
+        # last enqueue cycle (stage completion, resume, resubmission, workflow
+        # changes).  Only those are inspected by `_create_workload()`.  This is
+        # an ordered set, the dict values are unused.
+        self._ready      = dict()
+        self._ready_lock = threading.Lock()
+
+        # Pipelines not known to have completed (an ordered set), and the
+        # condition notified whenever a pipeline completes.  This allows to
+        # check for, and to wait for, workflow completion without inspecting
+        # (and locking) all pipelines.
+        self._incomplete = dict()
+        self._completion = threading.Condition()
+
+        # names of the pipelines completed since the task manager was last
+        # informed about completed pipelines (see `_publish_completed()`)
+        self._completed_names = list()
+
+        # register entities which already got a uid (WFprocessor restart)
+        for pipe in self._workflow:
+            self._register_pipeline(pipe)
+
         self._logger.info('Created WFProcessor object: %s' % self._uid)
         self._prof.prof('create_wfp', uid=self._uid)
 
 
     # --------------------------------------------------------------------------
     #
-    def _advance(self, obj, obj_type, new_state):
+    def _advance(self, obj, obj_type, new_state, events=None):
         '''
-        transition `obj` of type `obj_type` into state `new_state`
+        transition `obj` of type `obj_type` into state `new_state`.
+
+        The transition is reported (profiled, logged) right away, unless an
+        `events` list is given: callers holding a pipeline lock collect the
+        transitions in that list, and report them via `_report_advances()` once
+        the lock is released, so that the critical section only covers the
+        actual state change.
         '''
 
         # NOTE: this is a local operation, no queue communication is involved
         #       (other than the `_advance()` in the TaskManager classes, which
 
+        obj.state = new_state
+
+        event = (obj, obj_type, new_state, time.time())
+
+        if events is None:
+            self._report_advances([event])
+        else:
+            events.append(event)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _report_advances(self, events):
+        '''
+        report the transitions collected by `_advance()` (or, in 'progress'
+        report mode, hand them to the reporter thread), and clear `events`
+        '''
+
+        if self._report_mode == 'progress':
+            self._report_buf.extend(events)
+
+        else:
+            for obj, obj_type, state, ts in events:
+                self._record_advance(obj, obj_type, state, ts)
+                self._report.ok('Update: ')
+                self._report.info('%s state: %s\n' % (obj.luid, state))
+
+        del events[:]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _record_advance(self, obj, obj_type, state, ts):
+        '''
+        profile and log a state transition
+        '''
+
         if   obj_type == 'Task' : msg = obj.parent_stage['uid']
         elif obj_type == 'Stage': msg = obj.parent_pipeline['uid']
         else                    : msg = None
 
-        obj.state = new_state
+        self._prof.prof('advance', uid=obj.uid, state=state, msg=msg, ts=ts)
+        self._logger.info('Transition %s to state %s' % (obj.uid, state))
+
 
-        self._prof.prof('advance', uid=obj.uid, state=obj.state, msg=msg)
-        self._report.ok('Update: ')
-        self._report.info('%s state: %s\n' % (obj.luid, obj.state))
-        self._logger.info('Transition %s to state %s' % (obj.uid, new_state))
+    # --------------------------------------------------------------------------
+    #
+    def _flush_reports(self):
+        '''
+        profile and log the buffered state transitions, and report the
+        transitions of stages and pipelines, and the progress of the stages
+        whose tasks progressed
+        '''
+
+        stages = dict()
+        lines  = list()
+
+        while True:
+
+            try:
+                obj, obj_type, state, ts = self._report_buf.popleft()
+            except IndexError:
+                break
+
+            self._record_advance(obj, obj_type, state, ts)
+
+            if obj_type == 'Task':
+                stage = self._uid_map.get(obj.uid, (None, None))[1]
+                if stage:
+                    stages[stage] = None
+            else:
+                lines.append('%s state: %s\n' % (obj.luid, state))
+
+        for line in lines:
+            self._report.ok('Update: ')
+            self._report.info(line)
+
+        # the current progress of the stages
+        for stage in stages:
+
+            progress = stage.progress
+            line     = '%s: %d/%d DONE' % (stage.luid, progress['done'],
+                                           progress['total'])
+            if progress['failed']:
+                line += ', %d FAILED' % progress['failed']
+
+            self._report.ok('Progress: ')
+            self._report.info('%s\n' % line)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reporter(self):
+        '''
+        **Purpose**: This is the function that is run in the reporter thread
+        ('progress' report mode).
+        '''
+
+        try:
+            while not self._reporter_terminate.is_set():
+                self._reporter_terminate.wait(timeout=self._report_interval)
+                self._flush_reports()
+
+        except Exception:
+            self._logger.exception('Error in reporter-thread')
+            raise
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _register_pipeline(self, pipe):
+        '''
+        add `pipe` and all its stages and tasks to the uid map
+        '''
+
+        if pipe.uid:
+            self._uid_map[pipe.uid] = (pipe, None, None)
+
+        self._limit_history(pipe)
+
+        pipe._notify           = functools.partial(self._mark_ready, pipe)
+        pipe._notify_completed = functools.partial(self._mark_completed, pipe)
+        self._mark_ready(pipe)
+
+        if not pipe.completed:
+            with self._completion:
+                self._incomplete[pipe] = None
+
+        for stage in pipe.stages:
+            self._register_stage(pipe, stage)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _register_stage(self, pipe, stage):
+        '''
+        add `stage` of pipeline `pipe` and all its tasks to the uid map
+        '''
+
+        if not stage.uid:
+            # stage not yet initialized, will be registered once it becomes
+            # the current stage of its pipeline
+            return
+
+        self._uid_map[stage.uid] = (pipe, stage, None)
+        stage._notify = functools.partial(self._mark_ready, pipe)
+        self._limit_history(stage)
+
+        # the tasks of lazy task arrays are registered once they get created,
+        # when the stage gets scheduled
+        for task in stage._tasks:
+            if task.uid:
+                self._uid_map[task.uid] = (pipe, stage, task)
+                self._limit_history(task)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _limit_history(self, obj):
+        '''
+        apply the configured state history limit to pipeline, stage or task
+        `obj`
+        '''
+
+        if self._history_limit is None:
+            return
+
+        if obj._state_history is None:
+            # tasks create their history on their first state transition
+            obj._state_history = StateHistory([states.INITIAL])
+
+        obj._state_history.limit = self._history_limit
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _mark_ready(self, pipe):
+        '''
+        add `pipe` to the ready frontier and wake up the enqueuer
+        '''
+
+        with self._ready_lock:
+            self._ready[pipe] = None
+
+        self._wakeup.set()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _mark_completed(self, pipe):
+        '''
+        remove `pipe` from the incomplete pipelines and wake up waiters
+        '''
+
+        with self._completion:
+            self._incomplete.pop(pipe, None)
+            self._completed_names.append(str(pipe.name))
+            self._completion.notify_all()
+            active = len(self._incomplete)
+
+        self._logger.info('Pipe %s completed' % pipe.uid)
+        self._logger.info('Active pipes %s' % active)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _lookup(self, uid):
+        '''
+        return the `(pipeline, stage, task)` tuple registered for `uid`, or
+        `(None, None, None)` if that uid is not known
+        '''
+
+        return self._uid_map.get(uid, (None, None, None))
 
 
     # --------------------------------------------------------------------------
@@ -112,9 +403,10 @@ class WFprocessor(object):
     #
     def _create_workload(self):
 
-        # We iterate through all pipelines to collect tasks from
-        # stages that are pending scheduling. Once collected, these tasks
-        # will be communicated to the tmgr in bulk.
+        # We iterate through all pipelines of the ready frontier to collect
+        # tasks from stages that are pending scheduling. Once collected, these
+        # tasks will be communicated to the tmgr in bulk.  Pipelines which are
+        # not in the frontier have not changed since they were last inspected.
 
         # Initial empty list to store executable tasks across different
         # pipelines
@@ -125,7 +417,19 @@ class WFprocessor(object):
         # we can update the state of stages accordingly
         scheduled_stages = list()
 
-        for pipe in self._workflow:
+        with self._ready_lock:
+            ready       = self._ready
+            self._ready = dict()
+
+        # state transitions of the current pipeline, reported once its lock is
+        # released, and the scheduled stages' time since their predecessor
+        # completed
+        events      = list()
+        stage_waits = list()
+
+        for pipe in ready:
+
+            self._report_advances(events)
 
             with pipe.lock:
 
@@ -140,7 +444,8 @@ class WFprocessor(object):
                 if pipe.state == states.INITIAL:
 
                     # Set state of pipeline to SCHEDULING if it is in INITIAL
-                    self._advance(pipe, 'Pipeline', states.SCHEDULING)
+                    self._advance(pipe, 'Pipeline', states.SCHEDULING,
+                                  events)
 
                 # Get the next stage of this pipeline to process
                 exec_stage = pipe.stages[pipe.current_stage - 1]
@@ -150,83 +455,197 @@ class WFprocessor(object):
                     exec_stage.parent_pipeline['uid']  = pipe.uid
                     exec_stage.parent_pipeline['name'] = pipe.name
                     exec_stage._assign_uid(self._sid)
+                    self._register_stage(pipe, exec_stage)
+
+                    if self._lazy_init and \
+                        not self._validate_stage(pipe, exec_stage, events):
+                        continue
 
                 # If its a new stage, update its state
                 if exec_stage.state == states.INITIAL:
 
-                    self._advance(exec_stage, 'Stage', states.SCHEDULING)
+                    self._advance(exec_stage, 'Stage', states.SCHEDULING,
+                                  events)
+
+                    done_ts = self._stage_done_ts.pop(pipe.uid, None)
+                    if done_ts:
+                        stage_waits.append((exec_stage.uid,
+                                            time.time() - done_ts))
 
                 # Get all tasks of a stage in SCHEDULED state
                 exec_tasks = list()
                 if exec_stage.state == states.SCHEDULING:
                     exec_tasks = exec_stage.tasks
 
+                scheduled = False
                 for exec_task in exec_tasks:
 
+                    if exec_task.uid not in self._uid_map:
+
+                        if not exec_task.uid:
+                            # task was added to the stage at runtime
+                            exec_task._assign_uid(self._sid)
+                            exec_task.parent_stage['uid']     = exec_stage.uid
+                            exec_task.parent_stage['name']    = exec_stage.name
+                            exec_task.parent_pipeline['uid']  = pipe.uid
+                            exec_task.parent_pipeline['name'] = pipe.name
+
+                        # otherwise, the task was created from a lazy task
+                        # array, with a uid allocated for it by its stage
+                        self._uid_map[exec_task.uid] = (pipe, exec_stage,
+                                                        exec_task)
+                        self._limit_history(exec_task)
+
                     state = exec_task.state
                     if   state == states.INITIAL or \
                         (state == states.FAILED and self._resubmit_failed):
 
                         # Set state of Tasks in current Stage
                         # to SCHEDULING
-                        self._advance(exec_task, 'Task', states.SCHEDULING)
+                        self._advance(exec_task, 'Task', states.SCHEDULING,
+                                      events)
 
                         # Store the tasks from different pipelines
                         # into our workload list. All tasks will
                         # be submitted in bulk and their states
                         # will be updated accordingly
                         workload.append(exec_task)
+                        scheduled = True
+
+                # We store the stages since the stages the
+                # above tasks belong to also need to be
+                # updated.
+                if scheduled and exec_stage not in scheduled_stages:
+                    scheduled_stages.append(exec_stage)
 
-                        # We store the stages since the stages the
-                        # above tasks belong to also need to be
-                        # updated. If its a task that failed, the
-                        # stage is already in the correct state
-                        if exec_task.state == states.FAILED:
-                            continue
-                        if exec_stage not in scheduled_stages:
-                            scheduled_stages.append(exec_stage)
+        self._report_advances(events)
+
+        for uid, wait in stage_waits:
+            self._prof.prof('stage_wait', uid=uid, msg='%.3f' % wait)
 
         return workload, scheduled_stages
 
 
     # --------------------------------------------------------------------------
     #
-    def _execute_workload(self, workload, scheduled_stages):
+    def _validate_stage(self, pipe, stage, events=None):
+        '''
+        validate a stage which just became current (for `lazy_init`).  Invalid
+        stages fail, and so does their pipeline.  Returns whether the stage is
+        valid.
+        '''
+
+        try:
+            stage._validate()
+            return True
 
-        # Tasks of the workload need to be converted into a dict
-        # as pika can send and receive only json/dict data
-        wl_json = json.dumps([task.to_dict() for task in workload])
+        except Exception:
+            self._logger.exception('Stage %s of pipeline %s is invalid'
+                                   % (stage.uid, pipe.uid))
+
+        self._advance(stage, 'Stage',    states.FAILED, events)
+        self._advance(pipe,  'Pipeline', states.FAILED, events)
+        pipe._set_completed()
 
-        # Acquire a connection+channel to the rmq server
-        mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-        mq_channel = mq_connection.channel()
+        return False
 
-        # Send the workload to the pending queue
-        mq_channel.basic_publish(exchange = '',
-                                    routing_key=self._pending_queue[0],
-                                    body=wl_json
 
-                                    # TODO: Make durability parameters
-                                    # as a config parameter and then
-                                    # enable the following accordingly
-                                    # properties=pika.BasicProperties(
-                                    # make message persistent
-                                    # delivery_mode = 2)
+    # --------------------------------------------------------------------------
+    #
+    def _execute_workload(self, workload, scheduled_stages):
 
-                                    )
+        # Acquire a (pooled) channel to the rmq server
+        mq_channel = mq_utils.get_channel(self._rmq_conn_params,
+                                          self._prof, self._uid)
+
+        # Shard the workload over all pending queues, so that the task manager
+        # can consume the shards concurrently
+        n_queues = len(self._pending_queue)
+        shard    = (len(workload) + n_queues - 1) // n_queues
+
+        for idx, start in enumerate(range(0, len(workload), shard)):
+
+            # Tasks of the workload need to be converted into a dict
+            # as pika can send and receive only serialized data
+            wl_tasks = workload[start:start + shard]
+            wl_msg   = serializer.dumps([task.to_dict(history=False)
+                                                for task in wl_tasks],
+                                        self._serializer)
+
+            # Send the shard to its pending queue
+            mq_channel.basic_publish(exchange = '',
+                                        routing_key=self._pending_queue[idx],
+                                        body=wl_msg
+
+                                        # TODO: Make durability parameters
+                                        # as a config parameter and then
+                                        # enable the following accordingly
+                                        # properties=pika.BasicProperties(
+                                        # make message persistent
+                                        # delivery_mode = 2)
+
+                                        )
         self._logger.debug('Workload submitted to Task Manager')
 
-        # Update the state of the tasks in the workload
-        for task in workload:
+        # Update the state of the tasks in the workload, which is ordered by
+        # pipeline, and of the stages from which tasks have been scheduled.
+        # Tasks and stages which already progressed further (the task manager
+        # may have picked them up already) are not set back.
+        events = list()
+
+        for pipe, tasks in itertools.groupby(workload,
+                                             lambda t: self._uid_map[t.uid][0]):
+            with pipe.lock:
+                for task in tasks:
+                    if task.state == states.SCHEDULING:
+                        self._advance(task, 'Task', states.SCHEDULED, events)
+
+            self._report_advances(events)
 
-            # Set state of Tasks in current Stage to SCHEDULED
-            self._advance(task, 'Task', states.SCHEDULED)
+        for stage in scheduled_stages:
 
-        # Update the state of the stages from which tasks have
-        # been scheduled
-        if scheduled_stages:
-            for executable_stage in scheduled_stages:
-                self._advance(executable_stage, 'Stage', states.SCHEDULED)
+            pipe = self._uid_map[stage.uid][0]
+
+            with pipe.lock:
+                if stage.state == states.SCHEDULING:
+                    self._advance(stage, 'Stage', states.SCHEDULED, events)
+
+            self._report_advances(events)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _publish_completed(self):
+        '''
+        Send the names of the pipelines which completed since the last call to
+        the task manager, which can then evict their placeholders.  Names which
+        are still used by incomplete pipelines are held back.  The message is
+        a dict, whereas workloads are lists of tasks.
+        '''
+
+        with self._completion:
+
+            if not self._completed_names:
+                return
+
+            # a name held back is sent once its last pipeline completes
+            names  = set(self._completed_names)
+            active = set(str(pipe.name) for pipe in self._incomplete)
+
+            self._completed_names = list()
+
+        names = sorted(names - active)
+        if not names:
+            return
+
+        mq_channel = mq_utils.get_channel(self._rmq_conn_params,
+                                          self._prof, self._uid)
+        mq_channel.basic_publish(exchange='',
+                                 routing_key=self._pending_queue[0],
+                                 body=serializer.dumps({'completed': names},
+                                                       self._serializer))
+
+        self._logger.debug('Pipelines %s completed', names)
 
 
     # --------------------------------------------------------------------------
@@ -246,7 +665,9 @@ class WFprocessor(object):
 
             while not self._enqueue_thread_terminate.is_set():
 
-                time.sleep(3)
+                # wait for new work to become eligible for execution
+                self._wakeup.wait(timeout=self._enqueue_timeout)
+                self._wakeup.clear()
 
                 workload, scheduled_stages = self._create_workload()
 
@@ -254,6 +675,8 @@ class WFprocessor(object):
                 if workload:
                     self._execute_workload(workload, scheduled_stages)
 
+                self._publish_completed()
+
             self._logger.info('Enqueue thread terminated')
             self._prof.prof('enq_stop', uid=self._uid)
 
@@ -269,113 +692,92 @@ class WFprocessor(object):
             self._logger.exception('Error in enqueue-thread')
             raise
 
+        finally:
+            mq_utils.close_connection(self._rmq_conn_params,
+                                      self._prof, self._uid)
 
 
     # --------------------------------------------------------------------------
     #
     def _update_dequeued_task(self, deq_task):
 
-        # Traverse the entire workflow to find out the correct Task
-        # TODO: Investigate whether we can change the DS of the
-        # workflow so that we don't have this expensive search
-        # for each task.
-        # First search across all pipelines
         # Note: deq_task is not the same as the task that exists in this process,
         # they are different objects and have different state histories.
-        for pipe in self._workflow:
-
-            with pipe.lock:
-
-                # Skip pipelines that have completed or are
-                # currently suspended
-                if pipe.completed or pipe.state == states.SUSPENDED:
-                    continue
+        pipe, stage, task = self._lookup(deq_task.uid)
 
-                # Skip pipelines that don't match the UID
-                # There will be only one pipeline that matches
-                if pipe.uid != deq_task.parent_pipeline['uid']:
-                    continue
-
-                self._logger.debug('Found parent pipeline: %s' %
-                                    pipe.uid)
+        if not task:
+            self._logger.warning('Dequeued task %s is not known'
+                                 % deq_task.uid)
+            return
 
-                # Next search across all stages of a matching
-                # pipelines
-                for stage in pipe.stages:
+        self._logger.debug('Found task %s in stage %s of pipeline %s'
+                           % (task.uid, stage.uid, pipe.uid))
 
-                    # Skip stages that don't match the UID
-                    # There will be only one stage that matches
-                    if stage.uid != deq_task.parent_stage['uid']:
-                        continue
+        # state transitions, reported once the pipeline lock is released
+        events = list()
 
-                    self._logger.debug('Found parent stage: %s' %
-                                        stage.uid)
+        with pipe.lock:
 
-                    # Search across all tasks of matching stage
-                    for task in stage.tasks:
+            # Skip pipelines that have completed or are
+            # currently suspended
+            if pipe.completed or pipe.state == states.SUSPENDED:
+                return
 
-                        # Skip tasks that don't match the UID
-                        # There will be only one task that matches
-                        if task.uid != deq_task.uid:
-                            continue
+            # If there is no exit code, we assume success
+            # We are only concerned about state of task and not
+            # deq_task
+            if not deq_task.exit_code:
+                task_state = states.DONE
+            else:
+                task_state = states.FAILED
 
-                        # If there is no exit code, we assume success
-                        # We are only concerned about state of task and not
-                        # deq_task
-                        if not deq_task.exit_code:
-                            task_state = states.DONE
-                        else:
-                            task_state = states.FAILED
+            if task.state == states.FAILED and \
+                self._resubmit_failed:
+                task_state = states.INITIAL
 
-                        if task.state == states.FAILED and \
-                            self._resubmit_failed:
-                            task_state = states.INITIAL
+            self._advance(task, 'Task', task_state, events)
 
-                        self._advance(task, 'Task', task_state)
+            if task_state == states.INITIAL:
+                # resubmitted task needs to be picked up by the enqueuer
+                self._mark_ready(pipe)
 
-                        # Found the task and processed it -- no more
-                        # iterations needed
-                        break
+            # Check if current stage has completed
+            # If yes, we need to (i) check for post execs to
+            # be executed and (ii) check if it is the last
+            # stage of the pipeline -- update pipeline
+            # state if yes.
+            if stage._check_stage_complete():
 
-                    # Found the stage and processed it -- no more
-                    # iterations needed for the current task
-                    break
+                self._advance(stage, 'Stage', states.DONE, events)
+                self._stage_done_ts[pipe.uid] = time.time()
 
-                # Check if current stage has completed
-                # If yes, we need to (i) check for post execs to
-                # be executed and (ii) check if it is the last
-                # stage of the pipeline -- update pipeline
-                # state if yes.
-                if stage._check_stage_complete():
+                # Check if the current stage has a post-exec
+                # that needs to be executed
+                if stage.post_exec:
+                    self._execute_post_exec(pipe, stage, events)
 
-                    self._advance(stage, 'Stage', states.DONE)
+                # if pipeline got suspended, advance state accordingly
+                if pipe.state == states.SUSPENDED:
+                  self._advance(pipe, 'Pipeline', states.SUSPENDED, events)
 
-                    # Check if the current stage has a post-exec
-                    # that needs to be executed
-                    if stage.post_exec:
-                        self._execute_post_exec(pipe, stage)
+                else:
+                    # otherwise perform normal stage progression
+                    pipe._increment_stage()
 
-                    # if pipeline got suspended, advance state accordingly
-                    if pipe.state == states.SUSPENDED:
-                      self._advance(pipe, 'Pipeline', states.SUSPENDED)
+                # If pipeline has completed, advance state to DONE
+                if pipe.completed:
+                    self._advance(pipe, 'Pipeline', states.DONE, events)
+                    self._stage_done_ts.pop(pipe.uid, None)
 
-                    else:
-                        # otherwise perform normal stage progression
-                        pipe._increment_stage()
+                # next stage can be scheduled
+                self._mark_ready(pipe)
 
-                    # If pipeline has completed, advance state to DONE
-                    if pipe.completed:
-                        self._advance(pipe, 'Pipeline', states.DONE)
-
-
-                # Found the pipeline and processed it -- no more
-                # iterations needed for the current task
-                break
+        self._report_advances(events)
 
 
     # --------------------------------------------------------------------------
     #
-    def _execute_post_exec(self, pipe, stage):
+    def _execute_post_exec(self, pipe, stage, events=None):
 
         try:
             self._logger.info('Executing post-exec for stage %s' % stage.uid)
@@ -394,24 +796,26 @@ class WFprocessor(object):
 
         if resumed_pipe_uids:
 
-            for r_pipe in self._workflow:
+            for r_uid in resumed_pipe_uids:
 
-                if r_pipe == pipe:
+                r_pipe, _, _ = self._lookup(r_uid)
+
+                if not r_pipe or r_pipe == pipe:
                     continue
 
                 with r_pipe.lock:
 
-                    if r_pipe.uid in resumed_pipe_uids:
-
-                        # Resumed pipelines already have the correct state,
-                        # they just need to be synced with the AppMgr.
-                        r_pipe._increment_stage()
+                    # Resumed pipelines already have the correct state,
+                    # they just need to be synced with the AppMgr.
+                    r_pipe._increment_stage()
 
-                        if r_pipe.completed:
-                            self._advance(r_pipe, 'Pipeline', states.DONE)
+                    if r_pipe.completed:
+                        self._advance(r_pipe, 'Pipeline', states.DONE, events)
 
-                        else:
-                            self._advance(r_pipe, 'Pipeline', r_pipe.state)
+                    else:
+                        self._advance(r_pipe, 'Pipeline', r_pipe.state,
+                                      events)
+                        self._mark_ready(r_pipe)
 
 
 
@@ -429,35 +833,64 @@ class WFprocessor(object):
             self._prof.prof('deq_start', uid=self._uid)
             self._logger.info('Dequeue thread started')
 
-            # Acquire a connection+channel to the rmq server
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            # Acquire a (pooled) connection+channel to the rmq server
+            mq_channel    = mq_utils.get_channel(self._rmq_conn_params,
+                                                 self._prof, self._uid)
+            mq_connection = mq_channel.connection
 
-            last = time.time()
-            while not self._dequeue_thread_terminate.is_set():
-
-                method_frame, header_frame, body = mq_channel.basic_get(
-                    queue=self._completed_queue[0])
-
-                # When there is no msg received, body is None
-                if not body:
-                    continue
+            # ------------------------------------------------------------------
+            def dequeue_msg(mq_channel, method_frame, props, body):
 
                 # Acknowledge the received message
                 mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
                 # Create a  task from the received msg
                 deq_task = Task()
-                deq_task.from_dict(json.loads(body))
+                deq_task.from_dict(serializer.loads(body), validate=False)
                 self._logger.info('Got finished task %s from queue'
                                   % (deq_task.uid))
                 self._update_dequeued_task(deq_task)
+            # ------------------------------------------------------------------
 
-                # Appease pika cos it thinks the connection is dead
-                now = time.time()
-                if now - last >= self._rmq_ping_interval:
-                    mq_connection.process_data_events()
-                    last = now
+            if self._rmq_consumer == 'push':
+
+                # the broker pushes messages to us, we block until it does so
+                mq_channel.basic_qos(prefetch_count=self._rmq_prefetch)
+
+                for qname in self._completed_queue:
+                    mq_channel.basic_consume(dequeue_msg, queue=qname)
+
+                while not self._dequeue_thread_terminate.is_set():
+                    mq_connection.process_data_events(time_limit=1)
+
+            else:
+
+                last = time.time()
+                idle = 0.0
+                while not self._dequeue_thread_terminate.is_set():
+
+                    got = False
+                    for qname in self._completed_queue:
+
+                        method_frame, props, body = mq_channel.basic_get(
+                                                                  queue=qname)
+
+                        # When there is no msg received, body is None
+                        if body:
+                            dequeue_msg(mq_channel, method_frame, props, body)
+                            got = True
+
+                    if got:
+                        idle = 0.0
+                    else:
+                        idle = min(max(2 * idle, 0.001), self._poll_idle)
+                        mq_connection.sleep(idle)
+
+                    # Appease pika cos it thinks the connection is dead
+                    now = time.time()
+                    if now - last >= self._rmq_ping_interval:
+                        mq_connection.process_data_events()
+                        last = now
 
             self._logger.info('Terminated dequeue thread')
             self._prof.prof('deq_stop', uid=self._uid)
@@ -476,10 +909,8 @@ class WFprocessor(object):
 
 
         finally:
-            try:
-                mq_connection.close()
-            except Exception as ex:
-                self._logger.warning('mq_connection close failed, %s' % ex)
+            mq_utils.close_connection(self._rmq_conn_params,
+                                      self._prof, self._uid)
             self._logger.debug('closed mq_connection')
 
 
@@ -497,8 +928,22 @@ class WFprocessor(object):
 
             self._prof.prof('wf_init_start', uid=self._uid)
 
-            for p in self._workflow:
-                p._assign_uid(self._sid)
+            self._uid_map.clear()
+
+            with self._ready_lock:
+                self._ready.clear()
+
+            with self._completion:
+                self._incomplete.clear()
+
+            # allocate the uids of all pipelines in one go (stages and tasks
+            # are handled alike by their parents)
+            uids = generate_ids('pipeline.%(item_counter)04d',
+                                len(self._workflow), ns=self._sid)
+
+            for p, uid in zip(self._workflow, uids):
+                p._assign_uid(self._sid, uid, lazy=self._lazy_init)
+                self._register_pipeline(p)
 
             self._prof.prof('wf_init_stop', uid=self._uid)
 
@@ -524,6 +969,13 @@ class WFprocessor(object):
             self._enqueue_thread_terminate = threading.Event()
             self._dequeue_thread_terminate = threading.Event()
 
+            if self._report_mode == 'progress':
+                self._reporter_terminate.clear()
+                self._reporter_thread = threading.Thread(
+                                                    target=self._reporter,
+                                                    name='reporter-thread')
+                self._reporter_thread.start()
+
             # Start dequeue thread
             self._dequeue_thread = threading.Thread(target=self._dequeue,
                                                     name='dequeue-thread')
@@ -531,7 +983,9 @@ class WFprocessor(object):
             self._prof.prof('starting dequeue-thread', uid=self._uid)
             self._dequeue_thread.start()
 
-            # Start enqueue thread
+            # Start enqueue thread, make sure the initial workload gets
+            # scheduled right away
+            self._wakeup.set()
             self._enqueue_thread = threading.Thread(target=self._enqueue,
                                                     name='enqueue-thread')
             self._logger.info('Starting enqueue-thread')
@@ -563,6 +1017,7 @@ class WFprocessor(object):
                 if not self._enqueue_thread_terminate.is_set():
                     self._logger.info('Terminating enqueue-thread')
                     self._enqueue_thread_terminate.set()
+                    self._wakeup.set()
                     self._enqueue_thread.join()
                     self._enqueue_thread = None
 
@@ -574,6 +1029,15 @@ class WFprocessor(object):
                     self._dequeue_thread.join()
                     self._dequeue_thread = None
 
+            if self._reporter_thread:
+                self._logger.info('Terminating reporter-thread')
+                self._reporter_terminate.set()
+                self._reporter_thread.join()
+                self._reporter_thread = None
+
+            # report what is left
+            self._flush_reports()
+
             self._logger.info('WFprocessor terminated')
             self._prof.prof('wfp_stop', uid=self._uid)
             self._prof.close()
@@ -592,13 +1056,8 @@ class WFprocessor(object):
         """
 
         try:
-            for pipe in self._workflow:
-                with pipe.lock:
-                    if pipe.completed:
-                        pass
-                    else:
-                        return True
-            return False
+            with self._completion:
+                return self._check_incomplete()
 
         except Exception as ex:
             self._logger.exception(
@@ -606,6 +1065,42 @@ class WFprocessor(object):
             raise
 
 
+    # --------------------------------------------------------------------------
+    #
+    def wait_workflow(self, timeout=None):
+        """
+        **Purpose**: Block until the workflow completed, or for at most
+        `timeout` seconds.  Returns `True` if the workflow is still incomplete.
+        """
+
+        with self._completion:
+            self._completion.wait_for(lambda: not self._check_incomplete(),
+                                      timeout=timeout)
+            return self._check_incomplete()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_incomplete(self):
+
+        # pipelines are usually removed once they complete, but the completed
+        # flag can also be set directly: prune the pipelines found completed.
+        # `pipe.completed` is thread safe, no need to acquire the pipe lock.
+        completed  = list()
+        incomplete = False
+
+        for pipe in self._incomplete:
+            if not pipe.completed:
+                incomplete = True
+                break
+            completed.append(pipe)
+
+        for pipe in completed:
+            del self._incomplete[pipe]
+
+        return incomplete
+
+
     # --------------------------------------------------------------------------
     #
     def check_processor(self):
@@ -5,7 +5,6 @@ __license__   = "MIT"
 
 
 import os
-import json
 import pika
 import uuid
 
@@ -13,8 +12,12 @@ import threading     as mt
 import radical.utils as ru
 
 from ...exceptions import EnTKError, TypeError
+from ...utils      import mq_utils
+from ...utils      import serializer
 
 from .resource_manager import Base_ResourceManager
+from ..                import transport
+from ..placeholders    import Placeholders
 
 
 # ------------------------------------------------------------------------------
@@ -28,24 +31,41 @@ class Base_TaskManager(object):
 
     :arguments:
         :pending_queue:     (list) List of queue(s) with tasks ready to be
-                            executed. Currently, only one queue.
+                            executed. Each queue is consumed by its own thread.
         :completed_queue:   (list) List of queue(s) with tasks that have
-                            finished execution. Currently, only one queue.
+                            finished execution. Completed tasks are spread
+                            over all queues.
         :rmgr:              (ResourceManager) Object to be used to access the
                             Pilot where the tasks can be submitted
         :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
                             parameters necessary to connect to RabbitMQ
-
-    Currently, EnTK is configured to work with one pending queue and one
-    completed queue. In the future, the number of queues can be varied for
-    different throughput requirements at the cost of additional Memory and CPU
-    consumption.
+        :rmq_consumer:      (str) 'poll' to fetch messages via `basic_get`,
+                            'push' to have them delivered via `basic_consume`
+        :rmq_prefetch:      (int) number of unacknowledged messages the broker
+                            pushes in advance ('push' consumer only)
+        :serializer:        (str) serializer for the task messages sent to the
+                            other components: 'json' or 'msgpack'
+        :submit_chunk:      (int) number of tasks submitted to the RTS at
+                            once, `0` submits each received bulk as a whole
+        :cud_workers:       (int) number of processes which convert tasks into
+                            RTS task descriptions, `0` converts them in the
+                            submitting thread (RP only).  Bulks of fewer than
+                            `ENTK_CUD_POOL_MIN` (default: 1024) tasks are
+                            always converted in the submitting thread.
+        :evict_placeholders: (bool) move the placeholders of the tasks of
+                            completed pipelines from memory to disk
+
+    The number of pending and completed queues is set by the `pending_qs` and
+    `completed_qs` config options, and can be increased for wide stages at the
+    cost of additional memory and CPU consumption.
     """
 
     # --------------------------------------------------------------------------
     #
     def __init__(self, sid, pending_queue, completed_queue, rmgr,
-                       rmq_conn_params, rts):
+                       rmq_conn_params, rts, rmq_consumer='poll',
+                       rmq_prefetch=64, serializer='json', submit_chunk=1024,
+                       cud_workers=0, evict_placeholders=True):
 
         if not isinstance(sid, str):
             raise TypeError(expected_type=str,
@@ -74,6 +94,12 @@ class Base_TaskManager(object):
         self._rmgr            = rmgr
         self._rts             = rts
         self._rmq_conn_params = rmq_conn_params
+        self._rmq_consumer    = rmq_consumer
+        self._rmq_prefetch    = rmq_prefetch
+        self._serializer      = serializer
+        self._submit_chunk    = submit_chunk
+        self._cud_workers     = cud_workers
+        self._evict_ph        = evict_placeholders
 
         # Utility parameters
         self._uid  = ru.generate_id('task_manager.%(item_counter)04d',
@@ -86,7 +112,7 @@ class Base_TaskManager(object):
         self._dh = ru.DebugHelper(name=name)
 
         # Thread should run till terminate condtion is encountered
-        mq_connection = pika.BlockingConnection(rmq_conn_params)
+        mq_connection = transport.connect(rmq_conn_params)
 
         self._hb_request_q  = '%s-hb-request'  % self._sid
         self._hb_response_q = '%s-hb-response' % self._sid
@@ -103,8 +129,19 @@ class Base_TaskManager(object):
 
         self._tmgr_process = None
         self._hb_thread    = None
+        self._consumers    = list()
         self._hb_interval  = int(os.getenv('ENTK_HB_INTERVAL', 30))
 
+        # bulk state updates are sent to the AppManager in batches of
+        # `_sync_batch` objects, with up to `_sync_window` unacknowledged
+        # batches in flight
+        self._sync_batch   = int(os.getenv('ENTK_SYNC_BATCH',  1024))
+        self._sync_window  = int(os.getenv('ENTK_SYNC_WINDOW',    4))
+
+        # in 'poll' consumer mode, idle consumers back off exponentially, up
+        # to `_poll_idle` seconds between polls
+        self._poll_idle    = float(os.getenv('ENTK_POLL_IDLE', 0.1))
+
         mq_connection.close()
 
 
@@ -135,21 +172,155 @@ class Base_TaskManager(object):
 
     # --------------------------------------------------------------------------
     #
-    def _sync_with_master(self, obj, obj_type, channel, queue):
+    def _consume_pending(self, pending_queue, task_queue, rmq_conn_params):
+        """
+        **Purpose**: Method to be run by one thread per pending queue in the
+                     tmgr process. It receives bulks of tasks from
+                     `pending_queue` and hands them to the thread which submits
+                     them to the RTS via `task_queue`.
+        """
 
-        corr_id = str(uuid.uuid4())
-        body    = json.dumps({'object': obj.to_dict(),
-                              'type'  : obj_type})
+        try:
 
-        if   obj_type == 'Task' : msg = obj.parent_stage['uid']
-        elif obj_type == 'Stage': msg = obj.parent_pipeline['uid']
-        else                    : msg = ''
+            # ------------------------------------------------------------------
+            def pending_msg(mq_channel, method_frame, props, body):
 
-        self._prof.prof('pub_sync', state=obj.state, uid=obj.uid, msg=msg)
-        self._log.debug('%s (%s) to sync with amgr', obj.uid, obj.state)
+                task_queue.put(serializer.loads(body))
 
-        channel.basic_publish(exchange='', routing_key=queue, body=body,
-                        properties=pika.BasicProperties(correlation_id=corr_id))
+                mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+            # ------------------------------------------------------------------
+
+            # Acquire a (pooled) connection+channel to the rmq server
+            mq_channel    = mq_utils.get_channel(rmq_conn_params,
+                                                 self._prof, self._uid)
+            mq_connection = mq_channel.connection
+
+            if self._rmq_consumer == 'push':
+
+                # the broker pushes tasks to us, we block until it does so
+                mq_channel.basic_qos(prefetch_count=self._rmq_prefetch)
+                mq_channel.basic_consume(pending_msg, queue=pending_queue)
+
+                while not self._tmgr_terminate.is_set():
+                    mq_connection.process_data_events(time_limit=1)
+
+            else:
+
+                idle = 0.0
+                while not self._tmgr_terminate.is_set():
+
+                    # Get tasks from the pending queue
+                    method_frame, props, body = \
+                                       mq_channel.basic_get(queue=pending_queue)
+                    if body:
+                        pending_msg(mq_channel, method_frame, props, body)
+                        idle = 0.0
+
+                    else:
+                        # back off while the queue is empty
+                        idle = min(max(2 * idle, 0.001), self._poll_idle)
+                        mq_connection.sleep(idle)
+
+        except Exception as e:
+            self._log.exception('Error in task execution: %s', e)
+            raise
+
+        finally:
+            mq_utils.close_connection(rmq_conn_params, self._prof, self._uid)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _start_pending_consumers(self, pending_queue, task_queue,
+                                       rmq_conn_params):
+
+        for qname in pending_queue:
+
+            consumer = mt.Thread(target=self._consume_pending,
+                                 name='pending-consumer',
+                                 args=(qname, task_queue, rmq_conn_params))
+            consumer.start()
+            self._consumers.append(consumer)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _join_pending_consumers(self):
+
+        for consumer in self._consumers:
+            consumer.join()
+
+        self._consumers = list()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _chunks(self, msgs):
+        '''
+        Split a bulk of task messages into the chunks of up to `_submit_chunk`
+        tasks in which they are submitted to the RTS.
+        '''
+
+        size = self._submit_chunk or len(msgs) or 1
+
+        for start in range(0, len(msgs), size):
+            yield msgs[start:start + size]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _create_placeholders(self, journal=False):
+        '''
+        Create the placeholder index of the tmgr process.  Placeholders of
+        completed pipelines are spilled into the session directory.  The
+        index keeps a journal of its changes if `journal` is set.
+        '''
+
+        return Placeholders(spill_dir='%s/%s.placeholders' % (self._path,
+                                                               self._uid),
+                            journal=journal)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _evict_placeholders(self, placeholders, pipelines):
+        '''
+        Evict the placeholders of the given completed pipelines (if enabled),
+        and profile the number of entries held in memory and the number of
+        pipelines spilled to disk (as `msg='<entries>/<pipelines>'`).
+        '''
+
+        if self._evict_ph:
+            for pname in pipelines:
+                placeholders.evict(pname)
+
+        self._log.debug('pipelines %s completed', pipelines)
+        self._prof.prof('placeholders', uid=self._uid,
+                        msg='%d/%d' % (len(placeholders), placeholders.spilled))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_obj(self, obj, obj_type):
+
+        # the AppManager holds the full task descriptions, so only the state
+        # related attributes of tasks are synced
+        if obj_type == 'Task': return obj._to_delta()
+        else                 : return obj.to_dict(history=False)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_msg(self, obj, obj_type):
+
+        if   obj_type == 'Task' : return obj.parent_stage['uid']
+        elif obj_type == 'Stage': return obj.parent_pipeline['uid']
+        else                    : return ''
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_reply_queue(self, queue):
 
         # all queue name parts up to the last three are used as sid, the last
         # three parts are channel specifiers which need to be inversed to obtain
@@ -159,36 +330,138 @@ class Base_TaskManager(object):
         reply_queue = '-'.join(list(reversed(qname)))
         reply_queue = sid + '-' + reply_queue
 
-        while True:
-
-            # FIXME: is this a busy loop?
+        return reply_queue
 
-            method_frame, props, body = channel.basic_get(queue=reply_queue)
 
-            if not body:
-                continue
+    # --------------------------------------------------------------------------
+    #
+    def _sync_wait(self, channel, reply_queue, pending, limit=0):
+        """
+        Consume acknowledgements from `reply_queue` until no more than `limit`
+        of the correlation ids in the set `pending` are left unacknowledged.
+        Acknowledged ids are removed from `pending`, replies to requests which
+        are not pending (anymore) are dropped.
+        """
 
-            if corr_id != props.correlation_id:
-                continue
+        # ----------------------------------------------------------------------
+        def on_reply(channel, method_frame, props, body):
 
             channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
-            self._prof.prof('sync', state=obj.state, uid=obj.uid, msg=msg)
-            self._log.debug('%s (%s) synced with amgr', obj.uid, obj.state)
+            if props.correlation_id in pending:
+                pending.remove(props.correlation_id)
+            else:
+                self._log.warning('drop stale reply %s', body)
+        # ----------------------------------------------------------------------
+
+        if self._rmq_consumer == 'push':
+
+            # block until the broker pushes the replies to us
+            tag = channel.basic_consume(on_reply, queue=reply_queue)
+
+            while len(pending) > limit:
+                channel.connection.process_data_events(time_limit=None)
+
+            channel.basic_cancel(tag)
+
+        else:
+
+            idle = 0.0
+            while len(pending) > limit:
+
+                method_frame, props, body = channel.basic_get(
+                                                             queue=reply_queue)
+                if body:
+                    on_reply(channel, method_frame, props, body)
+                    idle = 0.0
+
+                else:
+                    # back off while no replies are available
+                    idle = min(max(2 * idle, 0.001), self._poll_idle)
+                    channel.connection.sleep(idle)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_with_master(self, obj, obj_type, channel, queue):
+
+        corr_id = str(uuid.uuid4())
+        body    = serializer.dumps({'object': self._sync_obj(obj, obj_type),
+                                    'type'  : obj_type}, self._serializer)
+        msg     = self._sync_msg(obj, obj_type)
+
+        self._prof.prof('pub_sync', state=obj.state, uid=obj.uid, msg=msg)
+        self._log.debug('%s (%s) to sync with amgr', obj.uid, obj.state)
+
+        channel.basic_publish(exchange='', routing_key=queue, body=body,
+                        properties=pika.BasicProperties(correlation_id=corr_id))
+
+        self._sync_wait(channel, self._sync_reply_queue(queue), {corr_id})
+
+        self._prof.prof('sync', state=obj.state, uid=obj.uid, msg=msg)
+        self._log.debug('%s (%s) synced with amgr', obj.uid, obj.state)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_with_master_bulk(self, objs, obj_type, channel, queue):
+        """
+        Sync a list of objects of the same type with the AppManager.  The
+        objects are sent in batches of `_sync_batch` objects per message, and
+        the AppManager acknowledges each batch as a whole.  Up to
+        `_sync_window` batches are published before waiting for their acks.
+        The call returns once all batches are acknowledged.
+        """
+
+        reply_queue = self._sync_reply_queue(queue)
+        pending     = set()
+
+        for start in range(0, len(objs), self._sync_batch):
+
+            batch     = objs[start:start + self._sync_batch]
+            corr_id   = str(uuid.uuid4())
+            objs_wire = [self._sync_obj(obj, obj_type) for obj in batch]
+            body      = serializer.dumps({'objects': objs_wire,
+                                          'type'   : obj_type},
+                                         self._serializer)
+
+            for obj in batch:
+                self._prof.prof('pub_sync', state=obj.state, uid=obj.uid,
+                                msg=self._sync_msg(obj, obj_type))
+
+            self._log.debug('%d objects to sync with amgr', len(batch))
+
+            channel.basic_publish(exchange='', routing_key=queue, body=body,
+                        properties=pika.BasicProperties(correlation_id=corr_id))
+            pending.add(corr_id)
+
+            # do not let too many batches pile up
+            self._sync_wait(channel, reply_queue, pending,
+                            limit=self._sync_window - 1)
+
+        self._sync_wait(channel, reply_queue, pending)
+
+        for obj in objs:
+            self._prof.prof('sync', state=obj.state, uid=obj.uid,
+                            msg=self._sync_msg(obj, obj_type))
+
+        self._log.debug('%d objects synced with amgr', len(objs))
 
-            break
 
     # --------------------------------------------------------------------------
     #
     def _advance(self, obj, obj_type, new_state, channel, queue):
+        '''
+        Advance a single object to `new_state` and sync it with the AppManager
+        (the task managers advance tasks in bulk, see `_advance_bulk()`).
+        Failed syncs are not rolled back: the AppManager ignores transitions
+        to earlier states.
+        '''
 
         try:
-            old_state = obj.state
             obj.state = new_state
 
-            if   obj_type == 'Task' : msg = obj.parent_stage['uid']
-            elif obj_type == 'Stage': msg = obj.parent_pipeline['uid']
-            else                    : msg = None
+            msg = self._sync_msg(obj, obj_type)
 
             self._prof.prof('advance', uid=obj.uid, state=obj.state, msg=msg)
             self._log.info('Transition %s to %s', obj.uid, new_state)
@@ -200,8 +473,33 @@ class Base_TaskManager(object):
 
             self._log.exception('Transition %s to state %s failed, error: %s',
                                 obj.uid, new_state, ex)
-            obj.state = old_state
-            self._sync_with_master(obj, obj_type, channel, queue)
+            raise
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _advance_bulk(self, objs, obj_type, new_state, channel, queue):
+        '''
+        Advance a list of objects to `new_state` and sync them with the
+        AppManager in batches.  As for `_advance()`, failed syncs are not
+        rolled back: callers retry or fail the objects.
+        '''
+
+        try:
+            for obj in objs:
+                obj.state = new_state
+
+                self._prof.prof('advance', uid=obj.uid, state=obj.state,
+                                msg=self._sync_msg(obj, obj_type))
+                self._log.info('Transition %s to %s', obj.uid, new_state)
+
+            self._sync_with_master_bulk(objs, obj_type, channel, queue)
+
+
+        except Exception as ex:
+
+            self._log.exception('Transition of %d objects to state %s failed, '
+                                'error: %s', len(objs), new_state, ex)
             raise
 
 
@@ -226,7 +524,7 @@ class Base_TaskManager(object):
 
             self._prof.prof('hbeat_start', uid=self._uid)
 
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
+            mq_connection = transport.connect(self._rmq_conn_params)
             mq_channel = mq_connection.channel()
 
             while not self._hb_terminate.is_set():
@@ -364,7 +662,7 @@ class Base_TaskManager(object):
 
             if not self.check_heartbeat() or self.check_manager():
 
-                conn = pika.BlockingConnection(self._rmq_conn_params)
+                conn = transport.connect(self._rmq_conn_params)
                 mq_channel = conn.channel()
 
                 # To respond to heartbeat - get request from rpc_queue
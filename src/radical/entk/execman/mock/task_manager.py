@@ -5,15 +5,17 @@ __license__   = "MIT"
 
 
 import os
-import json
 import pika
 import queue
+import itertools
 
 import threading       as mt
 import multiprocessing as mp
 
 from ...exceptions       import EnTKError
 from ...                 import states, Task
+from ...utils            import mq_utils
+from ...utils            import serializer
 from ..base.task_manager import Base_TaskManager
 
 
@@ -28,27 +30,48 @@ class TaskManager(Base_TaskManager):
 
     :arguments:
         :pending_queue:     (list) List of queue(s) with tasks ready to be
-                            executed. Currently, only one queue.
+                            executed. Each queue is consumed by its own thread.
         :completed_queue:   (list) List of queue(s) with tasks that have
-                            finished execution. Currently, only one queue.
+                            finished execution. Completed tasks are spread
+                            over all queues.
         :rmgr:              (ResourceManager) Object to be used to access the
                             Pilot where the tasks can be submitted
         :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
                             parameters necessary to connect to RabbitMQ
-
-    Currently, EnTK is configured to work with one pending queue and one
-    completed queue. In the future, the number of queues can be varied for
-    different throughput requirements at the cost of additional Memory and CPU
-    consumption.
+        :rmq_consumer:      (str) 'poll' to fetch messages via `basic_get`,
+                            'push' to have them delivered via `basic_consume`
+        :rmq_prefetch:      (int) number of unacknowledged messages the broker
+                            pushes in advance ('push' consumer only)
+        :serializer:        (str) serializer for the task messages sent to the
+                            other components: 'json' or 'msgpack'
+        :submit_chunk:      (int) number of tasks submitted to the RTS at
+                            once, `0` submits each received bulk as a whole
+        :cud_workers:       (int) number of processes which convert tasks into
+                            RTS task descriptions, `0` converts them in the
+                            submitting thread (RP only)
+        :evict_placeholders: (bool) move the placeholders of the tasks of
+                            completed pipelines from memory to disk
+
+    The number of pending and completed queues is set by the `pending_qs` and
+    `completed_qs` config options, and can be increased for wide stages at the
+    cost of additional memory and CPU consumption.
     """
 
     # --------------------------------------------------------------------------
     #
     def __init__(self, sid, pending_queue, completed_queue, rmgr,
-                       rmq_conn_params):
+                       rmq_conn_params, rmq_consumer='poll', rmq_prefetch=64,
+                       serializer='json', submit_chunk=1024, cud_workers=0,
+                       evict_placeholders=True):
 
         super(TaskManager, self).__init__(sid, pending_queue, completed_queue,
-                                          rmgr, rmq_conn_params, rts='mock')
+                                          rmgr, rmq_conn_params, rts='mock',
+                                          rmq_consumer=rmq_consumer,
+                                          rmq_prefetch=rmq_prefetch,
+                                          serializer=serializer,
+                                          submit_chunk=submit_chunk,
+                                          cud_workers=cud_workers,
+                                          evict_placeholders=evict_placeholders)
         self._rts_runner = None
 
         self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
@@ -85,17 +108,10 @@ class TaskManager(Base_TaskManager):
         try:
 
             # ------------------------------------------------------------------
-            def heartbeat_response(mq_channel):
+            def heartbeat_response(mq_channel, method_frame, props, body):
 
                 try:
 
-                    # Get request from heartbeat-req for heartbeat response
-                    method_frame, props, body = \
-                                  mq_channel.basic_get(queue=self._hb_request_q)
-
-                    if not body:
-                        return
-
                     self._log.info('Received heartbeat request')
 
                     nprops = pika.BasicProperties(
@@ -115,14 +131,16 @@ class TaskManager(Base_TaskManager):
                     self._log.exception('Failed to respond to heartbeat, '
                                         'error: %s', e)
                     raise
+
             # ------------------------------------------------------------------
 
             self._prof.prof('tmgr process started', uid=self._uid)
             self._log.info('Task Manager process started')
 
-            # Acquire a connection+channel to the rmq server
-            mq_connection = pika.BlockingConnection(rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            # Acquire a (pooled) connection+channel to the rmq server
+            mq_channel    = mq_utils.get_channel(rmq_conn_params,
+                                                 self._prof, self._uid)
+            mq_connection = mq_channel.connection
 
             # Make sure the heartbeat response queue is empty
             mq_channel.queue_delete(queue=self._hb_response_q)
@@ -137,29 +155,34 @@ class TaskManager(Base_TaskManager):
                                                rmq_conn_params))
             self._rts_runner.start()
 
-            self._prof.prof('tmgr infrastructure setup done', uid=uid)
-
-            while not self._tmgr_terminate.is_set():
+            # Start one thread per pending queue to receive tasks
+            self._start_pending_consumers(pending_queue, task_queue,
+                                          rmq_conn_params)
 
-                try:
+            self._prof.prof('tmgr infrastructure setup done', uid=uid)
 
-                    # Get tasks from the pending queue
-                    method_frame, header_frame, body = \
-                                    mq_channel.basic_get(queue=pending_queue[0])
+            if self._rmq_consumer == 'push':
 
-                    if body:
+                # the broker pushes heartbeat requests to us, we block until it
+                # does so
+                mq_channel.basic_consume(heartbeat_response,
+                                         queue=self._hb_request_q)
 
-                        body = json.loads(body)
-                        task_queue.put(body)
+                while not self._tmgr_terminate.is_set():
+                    mq_connection.process_data_events(time_limit=1)
 
-                        mq_channel.basic_ack(
-                                delivery_tag=method_frame.delivery_tag)
+            else:
 
-                    heartbeat_response(mq_channel)
+                while not self._tmgr_terminate.is_set():
 
-                except Exception as e:
-                    self._log.exception('Error in task execution: %s', e)
-                    raise
+                    # Get request from heartbeat-req for heartbeat response
+                    method_frame, props, body = \
+                                  mq_channel.basic_get(queue=self._hb_request_q)
+                    if body:
+                        heartbeat_response(mq_channel, method_frame, props,
+                                           body)
+                    else:
+                        mq_connection.sleep(1)
 
 
         except KeyboardInterrupt:
@@ -178,10 +201,12 @@ class TaskManager(Base_TaskManager):
 
             self._prof.prof('tmgr_term', uid=uid)
 
+            self._join_pending_consumers()
+
             if self._rts_runner:
                 self._rts_runner.join()
 
-            mq_connection.close()
+            mq_utils.close_connection(rmq_conn_params, self._prof, self._uid)
             self._prof.close()
 
 
@@ -194,27 +219,21 @@ class TaskManager(Base_TaskManager):
                      'task_queue' and submits them to the RADICAL Pilot RTS.
         '''
 
-        placeholders = dict()
+        placeholders = self._create_placeholders()
 
         # ----------------------------------------------------------------------
         def load_placeholder(task):
 
             parent_pipeline = str(task.parent_pipeline['name'])
-            parent_stage = str(task.parent_stage['name'])
+            parent_stage    = str(task.parent_stage['name'])
 
-            if parent_pipeline not in placeholders:
-                placeholders[parent_pipeline] = dict()
-
-            if parent_stage not in placeholders[parent_pipeline]:
-                placeholders[parent_pipeline][parent_stage] = dict()
-
-            if None not in [parent_pipeline, parent_stage, task.name]:
-                placeholders[parent_pipeline][parent_stage][str(
-                    task.name)] = str(task.path)
+            if task.name is not None:
+                placeholders.add(parent_pipeline, parent_stage, str(task.name),
+                                 {'path'   : str(task.path),
+                                  'rts_uid': None})
         # ----------------------------------------------------------------------
 
-        mq_connection = pika.BlockingConnection(rmq_conn_params)
-        mq_channel = mq_connection.channel()
+        completed_qs = itertools.cycle(self._completed_queue)
 
         try:
 
@@ -234,32 +253,52 @@ class TaskManager(Base_TaskManager):
 
                 task_queue.task_done()
 
-                bulk_tasks = list()
+                # the WFprocessor informs us about completed pipelines
+                if isinstance(body, dict):
 
-                for msg in body:
+                    self._evict_placeholders(placeholders, body['completed'])
+                    continue
 
-                    task = Task()
-                    task.from_dict(msg)
-                    bulk_tasks.append(task)
+                # tasks are submitted chunk by chunk, as for the RP task
+                # manager
+                for chunk in self._chunks(body):
 
-                    self._advance(task, 'Task', states.SUBMITTING,
-                                  mq_channel, '%s-tmgr-to-sync' % self._sid)
+                    bulk_tasks = list()
 
-                # this mock RTS immmedialtely completes all tasks
-                for task in bulk_tasks:
+                    for msg in chunk:
 
-                    self._advance(task, 'Task', states.COMPLETED,
-                                  mq_channel, '%s-cb-to-sync' % self._sid)
+                        task = Task()
+                        task.from_dict(msg, validate=False)
+                        bulk_tasks.append(task)
 
-                    task_as_dict = json.dumps(task.to_dict())
-                    mq_channel.basic_publish(
-                            exchange='',
-                            routing_key='%s-completedq-1' % self._sid,
-                            body=task_as_dict)
+                    # Acquire a (pooled) connection+channel to the rmq server
+                    mq_channel = mq_utils.get_channel(rmq_conn_params,
+                                                      self._prof, self._uid)
 
-                    self._log.info('Pushed task %s with state %s to '
-                                   'completed queue %s-completedq-1',
-                                   task.uid, task.state, self._sid)
+                    self._advance_bulk(bulk_tasks, 'Task', states.SUBMITTING,
+                                       mq_channel,
+                                       '%s-tmgr-to-sync' % self._sid)
+
+                    # this mock RTS immmedialtely completes all tasks
+                    self._advance_bulk(bulk_tasks, 'Task', states.COMPLETED,
+                                       mq_channel, '%s-cb-to-sync' % self._sid)
+
+                    for task in bulk_tasks:
+
+                        load_placeholder(task)
+
+                        # spread completed tasks over all completed queues
+                        completed_q  = next(completed_qs)
+                        task_as_msg  = serializer.dumps(task._to_delta(),
+                                                        self._serializer)
+                        mq_channel.basic_publish(
+                                exchange='',
+                                routing_key=completed_q,
+                                body=task_as_msg)
+
+                        self._log.info('Pushed task %s with state %s to '
+                                       'completed queue %s',
+                                       task.uid, task.state, completed_q)
 
         except KeyboardInterrupt:
             self._log.exception('Execution interrupted (probably by Ctrl+C), '
@@ -269,6 +308,10 @@ class TaskManager(Base_TaskManager):
             self._log.exception('%s failed with %s', self._uid, e)
             raise EnTKError(e)
 
+        finally:
+            mq_utils.close_connection(rmq_conn_params, self._prof, self._uid)
+            placeholders.close()
+
 
     # --------------------------------------------------------------------------
     #
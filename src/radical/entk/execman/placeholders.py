@@ -0,0 +1,336 @@
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import pickle
+import shutil
+import collections
+
+from ..exceptions import EnTKError
+
+
+# ------------------------------------------------------------------------------
+#
+# Tasks refer to the sandboxes of previously completed tasks via placeholders
+# of the form `$Pipeline_<pipeline>_Stage_<stage>_Task_<task>` (using the names
+# of the respective objects).  The task manager records an entry for each
+# completed task, i.e., a dict with the task's `path` and the `rts_uid` of the
+# unit it was executed as, and resolves the placeholders of new tasks against
+# those entries.
+#
+# The entries are indexed by the `(pipeline, stage, task)` name tuple.  The
+# entries of a pipeline can be evicted once the pipeline completed, so that the
+# index does not grow with the number of tasks of a long running session.
+# Evicted entries are spilled to disk (one file per pipeline) if a spill
+# directory is given, and are then still found, if at a higher cost.
+#
+# An index can keep a journal of its changes, which replicas (e.g., in worker
+# processes) apply to stay in sync, without being sent the whole index again.
+# Journal positions are counted from the creation of the index.
+#
+
+
+# ------------------------------------------------------------------------------
+#
+class Placeholders(object):
+    '''
+    Flat index of the placeholder entries known to a task manager.
+    '''
+
+    # number of spilled pipelines kept loaded
+    _cache_size = 4
+
+    def __init__(self, spill_dir=None, journal=False):
+
+        self._entries   = dict()  # (pipeline, stage, task) -> entry
+        self._pipelines = dict()  # pipeline -> keys of its entries (ordered)
+        self._names     = dict()  # task -> {pipeline: key}, to resolve tags
+
+        self._spill_dir = spill_dir
+        self._spilled   = dict()  # pipeline -> spill file
+        self._loaded    = collections.OrderedDict()  # pipeline -> entries
+
+        self._journal   = list() if journal else None
+        self._seq       = 0       # journal position of `_journal[0]`, or of
+                                  # the next change to apply to a replica
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def from_dict(cls, placeholders):
+        '''
+        Create an index from a nested `{pipeline: {stage: {task: entry}}}`
+        dictionary.
+        '''
+
+        index = cls()
+
+        for pname, stages in placeholders.items():
+            for sname, tasks in stages.items():
+                for tname, entry in tasks.items():
+                    index.add(pname, sname, tname, entry)
+
+        return index
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, pname, sname, tname, entry):
+
+        key = (pname, sname, tname)
+
+        self._entries[key] = entry
+        self._pipelines.setdefault(pname, dict())[key] = None
+        self._names.setdefault(tname, dict()).setdefault(pname, key)
+
+        if self._journal is not None:
+            self._journal.append(('add', key, entry))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, pname, sname, tname):
+        '''
+        Return the entry for the given names, or `None` if there is none.
+        '''
+
+        entry = self._entries.get((pname, sname, tname))
+
+        if entry is None and pname in self._spilled:
+            entry = self._load(pname).get((sname, tname))
+
+        return entry
+
+
+    # --------------------------------------------------------------------------
+    #
+    def find(self, tname, pname):
+        '''
+        Return the entry of a task named `tname`, preferably one of pipeline
+        `pname`, or `None` if there is none.
+        '''
+
+        keys = self._names.get(tname, dict())
+
+        if pname in keys:
+            return self._entries[keys[pname]]
+
+        entry = self._find_spilled(pname, tname)
+        if entry:
+            return entry
+
+        if keys:
+            return self._entries[next(iter(keys.values()))]
+
+        for other in self._spilled:
+            entry = self._find_spilled(other, tname)
+            if entry:
+                return entry
+
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def evict(self, pname):
+        '''
+        Remove all entries of pipeline `pname` from memory, and spill them to
+        disk if a spill directory is set.
+        '''
+
+        entries = self._pop(pname)
+
+        if entries and self._spill_dir:
+            self._spill(pname, entries)
+
+        if self._journal is not None:
+            self._journal.append(('evict', pname, self._spilled.get(pname)))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _pop(self, pname):
+
+        entries = dict()
+
+        for key in self._pipelines.pop(pname, list()):
+
+            entries[key[1:]] = self._entries.pop(key)
+
+            keys = self._names.get(key[2])
+            if keys and keys.get(pname) == key:
+                del keys[pname]
+                if not keys:
+                    del self._names[key[2]]
+
+        return entries
+
+
+    # --------------------------------------------------------------------------
+    #
+    def changes(self, since):
+        '''
+        Return the journaled changes since journal position `since`.
+        '''
+
+        return self._journal[since - self._seq:]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def trim(self, upto):
+        '''
+        Drop the journaled changes before journal position `upto`, which all
+        replicas applied.
+        '''
+
+        if upto > self._seq:
+            del self._journal[:upto - self._seq]
+            self._seq = upto
+
+
+    # --------------------------------------------------------------------------
+    #
+    def apply(self, since, changes):
+        '''
+        Apply changes from journal position `since` on (see `changes()`) to
+        a replica, skipping those it already applied.  Spill files are shared
+        with the journaled index.  Returns the new position of the replica.
+        '''
+
+        if since > self._seq:
+            raise EnTKError('placeholder changes since %d missing' % since)
+
+        for change in changes[self._seq - since:]:
+
+            if change[0] == 'add':
+                self.add(*change[1], change[2])
+
+            else:
+                _, pname, fname = change
+                self._pop(pname)
+                if fname:
+                    self._spilled[pname] = fname
+                    self._loaded.pop(pname, None)
+
+        self._seq = max(self._seq, since + len(changes))
+
+        return self._seq
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _spill(self, pname, entries):
+
+        fname = self._spilled.get(pname)
+
+        if fname:
+            # a later pipeline of the same name completed
+            spilled = dict(self._load(pname))
+            spilled.update(entries)
+            entries = spilled
+
+        else:
+            os.makedirs(self._spill_dir, exist_ok=True)
+            fname = '%s/%06d.pkl' % (self._spill_dir, len(self._spilled))
+
+        # spill files are replaced atomically, as they may be read by other
+        # processes which got a copy of this index
+        with open(fname + '.tmp', 'wb') as fout:
+            pickle.dump(entries, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(fname + '.tmp', fname)
+
+        self._spilled[pname] = fname
+        self._loaded.pop(pname, None)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _load(self, pname):
+
+        entries = self._loaded.get(pname)
+
+        if entries is None:
+
+            with open(self._spilled[pname], 'rb') as fin:
+                entries = pickle.load(fin)
+
+            self._loaded[pname] = entries
+            if len(self._loaded) > self._cache_size:
+                self._loaded.popitem(last=False)
+
+        else:
+            self._loaded.move_to_end(pname)
+
+        return entries
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _find_spilled(self, pname, tname):
+
+        if pname not in self._spilled:
+            return None
+
+        for (_, name), entry in self._load(pname).items():
+            if name == tname:
+                return entry
+
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def spilled(self):
+        '''
+        Number of pipelines spilled to disk.
+        '''
+
+        return len(self._spilled)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        '''
+        Remove the spill files.
+        '''
+
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+        self._spilled = dict()
+        self._loaded  = collections.OrderedDict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return len(self._entries)
+
+
+    def __contains__(self, pname):
+
+        return pname in self._pipelines or pname in self._spilled
+
+
+    def __getstate__(self):
+
+        # loaded spill files are not copied along
+        state = dict(self.__dict__)
+        state['_loaded']  = collections.OrderedDict()
+
+        # copies are replicas, which are up to date with the journal
+        if self._journal is not None:
+            state['_journal'] = None
+            state['_seq']     = self._seq + len(self._journal)
+
+        return state
+
+
+# ------------------------------------------------------------------------------
+
@@ -5,9 +5,10 @@ __license__   = "MIT"
 
 
 import os
-import json
 import pika
 import queue
+import itertools
+import collections
 
 import threading       as mt
 import multiprocessing as mp
@@ -16,8 +17,12 @@ import radical.pilot   as rp
 
 from ...exceptions       import EnTKError
 from ...                 import states, Task
+from ...utils            import mq_utils
+from ...utils            import serializer
 from ..base.task_manager import Base_TaskManager
 from .task_processor     import create_cud_from_task, create_task_from_cu
+from .task_processor     import create_cud_from_dict, get_cud_dicts_from_msgs
+from .task_processor     import init_cud_worker
 
 
 # ------------------------------------------------------------------------------
@@ -33,33 +38,63 @@ class TaskManager(Base_TaskManager):
 
     :arguments:
         :pending_queue:     (list) List of queue(s) with tasks ready to be
-                            executed. Currently, only one queue.
+                            executed. Each queue is consumed by its own thread.
         :completed_queue:   (list) List of queue(s) with tasks that have
-                            finished execution. Currently, only one queue.
+                            finished execution. Completed tasks are spread
+                            over all queues.
         :rmgr:              (ResourceManager) Object to be used to access the
                             Pilot where the tasks can be submitted
         :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
                             parameters necessary to connect to RabbitMQ
-
-    Currently, EnTK is configured to work with one pending queue and one
-    completed queue. In the future, the number of queues can be varied for
-    different throughput requirements at the cost of additional Memory and CPU
-    consumption.
+        :rmq_consumer:      (str) 'poll' to fetch messages via `basic_get`,
+                            'push' to have them delivered via `basic_consume`
+        :rmq_prefetch:      (int) number of unacknowledged messages the broker
+                            pushes in advance ('push' consumer only)
+        :serializer:        (str) serializer for the task messages sent to the
+                            other components: 'json' or 'msgpack'
+        :submit_chunk:      (int) number of tasks submitted to the RTS at
+                            once, `0` submits each received bulk as a whole
+        :cud_workers:       (int) number of processes which convert tasks into
+                            RTS task descriptions, `0` converts them in the
+                            submitting thread (RP only).  Bulks of fewer than
+                            `ENTK_CUD_POOL_MIN` (default: 1024) tasks are
+                            always converted in the submitting thread.
+        :evict_placeholders: (bool) move the placeholders of the tasks of
+                            completed pipelines from memory to disk
+
+    The number of pending and completed queues is set by the `pending_qs` and
+    `completed_qs` config options, and can be increased for wide stages at the
+    cost of additional memory and CPU consumption.
     """
 
     # --------------------------------------------------------------------------
     #
     def __init__(self, sid, pending_queue, completed_queue, rmgr,
-                       rmq_conn_params):
+                       rmq_conn_params, rmq_consumer='poll', rmq_prefetch=64,
+                       serializer='json', submit_chunk=1024, cud_workers=0,
+                       evict_placeholders=True):
 
         super(TaskManager, self).__init__(sid, pending_queue, completed_queue,
                                           rmgr, rmq_conn_params,
-                                          rts='radical.pilot')
+                                          rts='radical.pilot',
+                                          rmq_consumer=rmq_consumer,
+                                          rmq_prefetch=rmq_prefetch,
+                                          serializer=serializer,
+                                          submit_chunk=submit_chunk,
+                                          cud_workers=cud_workers,
+                                          evict_placeholders=evict_placeholders)
         self._umgr       = None
         self._rts_runner = None
 
         self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
 
+        # The CUD workers only pay off for large bulks of tasks: sending the
+        # tasks to the workers and the CUD attributes back costs about as much
+        # as creating the CUDs.  Smaller bulks are converted serially (see
+        # `tests/benchmarks/bench_cud_construction.py`: with 2 workers, 200
+        # tasks are converted at about 0.7x the serial rate).
+        self._cud_pool_min = int(os.getenv('ENTK_CUD_POOL_MIN', 1024))
+
         self._log.info('Created task manager object: %s', self._uid)
         self._prof.prof('tmgr_create', uid=self._uid)
 
@@ -102,20 +137,15 @@ class TaskManager(Base_TaskManager):
                      tasks on the remote machine.
         """
 
+        cud_pool = None
+
         try:
 
             # ------------------------------------------------------------------
-            def heartbeat_response(mq_channel):
+            def heartbeat_response(mq_channel, method_frame, props, body):
 
                 try:
 
-                    # Get request from heartbeat-req for heartbeat response
-                    method_frame, props, body = \
-                                  mq_channel.basic_get(queue=self._hb_request_q)
-
-                    if not body:
-                        return
-
                     self._log.info('Received heartbeat request')
 
                     nprops = pika.BasicProperties(
@@ -135,14 +165,22 @@ class TaskManager(Base_TaskManager):
                     self._log.exception('Failed to respond to heartbeat, '
                                         'error: %s', e)
                     raise
+
             # ------------------------------------------------------------------
 
             self._prof.prof('tmgr process started', uid=self._uid)
             self._log.info('Task Manager process started')
 
-            # Acquire a connection+channel to the rmq server
-            mq_connection = pika.BlockingConnection(rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            # The worker processes which convert tasks into CUDs are forked
+            # while this process does not run any other threads yet.
+            if self._cud_workers:
+                cud_pool = mp.Pool(self._cud_workers,
+                                   initializer=init_cud_worker)
+
+            # Acquire a (pooled) connection+channel to the rmq server
+            mq_channel    = mq_utils.get_channel(rmq_conn_params,
+                                                 self._prof, self._uid)
+            mq_connection = mq_channel.connection
 
             # Make sure the heartbeat response queue is empty
             mq_channel.queue_delete(queue=self._hb_response_q)
@@ -154,32 +192,38 @@ class TaskManager(Base_TaskManager):
             # Start second thread to receive tasks and push to RTS
             self._rts_runner = mt.Thread(target=self._process_tasks,
                                          args=(task_queue, rmgr,
-                                               rmq_conn_params))
+                                               rmq_conn_params, cud_pool))
             self._rts_runner.start()
 
-            self._prof.prof('tmgr infrastructure setup done', uid=uid)
+            # Start one thread per pending queue to receive tasks
+            self._start_pending_consumers(pending_queue, task_queue,
+                                          rmq_conn_params)
 
-            while not self._tmgr_terminate.is_set():
+            self._prof.prof('tmgr infrastructure setup done', uid=uid)
 
-                try:
+            if self._rmq_consumer == 'push':
 
-                    # Get tasks from the pending queue
-                    method_frame, header_frame, body = \
-                                    mq_channel.basic_get(queue=pending_queue[0])
+                # the broker pushes heartbeat requests to us, we block until it
+                # does so
+                mq_channel.basic_consume(heartbeat_response,
+                                         queue=self._hb_request_q)
 
-                    if body:
+                while not self._tmgr_terminate.is_set():
+                    mq_connection.process_data_events(time_limit=1)
 
-                        body = json.loads(body)
-                        task_queue.put(body)
+            else:
 
-                        mq_channel.basic_ack(
-                                delivery_tag=method_frame.delivery_tag)
+                while not self._tmgr_terminate.is_set():
 
-                    heartbeat_response(mq_channel)
+                    # Get request from heartbeat-req for heartbeat response
+                    method_frame, props, body = \
+                                  mq_channel.basic_get(queue=self._hb_request_q)
+                    if body:
+                        heartbeat_response(mq_channel, method_frame, props,
+                                           body)
+                    else:
+                        mq_connection.sleep(1)
 
-                except Exception as e:
-                    self._log.exception('Error in task execution: %s', e)
-                    raise
             self._log.debug('Exited TMGR main loop')
 
         except KeyboardInterrupt:
@@ -198,12 +242,18 @@ class TaskManager(Base_TaskManager):
 
             self._prof.prof('tmgr_term', uid=uid)
 
+            self._join_pending_consumers()
+
             if self._rts_runner:
                 self._rts_runner.join()
 
             self._log.debug('TMGR RTS Runner joined')
 
-            mq_connection.close()
+            if cud_pool:
+                cud_pool.close()
+                cud_pool.join()
+
+            mq_utils.close_connection(rmq_conn_params, self._prof, self._uid)
             self._log.debug('TMGR RMQ connection closed')
             self._prof.close()
             self._log.debug('TMGR profile closed')
@@ -211,14 +261,21 @@ class TaskManager(Base_TaskManager):
 
     # --------------------------------------------------------------------------
     #
-    def _process_tasks(self, task_queue, rmgr, rmq_conn_params):
+    def _process_tasks(self, task_queue, rmgr, rmq_conn_params,
+                             cud_pool=None):
         '''
         **Purpose**: The new thread that gets spawned by the main tmgr process
                      invokes this function. This function receives tasks from
                      'task_queue' and submits them to the RADICAL Pilot RTS.
+                     If a `cud_pool` of worker processes is given, the CUDs
+                     are prepared by those workers.
         '''
 
-        placeholders = dict()
+        placeholders      = self._create_placeholders(journal=bool(cud_pool))
+        placeholders_lock = mt.Lock()
+
+        # journal positions of the placeholder replicas of the CUD workers
+        replicas          = dict()
 
         # ----------------------------------------------------------------------
         def load_placeholder(task, rts_uid):
@@ -226,16 +283,46 @@ class TaskManager(Base_TaskManager):
             parent_pipeline = str(task.parent_pipeline['name'])
             parent_stage    = str(task.parent_stage['name'])
 
-            if parent_pipeline not in placeholders:
-                placeholders[parent_pipeline] = dict()
-
-            if parent_stage not in placeholders[parent_pipeline]:
-                placeholders[parent_pipeline][parent_stage] = dict()
+            if task.name is not None:
+                with placeholders_lock:
+                    placeholders.add(parent_pipeline, parent_stage, task.name,
+                                     {'path'   : task.path,
+                                      'rts_uid': rts_uid})
 
-            if None not in [parent_pipeline, parent_stage, task.name]:
-                placeholders[parent_pipeline][parent_stage][task.name] = \
-                                                          {'path'   : task.path,
-                                                           'rts_uid': rts_uid}
+        # ----------------------------------------------------------------------
+        def create_cuds(tasks, msgs):
+
+            if not cud_pool or len(tasks) < self._cud_pool_min:
+                return [create_cud_from_task(task, placeholders, self._prof)
+                        for task in tasks]
+
+            # the workers get an equal share of the tasks each, and the
+            # placeholder changes which not all of their replicas applied yet
+            # (workers skip the changes they already know).  `starmap`
+            # returns the results in order.
+            with placeholders_lock:
+                if len(replicas) == self._cud_workers:
+                    since = min(replicas.values())
+                    placeholders.trim(since)
+                else:
+                    since = 0
+                changes = placeholders.changes(since)
+
+            size  = -(-len(msgs) // self._cud_workers)
+            parts = [(msgs[start:start + size], since, changes)
+                     for start in range(0, len(msgs), size)]
+
+            cuds = list()
+            for pid, seq, cud_dicts in cud_pool.starmap(get_cud_dicts_from_msgs,
+                                                        parts):
+                replicas[pid] = seq
+                for cud_dict in cud_dicts:
+                    cuds.append(create_cud_from_dict(cud_dict))
+
+            for task in tasks:
+                self._prof.prof('cud_create', uid=task.uid)
+
+            return cuds
 
         # ----------------------------------------------------------------------
         def unit_state_cb(unit, state):
@@ -244,47 +331,186 @@ class TaskManager(Base_TaskManager):
 
                 self._log.debug('Unit %s in state %s' % (unit.uid, unit.state))
 
+                # final units are synced with the AppManager in batches by the
+                # `sync_completed` thread
                 if unit.state in rp.FINAL:
+                    completed.put(unit)
 
-                    # Acquire a connection+channel to the rmq server
-                    mq_connection = pika.BlockingConnection(rmq_conn_params)
-                    mq_channel = mq_connection.channel()
+            except KeyboardInterrupt:
+                self._log.exception('Execution interrupted (probably by Ctrl+C)'
+                                    ' exit callback thread gracefully...')
+                raise KeyboardInterrupt
 
-                    task = None
-                    task = create_task_from_cu(unit, self._prof)
+            except Exception as e:
+                self._log.exception('Error in RP callback thread: %s', e)
 
-                    self._advance(task, 'Task', states.COMPLETED,
-                                  mq_channel, '%s-cb-to-sync' % self._sid)
+        # ----------------------------------------------------------------------
+        def sync_completed():
 
-                    load_placeholder(task, unit.uid)
+            completed_qs = itertools.cycle(self._completed_queue)
 
-                    task_as_dict = json.dumps(task.to_dict())
+            # tasks which still need to be synced with the AppManager, and
+            # synced tasks which still need to be published.  Both are kept
+            # over failures (and retried after reconnecting), so that no task
+            # gets lost
+            to_sync    = list()
+            to_publish = collections.deque()
 
-                    mq_channel.basic_publish(
-                            exchange='',
-                            routing_key='%s-completedq-1' % self._sid,
-                            body=task_as_dict)
+            try:
 
-                    self._log.info('Pushed task %s with state %s to completed '
-                                   'queue %s-completedq-1',
-                                   task.uid, task.state, self._sid)
+                while not self._tmgr_terminate.is_set():
 
-                    mq_connection.close()
+                    # Acquire a (pooled) connection+channel to the rmq server
+                    mq_channel = mq_utils.get_channel(rmq_conn_params,
+                                                      self._prof, self._uid)
 
-            except KeyboardInterrupt:
-                self._log.exception('Execution interrupted (probably by Ctrl+C)'
-                                    ' exit callback thread gracefully...')
-                raise KeyboardInterrupt
+                    units = list()
+                    if not to_sync and not to_publish:
+                        try:
+                            units.append(completed.get(block=True, timeout=1))
+
+                        except queue.Empty:
+                            # Appease pika cos it thinks the connection is dead
+                            mq_channel.connection.process_data_events()
+                            continue
+
+                    # collect whatever else completed in the meantime
+                    limit = self._sync_batch * self._sync_window
+                    while len(to_sync) + len(units) < limit:
+                        try:
+                            units.append(completed.get_nowait())
+                        except queue.Empty:
+                            break
+
+                    for unit in units:
+
+                        # only units which cannot be converted are dropped
+                        try:
+                            task = create_task_from_cu(unit, self._prof)
+
+                        except Exception:
+                            self._log.exception('Failed to convert unit %s, '
+                                                'dropped', unit.uid)
+                            continue
+
+                        load_placeholder(task, unit.uid)
+                        to_sync.append(task)
+
+                    try:
+
+                        if to_sync:
+                            self._advance_bulk(to_sync, 'Task',
+                                               states.COMPLETED, mq_channel,
+                                               '%s-cb-to-sync' % self._sid)
+                            to_publish.extend(to_sync)
+                            to_sync = list()
+
+                        while to_publish:
+
+                            task = to_publish[0]
+
+                            # spread completed tasks over all completed queues
+                            completed_q  = next(completed_qs)
+                            task_as_msg  = serializer.dumps(task._to_delta(),
+                                                            self._serializer)
+
+                            mq_channel.basic_publish(
+                                    exchange='',
+                                    routing_key=completed_q,
+                                    body=task_as_msg)
+
+                            to_publish.popleft()
+
+                            self._log.info('Pushed task %s with state %s to '
+                                           'completed queue %s',
+                                           task.uid, task.state, completed_q)
+
+                    except Exception as e:
+                        self._log.exception('Error in RP callback thread, '
+                                            'retrying %d tasks: %s',
+                                            len(to_sync) + len(to_publish), e)
+                        # reconnect before the retry
+                        mq_utils.invalidate(rmq_conn_params)
+                        self._tmgr_terminate.wait(1)
+
+            finally:
+                if to_sync or to_publish:
+                    self._log.warning('%d completed tasks not synced',
+                                   len(to_sync) + len(to_publish))
+
+                mq_utils.close_connection(rmq_conn_params,
+                                          self._prof, self._uid)
+
+        # ----------------------------------------------------------------------
+        def submit_chunks():
+
+            try:
+
+                while not self._tmgr_terminate.is_set():
+
+                    try:
+                        bulk_tasks, bulk_cuds = submissions.get(block=True,
+                                                                timeout=1)
+                    except queue.Empty:
+                        continue
+
+                    # Acquire a (pooled) connection+channel to the rmq server
+                    mq_channel = mq_utils.get_channel(rmq_conn_params,
+                                                      self._prof, self._uid)
+
+                    self._advance_bulk(bulk_tasks, 'Task', states.SUBMITTING,
+                                       mq_channel,
+                                       '%s-tmgr-to-sync' % self._sid)
+
+                    umgr.submit_units(bulk_cuds)
+
+                    self._prof.prof('chunk_submitted', uid=self._uid,
+                                    msg=len(bulk_cuds))
 
             except Exception as e:
-                self._log.exception('Error in RP callback thread: %s', e)
+                self._log.exception('Error in RP submission thread: %s', e)
+                raise
+
+            finally:
+                mq_utils.close_connection(rmq_conn_params,
+                                          self._prof, self._uid)
+
         # ----------------------------------------------------------------------
+        def submit(chunk):
 
+            # wait for room in the submission queue, but do not hang on
+            # a submission thread which failed
+            while not self._tmgr_terminate.is_set():
+
+                if not submit_thread.is_alive():
+                    raise EnTKError('RP submission thread failed')
+
+                try:
+                    submissions.put(chunk, timeout=1)
+                    return
+
+                except queue.Full:
+                    pass
+        # ----------------------------------------------------------------------
+
+
+        completed   = queue.Queue()
+        sync_thread = mt.Thread(target=sync_completed, name='sync-completed')
+        sync_thread.daemon = True
+        sync_thread.start()
 
         umgr = rp.UnitManager(session=rmgr._session)
         umgr.add_pilots(rmgr.pilot)
         umgr.register_callback(unit_state_cb)
 
+        # chunks of tasks are synced and submitted to RP by a separate thread,
+        # so that the construction of the next chunk of CUDs overlaps with the
+        # submission of the previous one.  Only few chunks are buffered.
+        submissions   = queue.Queue(maxsize=2)
+        submit_thread = mt.Thread(target=submit_chunks, name='submit-chunks')
+        submit_thread.daemon = True
+        submit_thread.start()
+
         try:
 
             while not self._tmgr_terminate.is_set():
@@ -303,25 +529,29 @@ class TaskManager(Base_TaskManager):
 
                 task_queue.task_done()
 
-                bulk_tasks = list()
-                bulk_cuds  = list()
+                # the WFprocessor informs us about completed pipelines
+                if isinstance(body, dict):
+
+                    with placeholders_lock:
+                        self._evict_placeholders(placeholders,
+                                                 body['completed'])
+                    continue
+
+                # hand the tasks over to RP chunk by chunk as their CUDs are
+                # built, so that execution starts before the whole bulk (i.e.,
+                # a possibly very wide stage) is converted
+                for chunk in self._chunks(body):
 
-                for msg in body:
+                    bulk_tasks = list()
 
-                    task = Task()
-                    task.from_dict(msg)
-                    bulk_tasks.append(task)
-                    bulk_cuds.append(create_cud_from_task(
-                                            task, placeholders, self._prof))
+                    for msg in chunk:
 
-                    mq_connection = pika.BlockingConnection(rmq_conn_params)
-                    mq_channel = mq_connection.channel()
+                        task = Task()
+                        task.from_dict(msg, validate=False)
+                        bulk_tasks.append(task)
 
-                    self._advance(task, 'Task', states.SUBMITTING,
-                                  mq_channel, '%s-tmgr-to-sync' % self._sid)
-                    mq_connection.close()
+                    submit((bulk_tasks, create_cuds(bulk_tasks, chunk)))
 
-                umgr.submit_units(bulk_cuds)
             self._log.debug('Exited RTS main loop. TMGR terminating')
         except KeyboardInterrupt:
             self._log.exception('Execution interrupted (probably by Ctrl+C), '
@@ -332,8 +562,18 @@ class TaskManager(Base_TaskManager):
             raise EnTKError(e)
 
         finally:
+            mq_utils.close_connection(rmq_conn_params, self._prof, self._uid)
+
+            # the sync and submission threads only terminate with the tmgr
+            if self._tmgr_terminate.is_set():
+                submit_thread.join()
+
             umgr.close()
 
+            if self._tmgr_terminate.is_set():
+                sync_thread.join()
+                placeholders.close()
+
 
     # --------------------------------------------------------------------------
     #
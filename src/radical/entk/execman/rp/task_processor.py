@@ -1,16 +1,169 @@
 
 import os
+import re
+import functools
+
 import radical.pilot as rp
 import radical.utils as ru
 
-from radical.entk import Task
-from radical.entk import exceptions as ree
+from radical.entk       import Task
+from radical.entk       import exceptions as ree
+from radical.entk.utils import staging
+
+from ..placeholders import Placeholders
 
 
 # FIXME: this ignores the log output location used in other entk loggers
 logger = ru.Logger('radical.entk.task_processor')
 
 
+# ------------------------------------------------------------------------------
+#
+# Placeholders are tokenised once per distinct string: the parsers below are
+# cached, keyed by the raw staging path, the staging directive's source and
+# target, or the argument, and the references they return are resolved against
+# a flat `Placeholders` index.  Nested
+# `{pipeline: {stage: {task: entry}}}` dictionaries are still accepted
+# wherever placeholders are expected, and are converted into an index.
+#
+SHARED = '$SHARED'
+
+_EXPECTED = '$Pipeline_(pipeline_name)_Stage_(stage_name)_' \
+            'Task_(task_name) or $SHARED'
+
+_placeholder_re = re.compile(r'^\$Pipeline_([^_]*)_Stage_([^_]*)_Task_([^_]*)$')
+
+# number of distinct strings for which the parsed placeholders are cached
+_CACHE_SIZE = 64 * 1024
+
+# placeholder index of a CUD worker process, see `init_cud_worker()`
+_worker_placeholders = None
+
+
+# ------------------------------------------------------------------------------
+#
+def _as_index(placeholders):
+
+    if isinstance(placeholders, dict):
+        return Placeholders.from_dict(placeholders)
+
+    return placeholders
+
+
+# ------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _parse_placeholder(placeholder):
+    """
+    Return the `(pipeline, stage, task)` names referred to by a placeholder.
+    """
+
+    match = _placeholder_re.match(placeholder)
+
+    if not match:
+        raise ree.ValueError(obj='placeholder', attribute='task',
+                             expected_value=_EXPECTED,
+                             actual_value=placeholder.split('_'))
+
+    return match.groups()
+
+
+# ------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _parse_path(path):
+    """
+    Return the placeholder used in a staging path, i.e., in its source or, if
+    the source has none, in its target, and the names it refers to:
+    `(None, None)` if the path has no placeholder, `(SHARED, None)` for the
+    shared data placeholder.
+    """
+
+    if '$' not in path:
+        return None, None
+
+    parts = path.split('>')
+
+    if len(parts) == 1:
+        placeholder = path.split('/')[0]
+    elif parts[0].strip().startswith('$'):
+        placeholder = parts[0].strip().split('/')[0]
+    else:
+        placeholder = parts[1].strip().split('/')[0]
+
+    if placeholder == SHARED:
+        return placeholder, None
+
+    return placeholder, _parse_placeholder(placeholder)
+
+
+# ------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _parse_directive(source, target):
+    """
+    Return the placeholder used in a staging directive and the names it refers
+    to, as `_parse_path()` does for the directive's string form.
+    """
+
+    if target is None or source.startswith('$'):
+        placeholder = source.split('/')[0]
+    else:
+        placeholder = target.split('/')[0]
+
+    if placeholder == SHARED:
+        return placeholder, None
+
+    return placeholder, _parse_placeholder(placeholder)
+
+
+# ------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _parse_argument(arg):
+    """
+    Return the placeholder an argument starts with and the names it refers to,
+    as `_parse_path()`.  Arguments may use other environment variables, which
+    are not resolved by EnTK.
+    """
+
+    placeholder = arg.split('/')[0]
+
+    if placeholder == SHARED:
+        return placeholder, None
+
+    if placeholder.startswith('$Pipeline'):
+        return placeholder, _parse_placeholder(placeholder)
+
+    return None, None
+
+
+# ------------------------------------------------------------------------------
+#
+def _resolve_placeholder(placeholder, names, placeholders):
+    """
+    Return the value of a placeholder found by `_parse_path()`.
+    """
+
+    # SHARED
+    if not names:
+        return 'pilot://'
+
+    entry = _as_index(placeholders).get(*names)
+
+    if not entry:
+        logger.warning('No placeholder could be found for task name %s '
+                       'stage name %s and pipeline name %s. Please be sure '
+                       'to use object names and not uids in your '
+                       'references, i.e, %s', names[2], names[1],
+                       names[0], _EXPECTED)
+        raise ree.ValueError(obj='placeholder', attribute='task',
+                             expected_value=_EXPECTED,
+                             actual_value=placeholder.split('_'))
+
+    return entry['path']
+
+
 # ------------------------------------------------------------------------------
 #
 def resolve_placeholders(path, placeholders):
@@ -21,78 +174,24 @@ def resolve_placeholders(path, placeholders):
     :arguments:
         :path:             string describing the staging paths, possibly
                            containing a placeholder
-        :placeholders: dictionary holding the values for placeholders
+        :placeholders: Placeholders index (or nested dictionary) holding the
+                       values for placeholders
     """
 
     try:
 
-        if isinstance(path, str):
-            path = str(path)
-
         if not isinstance(path, str):
             raise ree.TypeError(expected_type=str,
                                 actual_type=type(path))
 
-        if '$' not in path:
-            return path
-
-        # Extract placeholder from path
-        if len(path.split('>')) == 1:
-            placeholder = path.split('/')[0]
-        else:
-            if path.split('>')[0].strip().startswith('$'):
-                placeholder = path.split('>')[0].strip().split('/')[0]
-            else:
-                placeholder = path.split('>')[1].strip().split('/')[0]
-
-        # SHARED
-        if placeholder == "$SHARED":
-            return path.replace(placeholder, 'pilot://')
-
-        # Expected placeholder format:
-        # $Pipeline_{pipeline.uid}_Stage_{stage.uid}_Task_{task.uid}
-
-        elems = placeholder.split('/')[0].split('_')
-
-        if not len(elems) == 6:
-
-            expected = '$Pipeline_(pipeline_name)_' \
-                       'Stage_(stage_name)_' \
-                       'Task_(task_name) or $SHARED',
-            raise ree.ValueError(obj='placeholder', attribute='task',
-                                 expected_value=expected, actual_value=elems)
-
-        pname    = elems[1]
-        sname    = elems[3]
-        tname    = elems[5]
-        resolved = None
-
-        if pname in placeholders:
-            if sname in placeholders[pname]:
-                if tname in placeholders[pname][sname]:
-                    resolved = path.replace(placeholder,
-                               placeholders[pname][sname][tname]['path'])
-                else:
-                    logger.warning('%s not assigned to any task in Stage %s Pipeline %s' %
-                                   (tname, sname, pname))
-            else:
-                logger.warning('%s not assigned to any Stage in Pipeline %s' % (
-                    sname, pname))
-        else:
-            logger.warning('%s not assigned to any Pipeline' % (pname))
+        placeholder, names = _parse_path(path)
 
-        if not resolved:
-            logger.warning('No placeholder could be found for task name %s \
-                        stage name %s and pipeline name %s. Please be sure to \
-                        use object names and not uids in your references,i.e, \
-                        $Pipeline_(pipeline_name)_Stage_(stage_name)_Task_(task_name)')
-            expected = '$Pipeline_(pipeline_name)_' \
-                       'Stage_(stage_name)_' \
-                       'Task_(task_name) or $SHARED'
-            raise ree.ValueError(obj='placeholder', attribute='task',
-                                 expected_value=expected, actual_value=elems)
+        if not placeholder:
+            return path
 
-        return resolved
+        return path.replace(placeholder,
+                            _resolve_placeholder(placeholder, names,
+                                                 placeholders))
 
     except Exception as ex:
 
@@ -100,6 +199,8 @@ def resolve_placeholders(path, placeholders):
         raise
 
 
+# ------------------------------------------------------------------------------
+#
 def resolve_arguments(args, placeholders):
 
     resolved_args = list()
@@ -115,35 +216,23 @@ def resolve_arguments(args, placeholders):
             resolved_args.append(entry)
             continue
 
+        placeholder, names = _parse_argument(entry)
 
-        placeholder = entry.split('/')[0]
-
-        if placeholder == "$SHARED":
+        if placeholder == SHARED:
             entry = entry.replace(placeholder, '$RP_PILOT_STAGING')
 
-        elif placeholder.startswith('$Pipeline'):
-            elems = placeholder.split('_')
-
-            if len(elems) != 6:
-
-                expected = '$Pipeline_{pipeline.uid}_' \
-                           'Stage_{stage.uid}_' \
-                           'Task_{task.uid} or $SHARED'
-                raise ree.ValueError(obj='placeholder', attribute='length',
-                                    expected_value=expected, actual_value=elems)
+        elif names:
 
-            pname = elems[1]
-            sname = elems[3]
-            tname = elems[5]
+            placeholders = _as_index(placeholders)
+            resolved     = placeholders.get(*names)
 
-            try:
-                entry = entry.replace(placeholder,
-                                      placeholders[pname][sname][tname]['path'])
+            if resolved:
+                entry = entry.replace(placeholder, resolved['path'])
 
-            except Exception:
+            else:
                 logger.warning('Argument parsing failed. Task %s of Stage %s '
                                'in Pipeline %s does not exist',
-                               tname, sname, pname)
+                               names[2], names[1], names[0])
 
         resolved_args.append(entry)
 
@@ -154,137 +243,110 @@ def resolve_arguments(args, placeholders):
 #
 def resolve_tags(tag, parent_pipeline_name, placeholders):
 
-    # Check self pipeline first
-    for sname in placeholders[parent_pipeline_name]:
-        for tname in placeholders[parent_pipeline_name][sname]:
-            if tag != tname:
-                continue
-            return placeholders[parent_pipeline_name][sname][tname]['rts_uid']
-
-    for pname in placeholders:
+    # tasks of the own pipeline take precedence
+    entry = _as_index(placeholders).find(tag, parent_pipeline_name)
 
-        # skip self pipeline this time
-        if pname == parent_pipeline_name:
-            continue
+    if not entry:
+        raise ree.EnTKError(msg='Tag %s cannot be used as no previous task '
+                                'with that name is found' % tag)
 
-        for sname in placeholders[pname]:
-            for tname in placeholders[pname][sname]:
-                if tag != tname:
-                    continue
-                return placeholders[pname][sname][tname]['rts_uid']
-
-    raise ree.EnTKError(msg='Tag %s cannot be used as no previous task with '
-                            'that name is found' % tag)
+    return entry['rts_uid']
 
 
 # ------------------------------------------------------------------------------
 #
-def get_input_list_from_task(task, placeholders):
+def resolve_directive(directive, placeholders):
     """
-    Purpose: Parse Task object to extract the files to be staged as the output.
-
-    Details: The extracted data is then converted into the appropriate RP
-             directive depending on whether the data is to be copied/downloaded.
+    **Purpose**: Resolve the placeholder of a staging directive, and return the
+                 resulting source and target (`None` if the directive has
+                 none).
 
     :arguments:
-        :task:         EnTK Task object
-        :placeholders: dictionary holding the values for placeholders
-
-    :return: list of RP directives for the files that need to be staged out
+        :directive:    staging directive, as a `StagingDirective`, string or
+                       serialized directive, possibly containing a placeholder
+        :placeholders: Placeholders index (or nested dictionary) holding the
+                       values for placeholders
     """
 
-    try:
-
-        if not isinstance(task, Task):
-            raise ree.TypeError(expected_type=Task, actual_type=type(task))
+    source, target = staging.parse(directive)
 
-        input_data = list()
+    if '$' not in source and (target is None or '$' not in target):
+        return source, target
 
-        if task.link_input_data:
-
-            for path in task.link_input_data:
+    try:
+        placeholder, names = _parse_directive(source, target)
+        value              = _resolve_placeholder(placeholder, names,
+                                                  placeholders)
 
-                path = resolve_placeholders(path, placeholders)
+        source = source.replace(placeholder, value)
+        if target is not None:
+            target = target.replace(placeholder, value)
 
-                if len(path.split('>')) > 1:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.LINK
-                    }
+        return source, target
 
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.LINK
-                    }
-                input_data.append(temp)
+    except Exception as ex:
 
+        logger.exception('Failed to resolve placeholder %s, error: %s'
+                         % (directive, ex))
+        raise
 
-        if task.upload_input_data:
 
-            for path in task.upload_input_data:
+# ------------------------------------------------------------------------------
+#
+def _get_staging_list(directives, action, placeholders):
 
-                path = resolve_placeholders(path, placeholders)
+    staging_list = list()
 
-                if len(path.split('>')) > 1:
+    for directive in directives:
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip()
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip())
-                    }
-                input_data.append(temp)
+        source, target = resolve_directive(directive, placeholders)
 
+        if target is None:
+            target = os.path.basename(source)
 
-        if task.copy_input_data:
+        if action:
+            staging_list.append({'source': source,
+                                 'target': target,
+                                 'action': action})
+        else:
+            staging_list.append({'source': source,
+                                 'target': target})
 
-            for path in task.copy_input_data:
+    return staging_list
 
-                path = resolve_placeholders(path, placeholders)
 
-                if len(path.split('>')) > 1:
+# ------------------------------------------------------------------------------
+#
+def get_input_list_from_task(task, placeholders):
+    """
+    Purpose: Parse Task object to extract the files to be staged as the output.
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.COPY
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.COPY
-                    }
-                input_data.append(temp)
+    Details: The extracted data is then converted into the appropriate RP
+             directive depending on whether the data is to be copied/downloaded.
 
+    :arguments:
+        :task:         EnTK Task object
+        :placeholders: dictionary holding the values for placeholders
 
-        if task.move_input_data:
+    :return: list of RP directives for the files that need to be staged out
+    """
 
-            for path in task.move_input_data:
+    try:
 
-                path = resolve_placeholders(path, placeholders)
+        if not isinstance(task, Task):
+            raise ree.TypeError(expected_type=Task, actual_type=type(task))
 
-                if len(path.split('>')) > 1:
+        placeholders = _as_index(placeholders)
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.MOVE
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.MOVE
-                    }
+        input_data = list()
 
-                input_data.append(temp)
+        for directives, action in [(task.link_input_data,   rp.LINK),
+                                   (task.upload_input_data, None),
+                                   (task.copy_input_data,   rp.COPY),
+                                   (task.move_input_data,   rp.MOVE)]:
+            if directives:
+                input_data += _get_staging_list(directives, action,
+                                                placeholders)
 
         return input_data
 
@@ -317,99 +379,148 @@ def get_output_list_from_task(task, placeholders):
         if not isinstance(task, Task):
             raise ree.TypeError(expected_type=Task, actual_type=type(task))
 
+        placeholders = _as_index(placeholders)
 
         output_data = list()
 
-        if task.copy_output_data:
+        for directives, action in [(task.copy_output_data,     rp.COPY),
+                                   (task.link_output_data,     rp.LINK),
+                                   (task.download_output_data, None),
+                                   (task.move_output_data,     rp.MOVE)]:
+            if directives:
+                output_data += _get_staging_list(directives, action,
+                                                 placeholders)
+
+        return output_data
+
+
+    except Exception:
+        logger.exception('Failed to get output list of files from task')
+        raise
+
+
+# ------------------------------------------------------------------------------
+#
+def get_cud_dict_from_task(task, placeholders):
+    """
+    Purpose: Collect the attributes of the Compute Unit description for the
+             defined Task, with all placeholders resolved.  The result only
+             holds plain Python types and can thus be built in another process.
+
+    :arguments:
+        :task:         EnTK Task object
+        :placeholders: dictionary holding the values for placeholders
+
+    :return: dict of ComputeUnitDescription attributes
+    """
+
+    placeholders = _as_index(placeholders)
+    cud_dict     = dict()
 
-            for path in task.copy_output_data:
+    cud_dict['name'] = '%s,%s,%s,%s,%s,%s' % (task.uid, task.name,
+                                              task.parent_stage['uid'],
+                                              task.parent_stage['name'],
+                                              task.parent_pipeline['uid'],
+                                              task.parent_pipeline['name'])
+    cud_dict['pre_exec']   = task.pre_exec
+    cud_dict['executable'] = task.executable
+    cud_dict['arguments']  = resolve_arguments(task.arguments, placeholders)
+    cud_dict['sandbox']    = task.sandbox
+    cud_dict['post_exec']  = task.post_exec
 
-                path = resolve_placeholders(path, placeholders)
+    if task.tag:
+        if task.parent_pipeline['name']:
+            cud_dict['tag'] = resolve_tags(
+                    tag=task.tag,
+                    parent_pipeline_name=task.parent_pipeline['name'],
+                    placeholders=placeholders)
 
-                if len(path.split('>')) > 1:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.COPY
-                    }
+    cud_dict['cpu_processes']    = task.cpu_reqs['processes']
+    cud_dict['cpu_threads']      = task.cpu_reqs['threads_per_process']
+    cud_dict['cpu_process_type'] = task.cpu_reqs['process_type']
+    cud_dict['cpu_thread_type']  = task.cpu_reqs['thread_type']
+    cud_dict['gpu_processes']    = task.gpu_reqs['processes']
+    cud_dict['gpu_threads']      = task.gpu_reqs['threads_per_process']
+    cud_dict['gpu_process_type'] = task.gpu_reqs['process_type']
+    cud_dict['gpu_thread_type']  = task.gpu_reqs['thread_type']
 
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.COPY
-                    }
-                output_data.append(temp)
+    if task.lfs_per_process:
+        cud_dict['lfs_per_process'] = task.lfs_per_process
 
-        if task.link_output_data:
+    if task.stdout: cud_dict['stdout'] = task.stdout
+    if task.stderr: cud_dict['stderr'] = task.stderr
 
-            for path in task.link_output_data:
+    cud_dict['input_staging']  = get_input_list_from_task(task, placeholders)
+    cud_dict['output_staging'] = get_output_list_from_task(task, placeholders)
 
-                path = resolve_placeholders(path, placeholders)
+    return cud_dict
 
-                if len(path.split('>')) > 1:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.LINK
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.LINK
-                    }
-                output_data.append(temp)
 
+# ------------------------------------------------------------------------------
+#
+def init_cud_worker():
+    """
+    Purpose: Initialize a worker process of the RP task manager: the worker
+             holds a replica of the task manager's placeholder index, which
+             is kept in sync via the changes sent along with each chunk of
+             tasks (see `get_cud_dicts_from_msgs()`).
+    """
+
+    global _worker_placeholders
+    _worker_placeholders = Placeholders()
 
-        if task.download_output_data:
 
-            for path in task.download_output_data:
+# ------------------------------------------------------------------------------
+#
+def get_cud_dicts_from_msgs(msgs, since, changes):
+    """
+    Purpose: Collect the Compute Unit description attributes for a list of
+             Tasks received as messages, in the same order.  This is the
+             function run by the worker processes of the RP task manager.
+             The placeholders are resolved against the worker's replica of
+             the placeholder index, after applying the given changes to it.
 
-                path = resolve_placeholders(path, placeholders)
+    :arguments:
+        :msgs:    list of Task dictionaries (see `Task.to_dict()`)
+        :since:   journal position of the first of the `changes`
+        :changes: changes of the task manager's placeholder index since then
+                  (see `Placeholders.changes()`)
 
-                if len(path.split('>')) > 1:
+    :return: tuple of the worker's pid, the journal position of its replica,
+             and the list of dicts of ComputeUnitDescription attributes
+    """
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip()
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip())
-                    }
-                output_data.append(temp)
+    if _worker_placeholders is None:
+        init_cud_worker()
 
+    seq       = _worker_placeholders.apply(since, changes)
+    cud_dicts = list()
 
-        if task.move_output_data:
+    for msg in msgs:
 
-            for path in task.move_output_data:
+        task = Task()
+        task.from_dict(msg, validate=False)
+        cud_dicts.append(get_cud_dict_from_task(task, _worker_placeholders))
 
-                path = resolve_placeholders(path, placeholders)
+    return os.getpid(), seq, cud_dicts
 
-                if len(path.split('>')) > 1:
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.MOVE
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.MOVE
-                    }
+# ------------------------------------------------------------------------------
+#
+def create_cud_from_dict(cud_dict):
+    """
+    Purpose: Create a Compute Unit description from the attributes collected
+             by `get_cud_dict_from_task()`.
 
-                output_data.append(temp)
+    :return: ComputeUnitDescription
+    """
 
-        return output_data
+    cud = rp.ComputeUnitDescription()
 
+    for key, val in cud_dict.items():
+        setattr(cud, key, val)
 
-    except Exception:
-        logger.exception('Failed to get output list of files from task')
-        raise
+    return cud
 
 
 # ------------------------------------------------------------------------------
@@ -432,42 +543,7 @@ def create_cud_from_task(task, placeholders, prof=None):
         if prof:
             prof.prof('cud_create', uid=task.uid)
 
-        cud = rp.ComputeUnitDescription()
-        cud.name = '%s,%s,%s,%s,%s,%s' % (task.uid, task.name,
-                                          task.parent_stage['uid'],
-                                          task.parent_stage['name'],
-                                          task.parent_pipeline['uid'],
-                                          task.parent_pipeline['name'])
-        cud.pre_exec   = task.pre_exec
-        cud.executable = task.executable
-        cud.arguments  = resolve_arguments(task.arguments, placeholders)
-        cud.sandbox    = task.sandbox
-        cud.post_exec  = task.post_exec
-
-        if task.tag:
-            if task.parent_pipeline['name']:
-                cud.tag = resolve_tags(
-                        tag=task.tag,
-                        parent_pipeline_name=task.parent_pipeline['name'],
-                        placeholders=placeholders)
-
-        cud.cpu_processes    = task.cpu_reqs['processes']
-        cud.cpu_threads      = task.cpu_reqs['threads_per_process']
-        cud.cpu_process_type = task.cpu_reqs['process_type']
-        cud.cpu_thread_type  = task.cpu_reqs['thread_type']
-        cud.gpu_processes    = task.gpu_reqs['processes']
-        cud.gpu_threads      = task.gpu_reqs['threads_per_process']
-        cud.gpu_process_type = task.gpu_reqs['process_type']
-        cud.gpu_thread_type  = task.gpu_reqs['thread_type']
-
-        if task.lfs_per_process:
-            cud.lfs_per_process = task.lfs_per_process
-
-        if task.stdout: cud.stdout = task.stdout
-        if task.stderr: cud.stderr = task.stderr
-
-        cud.input_staging  = get_input_list_from_task(task, placeholders)
-        cud.output_staging = get_output_list_from_task(task, placeholders)
+        cud = create_cud_from_dict(get_cud_dict_from_task(task, placeholders))
 
         if prof:
             prof.prof('cud from task - done', uid=task.uid)
@@ -0,0 +1,382 @@
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import time
+import queue
+import itertools
+
+import multiprocessing as mp
+
+import pika
+
+
+# ------------------------------------------------------------------------------
+#
+# EnTK components exchange messages via named queues.  The transport used for
+# those queues is selected by the connection parameters handed to the
+# components:
+#
+#   'rabbitmq': `pika.ConnectionParameters` -- messages are routed through
+#               a RabbitMQ broker, which allows the components to live on
+#               different hosts.
+#   'local'   : `LocalConnectionParameters` -- messages are routed through
+#               `multiprocessing` queues owned by the AppManager process.  This
+#               avoids the broker hop and the external service for single node
+#               runs (and for tests with the 'mock' RTS).
+#
+# Both backends expose the subset of pika's `BlockingConnection` and
+# `BlockingChannel` API used by EnTK, so that components only need to obtain
+# their connections via `connect()`.
+#
+# The local backend has some limitations: queues need to be declared before
+# the task manager process is forked, deleting a queue only purges it (so that
+# both processes keep sharing it), and messages are considered acknowledged
+# once delivered.
+#
+TRANSPORTS = ['rabbitmq', 'local']
+
+
+# ------------------------------------------------------------------------------
+#
+def connect(rmq_conn_params):
+    '''
+    Open a connection for the transport described by `rmq_conn_params`.
+    '''
+
+    if isinstance(rmq_conn_params, LocalConnectionParameters):
+        return LocalConnection(rmq_conn_params.broker)
+
+    return pika.BlockingConnection(rmq_conn_params)
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalBroker(object):
+    '''
+    Set of named `multiprocessing` queues shared by all EnTK components of
+    a session.
+    '''
+
+    def __init__(self):
+
+        self._queues = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def declare(self, name):
+
+        if name not in self._queues:
+            self._queues[name] = mp.Queue()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_queue(self, name):
+
+        return self._queues.get(name)
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalConnectionParameters(pika.ConnectionParameters):
+    '''
+    Connection parameters which select the local transport.  The parameters
+    carry the broker, and thus need to be created before the task manager
+    process is started.
+    '''
+
+    def __init__(self):
+
+        super(LocalConnectionParameters, self).__init__()
+
+        self.broker = LocalBroker()
+
+
+# ------------------------------------------------------------------------------
+#
+class _Method(object):
+
+    def __init__(self, delivery_tag):
+
+        self.delivery_tag = delivery_tag
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalConnection(object):
+    '''
+    Connection to a `LocalBroker`, mimicking `pika.BlockingConnection`.
+    '''
+
+    # time to wait for a message before reporting an empty queue, to keep
+    # polling components from spinning
+    _get_timeout = 0.01
+
+    # time limit for purging a queue where its size is not known
+    _purge_timeout = 1.0
+
+    def __init__(self, broker):
+
+        self._broker      = broker
+        self._channels    = list()
+        self._dispatching = False
+        self._is_open     = True
+        self._tags        = itertools.count(1)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_open(self):
+
+        return self._is_open
+
+
+    # --------------------------------------------------------------------------
+    #
+    def channel(self):
+
+        chan = LocalChannel(self)
+        self._channels.append(chan)
+
+        return chan
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        for chan in self._channels:
+            chan.close()
+
+        self._is_open = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sleep(self, duration):
+
+        time.sleep(duration)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def process_data_events(self, time_limit=0):
+        '''
+        Dispatch messages to the consumers registered on this connection's
+        channels for up to `time_limit` seconds.  `None` blocks until at least
+        one message was dispatched.  As with pika, calls from within
+        a consumer callback do not dispatch.
+        '''
+
+        if self._dispatching:
+            return
+
+        consumers = [(chan, consumer) for chan in self._channels
+                                      for consumer in chan._consumers.values()]
+        if not consumers:
+            if time_limit:
+                time.sleep(time_limit)
+            return
+
+        start = time.time()
+        delay = 0.0001
+
+        while True:
+
+            dispatched = 0
+            for chan, (callback, name) in consumers:
+
+                q = self._broker.get_queue(name)
+                if not q:
+                    continue
+
+                try:
+                    body, props = q.get_nowait()
+                except queue.Empty:
+                    continue
+
+                self._dispatching = True
+                try:
+                    callback(chan, _Method(next(self._tags)), props, body)
+                finally:
+                    self._dispatching = False
+
+                dispatched += 1
+
+            if time_limit is None:
+                if dispatched:
+                    return
+
+            elif time.time() - start >= time_limit:
+                return
+
+            # back off while idle
+            if dispatched:
+                delay = 0.0001
+            else:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalChannel(object):
+    '''
+    Channel on a `LocalConnection`, mimicking `pika.BlockingChannel`.
+    '''
+
+    def __init__(self, connection):
+
+        self._connection = connection
+        self._consumers  = dict()
+        self._is_open    = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def connection(self):
+
+        return self._connection
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_open(self):
+
+        return self._is_open and self._connection.is_open
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        self._consumers = dict()
+        self._is_open   = False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def queue_declare(self, queue, **kwargs):
+
+        self._connection._broker.declare(queue)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def queue_delete(self, queue, **kwargs):
+
+        # queues are shared with other processes and never destroyed
+        self.queue_purge(queue)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def queue_purge(self, queue):
+
+        q = self._connection._broker.get_queue(queue)
+
+        if not q:
+            return
+
+        # purge the messages published so far (including those still in
+        # flight), but not those a busy publisher keeps adding
+        try:
+            count = q.qsize()
+        except NotImplementedError:
+            # no `qsize()` on macOS: purge for a limited time instead
+            count = None
+
+        deadline = time.time() + LocalConnection._purge_timeout
+        purged   = 0
+
+        while count is None or purged < count:
+
+            if count is None and time.time() > deadline:
+                break
+
+            try:
+                q.get(timeout=LocalConnection._get_timeout)
+                purged += 1
+            except queue.Empty:
+                break
+
+
+    # --------------------------------------------------------------------------
+    #
+    def basic_publish(self, exchange, routing_key, body, properties=None,
+                      **kwargs):
+
+        q = self._connection._broker.get_queue(routing_key)
+
+        # like RabbitMQ, silently drop messages to undeclared queues
+        if not q:
+            return
+
+        if isinstance(body, str):
+            body = body.encode()
+
+        if properties:
+            props = pika.BasicProperties(
+                                    correlation_id=properties.correlation_id,
+                                    reply_to=properties.reply_to)
+        else:
+            props = pika.BasicProperties()
+
+        q.put((body, props))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def basic_get(self, queue=None, **kwargs):
+
+        q = self._connection._broker.get_queue(queue)
+
+        if not q:
+            return None, None, None
+
+        try:
+            body, props = q.get(timeout=LocalConnection._get_timeout)
+        except Exception:
+            return None, None, None
+
+        return _Method(next(self._connection._tags)), props, body
+
+
+    # --------------------------------------------------------------------------
+    #
+    def basic_ack(self, delivery_tag=0, **kwargs):
+
+        # messages are acknowledged on delivery
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def basic_qos(self, **kwargs):
+
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def basic_consume(self, consumer_callback, queue, **kwargs):
+
+        tag = 'ctag.%d' % next(self._connection._tags)
+        self._consumers[tag] = (consumer_callback, queue)
+
+        return tag
+
+
+    # --------------------------------------------------------------------------
+    #
+    def basic_cancel(self, consumer_tag):
+
+        self._consumers.pop(consumer_tag, None)
+
+
+# ------------------------------------------------------------------------------
@@ -1,6 +1,7 @@
-import radical.utils as ru
 from radical.entk.exceptions import *
 from radical.entk.stage.stage import Stage
+from radical.entk.utils.ids import generate_id, generate_ids
+from radical.entk.utils.history import StateHistory, StateHistoryView
 import threading
 from radical.entk import states
 from collections import Iterable
@@ -25,7 +26,7 @@ class Pipeline(object):
         self._state = states.INITIAL
 
         # Keep track of states attained
-        self._state_history = [states.INITIAL]
+        self._state_history = StateHistory([states.INITIAL])
 
         # To keep track of current state
         self._stage_count = len(self._stages)
@@ -37,6 +38,13 @@ class Pipeline(object):
         # To keep track of termination of pipeline
         self._completed_flag = threading.Event()
 
+        # Callable to signal the WFprocessor that this pipeline may have new
+        # work eligible for execution -- set when the pipeline is registered
+        self._notify = None
+
+        # Callable to signal the WFprocessor that this pipeline completed
+        self._notify_completed = None
+
 
     # --------------------------------------------------------------------------
     # Getter functions
@@ -137,12 +145,13 @@ class Pipeline(object):
     @property
     def state_history(self):
         """
-        Returns a list of the states obtained in temporal order
+        Returns a read-only view of the states obtained in temporal order, which reflects later state changes of the
+        pipeline
 
-        :return: list
+        :return: StateHistoryView
         """
 
-        return self._state_history
+        return StateHistoryView(self)
 
     # ------------------------------------------------------------------------------------------------------------------
     # Setter functions
@@ -171,11 +180,14 @@ class Pipeline(object):
         if self._cur_stage == 0:
             self._cur_stage = 1
 
+        if self._notify:
+            self._notify()
+
     @state.setter
     def state(self, value):
         if isinstance(value, str):
-            if value in list(states._pipeline_state_values.keys()):
-                self._state = value
+            if value in states._pipeline_states:
+                self._state = states._pipeline_states[value]
 
                 # We add SUSPENDED to state history in suspend()
                 if self._state != states.SUSPENDED:
@@ -204,11 +216,15 @@ class Pipeline(object):
         if self._cur_stage == 0:
             self._cur_stage = 1
 
+        if self._notify:
+            self._notify()
+
 
-    def to_dict(self):
+    def to_dict(self, history=True):
         """
-        Convert current Pipeline (i.e. its attributes) into a dictionary
+        Convert current Pipeline (i.e. its attributes) into a dictionary.  The state history is only included if `history` is set.
 
+        :arguments: history: include the state history
         :return: python dictionary
         """
 
@@ -217,10 +233,12 @@ class Pipeline(object):
             'uid': self._uid,
             'name': self._name,
             'state': self._state,
-            'state_history': self._state_history,
             'completed': self._completed_flag.is_set()
         }
 
+        if history:
+            pipeline_desc_as_dict['state_history'] = self._state_history.to_list()
+
         return pipeline_desc_as_dict
 
     def from_dict(self, d):
@@ -241,8 +259,8 @@ class Pipeline(object):
 
         if 'state' in d:
             if isinstance(d['state'], str) or isinstance(d['state'], str):
-                if d['state'] in list(states._pipeline_state_values.keys()):
-                    self._state = d['state']
+                if d['state'] in states._pipeline_states:
+                    self._state = states._pipeline_states[d['state']]
                 else:
                     raise ValueError(obj=self._uid,
                                      attribute='state',
@@ -257,7 +275,8 @@ class Pipeline(object):
 
         if 'state_history' in d:
             if isinstance(d['state_history'], list):
-                self._state_history = d['state_history']
+                self._state_history = StateHistory(d['state_history'],
+                                         limit=self._state_history.limit)
             else:
                 raise TypeError(entity='state_history', expected_type=list, actual_type=type(
                     d['state_history']))
@@ -308,6 +327,9 @@ class Pipeline(object):
         self._state = self._state_history[-2]
         self._state_history.append(self._state)
 
+        if self._notify:
+            self._notify()
+
 
     # --------------------------------------------------------------------------
     # Private methods
@@ -323,11 +345,21 @@ class Pipeline(object):
             if self._cur_stage < self._stage_count:
                 self._cur_stage += 1
             else:
-                self._completed_flag.set()
+                self._set_completed()
 
         except Exception as ex:
             raise EnTKError(text=ex)
 
+    def _set_completed(self):
+        """
+        Purpose: Mark the Pipeline as completed.
+        """
+
+        self._completed_flag.set()
+
+        if self._notify_completed:
+            self._notify_completed()
+
     def _decrement_stage(self):
         """
         Purpose: Decrement stage pointer. Reset completed flag.
@@ -361,10 +393,11 @@ class Pipeline(object):
 
         return stages
 
-    def _validate(self):
+    def _validate(self, lazy=False):
         """
         Purpose: Validate that the state of the current Pipeline is 'DESCRIBED' (user has not meddled with it). Also
-        validate that the current Pipeline contains Stages.
+        validate that the current Pipeline contains Stages. If `lazy` is set, the stages are not validated here but
+        once they become current.
         """
 
         if self._state is not states.INITIAL:
@@ -379,18 +412,29 @@ class Pipeline(object):
             raise MissingError(obj=self._uid,
                                missing_attribute='stages')
 
+        if lazy:
+            return
+
         for stage in self._stages:
             stage._validate()
 
-    def _assign_uid(self, sid):
+    def _assign_uid(self, sid, uid=None, lazy=False):
         """
-        Purpose: Assign a uid to the current object based on the sid passed. Pass the current uid to children of
-        current object
+        Purpose: Assign a uid to the current object based on the sid passed, unless a (pre-allocated) uid is given.
+        Pass the current uid to children of current object. The uids of all stages are allocated as one block. If
+        `lazy` is set, the stages are skipped: they get their uids once they become current.
         """
-        self._uid = ru.generate_id('pipeline.%(item_counter)04d',
-                                   ru.ID_CUSTOM, ns=sid)
-        for stage in self._stages:
-            stage._assign_uid(sid)
+        if uid:
+            self._uid = uid
+        else:
+            self._uid = generate_id('pipeline.%(item_counter)04d', ns=sid)
+
+        if lazy:
+            return
+
+        uids = generate_ids('stage.%(item_counter)04d', len(self._stages), ns=sid)
+        for stage, stage_uid in zip(self._stages, uids):
+            stage._assign_uid(sid, stage_uid)
 
         self._pass_uid()
 
@@ -1,10 +1,37 @@
-import radical.utils as ru
 from radical.entk.exceptions import *
 from radical.entk.task.task import Task
+from radical.entk.utils.ids import generate_id, generate_ids
+from radical.entk.utils.history import StateHistory, StateHistoryView
 from radical.entk import states
 from collections import Iterable
 
 
+class _TaskCounts(object):
+    """
+    Number of DONE and FAILED tasks of a stage.  The object is shared by the stage and its tasks, and the state setter
+    of the tasks keeps the counts up to date.
+    """
+
+    __slots__ = ['done', 'failed']
+
+    def __init__(self):
+
+        self.done = 0
+        self.failed = 0
+
+    def update(self, old_state, new_state):
+
+        if old_state == states.DONE:
+            self.done -= 1
+        elif old_state == states.FAILED:
+            self.failed -= 1
+
+        if new_state == states.DONE:
+            self.done += 1
+        elif new_state == states.FAILED:
+            self.failed += 1
+
+
 class Stage(object):
     """
     A stage represents a collection of objects that have no relative order of execution. In this case, a
@@ -19,17 +46,30 @@ class Stage(object):
         self._tasks = set()
         self._state = states.INITIAL
 
+        # Task arrays added with `lazy=True`: list of (template, arguments)
+        # tuples, materialized into tasks on first access to the stage's tasks
+        self._task_arrays = list()
+
+        # uids allocated for the tasks of the lazy task arrays, handed out when
+        # the tasks are created
+        self._task_uids = list()
+
         # Keep track of states attained
-        self._state_history = [states.INITIAL]
+        self._state_history = StateHistory([states.INITIAL])
 
         # To change states
         self._task_count = len(self._tasks)
+        self._counts = _TaskCounts()
 
         # Pipeline this stage belongs to
         self._p_pipeline = {'uid': None, 'name': None}
 
         self._post_exec = None
 
+        # Callable to signal the WFprocessor that this stage may have new
+        # work eligible for execution -- set when the stage is registered
+        self._notify = None
+
     # ------------------------------------------------------------------------------------------------------------------
     # Getter functions
     # ------------------------------------------------------------------------------------------------------------------
@@ -54,8 +94,29 @@ class Stage(object):
         :setter: Assigns tasks to the current stage
         :type: set of Tasks
         """
+        if self._task_arrays:
+            self._materialize_tasks()
+
         return self._tasks
 
+    @property
+    def progress(self):
+        """
+        Progress of the tasks of the stage. The counts are maintained on task state changes, so this is cheap to call
+        also for large stages.
+
+        :getter: Returns the number of tasks of the stage ('total'), and how many of them are 'done', 'failed' or still
+                 'pending' (i.e., neither DONE nor FAILED)
+        :type: dict
+        """
+        done = self._counts.done
+        failed = self._counts.failed
+
+        return {'total': self._task_count,
+                'pending': self._task_count - done - failed,
+                'done': done,
+                'failed': failed}
+
     @property
     def state(self):
         """
@@ -113,12 +174,13 @@ class Stage(object):
     @property
     def state_history(self):
         """
-        Returns a list of the states obtained in temporal order
+        Returns a read-only view of the states obtained in temporal order, which reflects later state changes of the
+        stage
 
-        :return: list
+        :return: StateHistoryView
         """
 
-        return self._state_history
+        return StateHistoryView(self)
 
     @property
     def post_exec(self):
@@ -155,7 +217,14 @@ class Stage(object):
     @tasks.setter
     def tasks(self, value):
         self._tasks = self._validate_entities(value)
+        self._task_arrays = list()
+        self._task_uids = list()
         self._task_count = len(self._tasks)
+        self._counts = _TaskCounts()
+        self._count_tasks(self._tasks)
+
+        if self._notify:
+            self._notify()
 
     @parent_pipeline.setter
     def parent_pipeline(self, value):
@@ -167,9 +236,9 @@ class Stage(object):
     @state.setter
     def state(self, value):
         if isinstance(value, str):
-            if value in list(states._stage_state_values.keys()):
-                self._state = value
-                self._state_history.append(value)
+            if value in states._stage_states:
+                self._state = states._stage_states[value]
+                self._state_history.append(self._state)
             else:
                 raise ValueError(obj=self._uid,
                                  attribute='state',
@@ -201,13 +270,73 @@ class Stage(object):
         :argument: set of tasks
         """
         tasks = self._validate_entities(value)
+        self._count_tasks(tasks - self._tasks)
         self._tasks.update(tasks)
-        self._task_count = len(self._tasks)
+        self._task_count = len(self._tasks) + sum([len(args) for _, args in self._task_arrays])
+
+        if self._notify:
+            self._notify()
+
+    def add_task_array(self, template, arguments, lazy=False):
+        """
+        Adds one task per element of `arguments` to the Stage.  All tasks share
+        the description of the `template` task (executable, requirements, data
+        staging, etc.) and only differ in their arguments.  The template is
+        validated once, the tasks are then created without the per-attribute
+        checks of the Task setters.  This is much faster than creating and
+        adding the tasks one by one, e.g., for large ensembles.
+
+        The template is copied, later changes to it do not affect the tasks.
+        The name of the template is not copied: the tasks are unnamed, as
+        a shared name could not be used to refer to any one of them (e.g., in
+        placeholders or tags).  Tasks which need to be referred to by name
+        should be added individually.
+
+        :arguments:
+            :template: Task describing all tasks of the array
+            :arguments: list of argument lists, one per task
+            :lazy: only create the tasks once the tasks of the stage are
+                   accessed, i.e., when the stage is about to be executed
+                   (their uids are allocated with those of the other tasks,
+                   when the workflow is initialized)
+        """
+
+        if not isinstance(template, Task):
+            raise TypeError(expected_type=Task, actual_type=type(template))
+
+        if not isinstance(arguments, list):
+            raise TypeError(expected_type=list, actual_type=type(arguments))
+
+        if not arguments:
+            raise MissingError(obj=self._uid, missing_attribute='arguments')
+
+        for args in arguments:
+            if not isinstance(args, list):
+                raise TypeError(entity='arguments', expected_type=list,
+                                actual_type=type(args))
+
+        template._validate()
+
+        # snapshot the template
+        template = template._clone([template.arguments])[0]
 
-    def to_dict(self):
+        if lazy:
+            self._task_arrays.append((template, list(arguments)))
+            self._task_count += len(arguments)
+        else:
+            tasks = template._clone(arguments)
+            self._count_tasks(tasks)
+            self._tasks.update(tasks)
+            self._task_count = len(self._tasks) + sum([len(args) for _, args in self._task_arrays])
+
+        if self._notify:
+            self._notify()
+
+    def to_dict(self, history=True):
         """
-        Convert current Stage into a dictionary
+        Convert current Stage into a dictionary.  The state history is only included if `history` is set.
 
+        :arguments: history: include the state history
         :return: python dictionary
         """
 
@@ -216,10 +345,12 @@ class Stage(object):
             'uid': self._uid,
             'name': self._name,
             'state': self._state,
-            'state_history': self._state_history,
             'parent_pipeline': self._p_pipeline
         }
 
+        if history:
+            stage_desc_as_dict['state_history'] = self._state_history.to_list()
+
         return stage_desc_as_dict
 
     def from_dict(self, d):
@@ -240,8 +371,8 @@ class Stage(object):
 
         if 'state' in d:
             if isinstance(d['state'], str) or isinstance(d['state'], str):
-                if d['state'] in list(states._stage_state_values.keys()):
-                    self._state = d['state']
+                if d['state'] in states._stage_states:
+                    self._state = states._stage_states[d['state']]
                 else:
                     raise ValueError(obj=self._uid,
                                      attribute='state',
@@ -255,7 +386,8 @@ class Stage(object):
 
         if 'state_history' in d:
             if isinstance(d['state_history'], list):
-                self._state_history = d['state_history']
+                self._state_history = StateHistory(d['state_history'],
+                                         limit=self._state_history.limit)
             else:
                 raise TypeError(entity='state_history', expected_type=list, actual_type=type(d['state_history']))
 
@@ -275,13 +407,13 @@ class Stage(object):
 
         :arguments: String
         """
-        if value not in list(states.state_numbers.keys()):
+        if value not in states.state_numbers:
             raise ValueError(obj=self._uid,
                              attribute='set_tasks_state',
                              expected_value=list(states.state_numbers.keys()),
                              actual_value=value)
 
-        for task in self._tasks:
+        for task in self.tasks:
             task.state = value
 
     def _check_stage_complete(self):
@@ -289,16 +421,16 @@ class Stage(object):
         Purpose: Check if all tasks of the current stage have completed, i.e., are in either DONE or FAILED state.
         """
 
-        try:
-
-            for task in self._tasks:
-                if task.state not in [states.DONE, states.FAILED]:
-                    return False
+        return self._counts.done + self._counts.failed >= self._task_count
 
-            return True
+    def _count_tasks(self, tasks):
+        """
+        Purpose: Include the given (new) tasks in the task state counts of the current stage.
+        """
 
-        except Exception as ex:
-            raise EnTKError(ex)
+        for task in tasks:
+            task._counts = self._counts
+            self._counts.update(None, task.state)
 
     @classmethod
     def _validate_entities(self, tasks):
@@ -323,6 +455,30 @@ class Stage(object):
 
         return tasks
 
+    def _materialize_tasks(self):
+        """
+        Purpose: Create the tasks of the task arrays which were added lazily.  If the uids of the tasks were allocated
+        already (see `_assign_uid()`), the tasks get their uids and parents assigned.
+        """
+
+        while self._task_arrays:
+            template, arguments = self._task_arrays.pop(0)
+            tasks = template._clone(arguments)
+
+            uids = self._task_uids[:len(tasks)]
+            del self._task_uids[:len(uids)]
+            for task, task_uid in zip(tasks, uids):
+                task._uid = task_uid
+                task.parent_stage['uid'] = self._uid
+                task.parent_stage['name'] = self._name
+                task.parent_pipeline['uid'] = self._p_pipeline['uid']
+                task.parent_pipeline['name'] = self._p_pipeline['name']
+
+            self._count_tasks(tasks)
+            self._tasks.update(tasks)
+
+        self._task_count = len(self._tasks)
+
     def _validate(self):
         """
         Purpose: Validate that the state of the current Stage is 'DESCRIBED' (user has not meddled with it). Also
@@ -336,23 +492,32 @@ class Stage(object):
                              expected_value=states.INITIAL,
                              actual_value=self._state)
 
-        if not self._tasks:
+        if not self._tasks and not self._task_arrays:
 
             raise MissingError(obj=self._uid,
                                missing_attribute='tasks')
 
+        # task arrays were validated when they were added
+
         for task in self._tasks:
             task._validate()
 
-    def _assign_uid(self, sid):
+    def _assign_uid(self, sid, uid=None):
         """
-        Purpose: Assign a uid to the current object based on the sid passed. Pass the current uid to children of
-        current object
+        Purpose: Assign a uid to the current object based on the sid passed, unless a (pre-allocated) uid is given.
+        Pass the current uid to children of current object. The uids of all tasks are allocated as one block.  The
+        tasks of lazy task arrays are not created here: their uids are kept until the tasks are created.
         """
-        self._uid = ru.generate_id('stage.%(item_counter)04d',
-                                   ru.ID_CUSTOM, ns=sid)
-        for task in self._tasks:
-            task._assign_uid(sid)
+        if uid:
+            self._uid = uid
+        else:
+            self._uid = generate_id('stage.%(item_counter)04d', ns=sid)
+
+        uids = generate_ids('task.%(item_counter)04d', self._task_count, ns=sid)
+        for task, task_uid in zip(self._tasks, uids):
+            task._uid = task_uid
+
+        self._task_uids = uids[len(self._tasks):]
 
         self._pass_uid()
 
@@ -364,6 +529,7 @@ class Stage(object):
         :return: list of updated Tasks
         """
 
+        # tasks of lazy task arrays get their parents once they are created
         for task in self._tasks:
             task.parent_stage['uid'] = self._uid
             task.parent_stage['name'] = self._name
@@ -91,3 +91,48 @@ for k, v in list(_task_state_values.items()):
         _task_state_inv[v].append(k)
     else:
         _task_state_inv[v] = k
+
+# -----------------------------------------------------------------------------
+# Unique numeric codes for all states, and the states by code
+_state_codes = {
+    INITIAL: 0,
+    SCHEDULING: 1,
+    SUSPENDED: 2,
+    SCHEDULED: 3,
+    SUBMITTING: 4,
+    COMPLETED: 5,
+    DONE: 6,
+    FAILED: 7,
+    CANCELED: 8
+}
+
+_code_states = [None] * len(_state_codes)
+for k, v in _state_codes.items():
+    _code_states[v] = k
+
+# Valid states per entity type, mapping any string equal to a state to the
+# (interned) state constant: setters validate and intern a state with a single
+# lookup, and state comparisons then mostly reduce to identity checks.
+_pipeline_states = {s: s for s in _pipeline_state_values}
+_stage_states = {s: s for s in _stage_state_values}
+_task_states = {s: s for s in _task_state_values}
+
+
+# -----------------------------------------------------------------------------
+# Task state transitions: for each task state, the set of states it can advance
+# to.  States generally only progress according to their numeric values above,
+# with the exception of failed tasks, which are reset when they get resubmitted.
+def _transitions(state_values, extra):
+
+    transitions = dict()
+    for old in state_values:
+        transitions[old] = frozenset(
+            [new for new in state_values
+                 if state_values[new] > state_values[old]] +
+            extra.get(old, []))
+
+    return transitions
+
+
+_task_transitions = _transitions(_task_state_values,
+                                 {FAILED: [INITIAL, SCHEDULING]})
@@ -1,9 +1,13 @@
 
-import radical.utils as ru
+import gc
 
 from .. import exceptions as ree
 from .. import states     as res
 
+from ..utils         import staging
+from ..utils.ids     import generate_id
+from ..utils.history import StateHistory, StateHistoryView
+
 
 # ------------------------------------------------------------------------------
 #
@@ -23,6 +27,62 @@ class Task(object):
     # FIXME: this should be converted into an RU/RS Attribute object, almost all
     #        of the code is redundant with the attribute class...
 
+    # Tasks are created in large numbers: avoid a per-instance `__dict__`
+    __slots__ = ['_uid', '_name', '_state', '_state_history',
+                 '_pre_exec', '_executable', '_arguments', '_sandbox',
+                 '_post_exec', '_cpu_reqs', '_gpu_reqs', '_lfs_per_process',
+                 '_upload_input_data', '_copy_input_data', '_link_input_data',
+                 '_move_input_data', '_copy_output_data', '_link_output_data',
+                 '_move_output_data', '_download_output_data',
+                 '_stdout', '_stderr', '_path', '_exit_code', '_tag',
+                 '_rts_uid', '_p_stage', '_p_pipeline', '_counts']
+
+    _default_cpu_reqs = {'processes'           : 1,
+                         'process_type'        : None,
+                         'threads_per_process' : 1,
+                         'thread_type'         : None}
+    _default_gpu_reqs = {'processes'           : 0,
+                         'process_type'        : None,
+                         'threads_per_process' : 0,
+                         'thread_type'         : None}
+
+    # attributes of the dictionaries created by `to_dict()`, and the private
+    # members they are stored in (used by `from_dict(validate=False)`).  The
+    # staging lists are kept in their serialized form (see `utils.staging`)
+    _trusted_attrs = {
+        'uid'                  : '_uid',
+        'name'                 : '_name',
+        'state'                : '_state',
+
+        'pre_exec'             : '_pre_exec',
+        'executable'           : '_executable',
+        'arguments'            : '_arguments',
+        'sandbox'              : '_sandbox',
+        'post_exec'            : '_post_exec',
+        'cpu_reqs'             : '_cpu_reqs',
+        'gpu_reqs'             : '_gpu_reqs',
+        'lfs_per_process'      : '_lfs_per_process',
+
+        'upload_input_data'    : '_upload_input_data',
+        'copy_input_data'      : '_copy_input_data',
+        'link_input_data'      : '_link_input_data',
+        'move_input_data'      : '_move_input_data',
+        'copy_output_data'     : '_copy_output_data',
+        'link_output_data'     : '_link_output_data',
+        'move_output_data'     : '_move_output_data',
+        'download_output_data' : '_download_output_data',
+
+        'stdout'               : '_stdout',
+        'stderr'               : '_stderr',
+
+        'exit_code'            : '_exit_code',
+        'path'                 : '_path',
+        'tag'                  : '_tag',
+
+        'parent_stage'         : '_p_stage',
+        'parent_pipeline'      : '_p_pipeline',
+    }
+
     # --------------------------------------------------------------------------
     #
     def __init__(self, from_dict=None):
@@ -31,32 +91,28 @@ class Task(object):
         self._name       = ""
         self._state      = res.INITIAL
 
-        # Attributes necessary for execution
-        self._pre_exec   = list()
+        # Attributes necessary for execution.  Lists and dicts which are often
+        # left empty (or at their default) are only allocated on first access
+        # (see the getters), which matters for workflows with millions of tasks
+        self._pre_exec   = None
         self._executable = ""
-        self._arguments  = list()
+        self._arguments  = None
         self._sandbox    = ""
-        self._post_exec  = list()
+        self._post_exec  = None
 
         self._lfs_per_process = 0
-        self._cpu_reqs        = {'processes'           : 1,
-                                 'process_type'        : None,
-                                 'threads_per_process' : 1,
-                                 'thread_type'         : None}
-        self._gpu_reqs        = {'processes'           : 0,
-                                 'process_type'        : None,
-                                 'threads_per_process' : 0,
-                                 'thread_type'         : None}
+        self._cpu_reqs        = None
+        self._gpu_reqs        = None
 
         # Data staging attributes
-        self._upload_input_data    = list()
-        self._copy_input_data      = list()
-        self._link_input_data      = list()
-        self._move_input_data      = list()
-        self._copy_output_data     = list()
-        self._link_output_data     = list()
-        self._move_output_data     = list()
-        self._download_output_data = list()
+        self._upload_input_data    = None
+        self._copy_input_data      = None
+        self._link_input_data      = None
+        self._move_input_data      = None
+        self._copy_output_data     = None
+        self._link_output_data     = None
+        self._move_output_data     = None
+        self._download_output_data = None
 
         # Name of file to write stdout and stderr of task
         self._stdout = ""
@@ -67,13 +123,18 @@ class Task(object):
         self._path      = None
         self._exit_code = None
         self._tag       = None
+        self._rts_uid   = None
 
-        # Keep track of res attained
-        self._state_history = [res.INITIAL]
+        # Keep track of res attained (allocated on the first state transition)
+        self._state_history = None
 
         # Stage and pipeline this task belongs to
-        self._p_stage    = {'uid': None, 'name': None}
-        self._p_pipeline = {'uid': None, 'name': None}
+        self._p_stage    = None
+        self._p_pipeline = None
+
+        # Task state counters of the stage this task belongs to (see
+        # `Stage.progress`), updated on state changes
+        self._counts     = None
 
         # populate task attributes if so requesteed
         if from_dict:
@@ -161,6 +222,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._pre_exec is None:
+            self._pre_exec = list()
+
         return self._pre_exec
 
 
@@ -187,6 +251,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._arguments is None:
+            self._arguments = list()
+
         return self._arguments
 
 
@@ -213,6 +280,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._post_exec is None:
+            self._post_exec = list()
+
         return self._post_exec
 
 
@@ -252,6 +322,9 @@ class Task(object):
         :arguments: dict
         '''
 
+        if self._cpu_reqs is None:
+            self._cpu_reqs = dict(self._default_cpu_reqs)
+
         return self._cpu_reqs
 
 
@@ -290,6 +363,9 @@ class Task(object):
         :arguments: dict
         '''
 
+        if self._gpu_reqs is None:
+            self._gpu_reqs = dict(self._default_gpu_reqs)
+
         return self._gpu_reqs
 
 
@@ -313,6 +389,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._upload_input_data is None:
+            self._upload_input_data = list()
+
         return self._upload_input_data
 
 
@@ -327,6 +406,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._copy_input_data is None:
+            self._copy_input_data = list()
+
         return self._copy_input_data
 
 
@@ -341,6 +423,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._link_input_data is None:
+            self._link_input_data = list()
+
         return self._link_input_data
 
 
@@ -355,6 +440,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._move_input_data is None:
+            self._move_input_data = list()
+
         return self._move_input_data
 
 
@@ -369,6 +457,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._copy_output_data is None:
+            self._copy_output_data = list()
+
         return self._copy_output_data
 
 
@@ -383,6 +474,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._link_output_data is None:
+            self._link_output_data = list()
+
         return self._link_output_data
 
 
@@ -397,6 +491,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._move_output_data is None:
+            self._move_output_data = list()
+
         return self._move_output_data
 
 
@@ -411,6 +508,9 @@ class Task(object):
         :arguments: list of strings
         '''
 
+        if self._download_output_data is None:
+            self._download_output_data = list()
+
         return self._download_output_data
 
 
@@ -474,6 +574,17 @@ class Task(object):
         return self._tag
 
 
+    @property
+    def rts_uid(self):
+        '''
+        Unique ID of the RTS unit which executed the current task
+
+        :getter: return the uid of the RTS unit
+        '''
+
+        return self._rts_uid
+
+
     @property
     def parent_stage(self):
         '''
@@ -481,6 +592,9 @@ class Task(object):
         :setter: Assigns the stage uid this task belongs to
         '''
 
+        if self._p_stage is None:
+            self._p_stage = {'uid': None, 'name': None}
+
         return self._p_stage
 
 
@@ -491,18 +605,22 @@ class Task(object):
         :setter: Assigns the pipeline uid this task belongs to
         '''
 
+        if self._p_pipeline is None:
+            self._p_pipeline = {'uid': None, 'name': None}
+
         return self._p_pipeline
 
 
     @property
     def state_history(self):
         '''
-        Returns a list of the states obtained in temporal order
+        Returns a read-only view of the states obtained in temporal order,
+        which reflects later state changes of the task
 
-        :return: list
+        :return: StateHistoryView
         '''
 
-        return self._state_history
+        return StateHistoryView(self)
 
 
     # --------------------------------------------------------------------------
@@ -545,29 +663,45 @@ class Task(object):
             raise ree.TypeError(expected_type=str,
                                 actual_type=type(value))
 
-        if value not in res._task_state_values:
+        # validate and intern the state in one lookup
+        state = res._task_states.get(value)
+        if state is None:
             raise ree.ValueError(obj=self._uid,
                              attribute='state',
                              expected_value=list(res._task_state_values.keys()),
                              actual_value=value)
-        self._state = value
-        self._state_history.append(value)
+        if self._counts is not None:
+            self._counts.update(self._state, state)
+
+        if self._state_history is None:
+            self._state_history = StateHistory([res.INITIAL])
+
+        self._state = state
+        self._state_history.append(state)
 
 
     @state_history.setter
     def state_history(self, value):
 
+        # allow to assign the history of another task
+        if isinstance(value, StateHistoryView):
+            value = value.to_list()
+
         if not isinstance(value, list):
             raise ree.TypeError(entity='state_history', expected_type=list,
                                 actual_type=type(value))
 
         for elem in value:
-            if elem not in res._task_state_values:
+            if elem not in res._task_states:
                 raise ree.ValueError(obj=self._uid,
                                  attribute='state_history element',
                                  expected_value=list(res._task_state_values.keys()),
                                  actual_value=elem)
-        self._state_history = value
+        limit = None
+        if self._state_history is not None:
+            limit = self._state_history.limit
+
+        self._state_history = StateHistory(value, limit=limit)
 
 
     @pre_exec.setter
@@ -654,10 +788,11 @@ class Task(object):
                                  actual_value=value.get('thread_type'),
                                  attribute='thread_type')
 
-        self._cpu_reqs['processes']           = value.get('processes', 1)
-        self._cpu_reqs['process_type']        = value.get('process_type')
-        self._cpu_reqs['threads_per_process'] = value.get('threads_per_process', 1)
-        self._cpu_reqs['thread_type']         = value.get('thread_type')
+        self._cpu_reqs = {
+                'processes'           : value.get('processes', 1),
+                'process_type'        : value.get('process_type'),
+                'threads_per_process' : value.get('threads_per_process', 1),
+                'thread_type'         : value.get('thread_type')}
 
 
     @gpu_reqs.setter
@@ -696,10 +831,11 @@ class Task(object):
                                  obj='gpu_reqs',
                                  attribute='thread_type')
 
-        self._gpu_reqs['processes']           = value.get('processes', 1)
-        self._gpu_reqs['process_type']        = value.get('process_type')
-        self._gpu_reqs['threads_per_process'] = value.get('threads_per_process', 1)
-        self._gpu_reqs['thread_type']         = value.get('thread_type')
+        self._gpu_reqs = {
+                'processes'           : value.get('processes', 1),
+                'process_type'        : value.get('process_type'),
+                'threads_per_process' : value.get('threads_per_process', 1),
+                'thread_type'         : value.get('thread_type')}
 
 
     @lfs_per_process.setter
@@ -714,73 +850,49 @@ class Task(object):
     @upload_input_data.setter
     def upload_input_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._upload_input_data = value
+        self._upload_input_data = staging.to_directives(value)
 
 
     @copy_input_data.setter
     def copy_input_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._copy_input_data = value
+        self._copy_input_data = staging.to_directives(value)
 
 
     @move_input_data.setter
     def move_input_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._move_input_data = value
+        self._move_input_data = staging.to_directives(value)
 
 
     @link_input_data.setter
     def link_input_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._link_input_data = value
+        self._link_input_data = staging.to_directives(value)
 
 
     @copy_output_data.setter
     def copy_output_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._copy_output_data = value
+        self._copy_output_data = staging.to_directives(value)
 
 
     @link_output_data.setter
     def link_output_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._link_output_data = value
+        self._link_output_data = staging.to_directives(value)
 
 
     @move_output_data.setter
     def move_output_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._move_output_data = value
+        self._move_output_data = staging.to_directives(value)
 
 
     @download_output_data.setter
     def download_output_data(self, value):
 
-        if not isinstance(value, list):
-            raise ree.TypeError(expected_type=list, actual_type=type(value))
-
-        self._download_output_data = value
+        self._download_output_data = staging.to_directives(value)
 
 
     @stdout.setter
@@ -833,6 +945,16 @@ class Task(object):
         self._tag = value
 
 
+    @rts_uid.setter
+    def rts_uid(self, value):
+
+        if not isinstance(value, str):
+            raise ree.TypeError(entity='rts_uid', expected_type=str,
+                                actual_type=type(value))
+
+        self._rts_uid = value
+
+
     @parent_stage.setter
     def parent_stage(self, value):
 
@@ -853,36 +975,47 @@ class Task(object):
 
     # --------------------------------------------------------------------------
     #
-    def to_dict(self):
+    def to_dict(self, history=True):
         '''
-        Convert current Task into a dictionary
+        Convert current Task into a dictionary.  The state history is only
+        included if `history` is set: the components exchanging tasks do not
+        need it.
 
+        :arguments:
+            :history: include the state history
         :return: python dictionary
         '''
 
+        # lazily allocated members are not allocated here: the dictionary is
+        # usually serialized right away
+        cpu_reqs   = self._cpu_reqs   or dict(self._default_cpu_reqs)
+        gpu_reqs   = self._gpu_reqs   or dict(self._default_gpu_reqs)
+        p_stage    = self._p_stage    or {'uid': None, 'name': None}
+        p_pipeline = self._p_pipeline or {'uid': None, 'name': None}
+        serialize  = staging.serialize
+
         task_desc_as_dict = {
             'uid'                  : self._uid,
             'name'                 : self._name,
             'state'                : self._state,
-            'state_history'        : self._state_history,
 
-            'pre_exec'             : self._pre_exec,
+            'pre_exec'             : self._pre_exec or list(),
             'executable'           : self._executable,
-            'arguments'            : self._arguments,
+            'arguments'            : self._arguments or list(),
             'sandbox'              : self._sandbox,
-            'post_exec'            : self._post_exec,
-            'cpu_reqs'             : self._cpu_reqs,
-            'gpu_reqs'             : self._gpu_reqs,
+            'post_exec'            : self._post_exec or list(),
+            'cpu_reqs'             : cpu_reqs,
+            'gpu_reqs'             : gpu_reqs,
             'lfs_per_process'      : self._lfs_per_process,
 
-            'upload_input_data'    : self._upload_input_data,
-            'copy_input_data'      : self._copy_input_data,
-            'link_input_data'      : self._link_input_data,
-            'move_input_data'      : self._move_input_data,
-            'copy_output_data'     : self._copy_output_data,
-            'link_output_data'     : self._link_output_data,
-            'move_output_data'     : self._move_output_data,
-            'download_output_data' : self._download_output_data,
+            'upload_input_data'    : serialize(self._upload_input_data),
+            'copy_input_data'      : serialize(self._copy_input_data),
+            'link_input_data'      : serialize(self._link_input_data),
+            'move_input_data'      : serialize(self._move_input_data),
+            'copy_output_data'     : serialize(self._copy_output_data),
+            'link_output_data'     : serialize(self._link_output_data),
+            'move_output_data'     : serialize(self._move_output_data),
+            'download_output_data' : serialize(self._download_output_data),
 
             'stdout'               : self._stdout,
             'stderr'               : self._stderr,
@@ -891,23 +1024,56 @@ class Task(object):
             'path'                 : self._path,
             'tag'                  : self._tag,
 
-            'parent_stage'         : self._p_stage,
-            'parent_pipeline'      : self._p_pipeline,
+            'parent_stage'         : p_stage,
+            'parent_pipeline'      : p_pipeline,
         }
 
+        if history:
+            task_desc_as_dict['state_history'] = self.state_history.to_list()
+
         return task_desc_as_dict
 
 
     # --------------------------------------------------------------------------
     #
-    def from_dict(self, d):
+    def _to_delta(self):
+        '''
+        Convert the state of the current Task into a (small) dictionary.  This
+        is sent for state updates to components which already hold the full
+        task description, and is applied there via `from_dict()`.
+
+        :return: python dictionary
+        '''
+
+        return {'uid'      : self._uid,
+                'state'    : self._state,
+                'exit_code': self._exit_code,
+                'path'     : self._path}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def from_dict(self, d, validate=True):
         '''
         Create a Task from a dictionary. The change is in inplace.
 
-        :argument: python dictionary
+        Dictionaries created by EnTK itself (via `to_dict()` or `_to_delta()`)
+        can be applied with `validate=False`: this skips the type and value
+        checks of the attribute setters and assigns the values as they are,
+        which makes deserializing tasks considerably cheaper.  The dictionary
+        (and the lists and dicts in it) must not be used by the caller after
+        that, as the task now owns it.
+
+        :arguments:
+            :d: python dictionary
+            :validate: check types and values of the given attributes
         :return: None
         '''
 
+        if not validate:
+            self._from_trusted_dict(d)
+            return
+
         # FIXME: uid, name, state and state_history to use setter type checks
         if d.get('uid')  is not None: self._uid  = d['uid']
         if d.get('name') is not None: self._name = d['name']
@@ -931,6 +1097,96 @@ class Task(object):
                     setattr(self, k, v)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _from_trusted_dict(self, d):
+        '''
+        Populate the Task from a dictionary created by EnTK, without validation.
+        Semantics otherwise match `from_dict()`: `None` values are ignored and
+        a missing state resets the task to `INITIAL`.
+        '''
+
+        if 'state' not in d:
+            self._state = res.INITIAL
+
+        attrs = self._trusted_attrs
+
+        for k, v in d.items():
+
+            if v is None:
+                continue
+
+            attr = attrs.get(k)
+            if attr:
+                setattr(self, attr, v)
+
+            else:
+                # not an attribute `to_dict()` creates: use the setter
+                setattr(self, k, v)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _clone(self, arguments):
+        '''
+        Purpose: Create new tasks with the description of the current (already
+        validated) task, one for each element of the given list of arguments.
+        The attribute setters are bypassed, and only attributes which differ
+        from their defaults are assigned.  Containers are copied, so that the
+        new tasks are independent of each other.  The new tasks have no uid and
+        no name (names identify tasks, e.g., in placeholders and tags, and
+        would not be unique), and are in INITIAL state.
+
+        :return: list of Tasks
+        '''
+
+        default    = Task()
+        attrs      = list()
+        containers = list()
+
+        for attr in self.__slots__:
+
+            if attr in ['_uid', '_name', '_state', '_state_history',
+                        '_arguments', '_counts']:
+                continue
+
+            val = getattr(self, attr)
+
+            if isinstance(val, (list, dict)):
+                if val:
+                    containers.append((attr, val))
+
+            elif val != getattr(default, attr):
+                attrs.append((attr, val))
+
+        # none of the new objects can be part of a reference cycle: pause the
+        # cyclic garbage collector, which would otherwise repeatedly scan all
+        # of them while they are created
+        gc_enabled = gc.isenabled()
+        gc.disable()
+
+        try:
+            tasks = list()
+            for args in arguments:
+
+                task = Task()
+
+                for attr, val in attrs:
+                    setattr(task, attr, val)
+
+                for attr, val in containers:
+                    setattr(task, attr, val.copy())
+
+                task._arguments = list(args)
+                tasks.append(task)
+
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        return tasks
+
+
     # --------------------------------------------------------------------------
     #
     def _assign_uid(self, sid):
@@ -938,8 +1194,7 @@ class Task(object):
         Purpose: Assign uid to the current object based on the session ID passed
         '''
 
-        self.uid = ru.generate_id('task.%(item_counter)04d',
-                                  ru.ID_CUSTOM, ns=sid)
+        self.uid = generate_id('task.%(item_counter)04d', ns=sid)
 
 
     # --------------------------------------------------------------------------
@@ -8,6 +8,19 @@ from .prof_utils         import write_session_description
 from .prof_utils         import get_session_description
 from .prof_utils         import write_workflows
 
+from .mq_utils           import get_channel
+from .mq_utils           import invalidate
+from .mq_utils           import close_connection
+from .mq_utils           import get_counters
+
+from .ids                import generate_id
+from .ids                import generate_ids
+
+from .history            import StateHistory
+from .history            import StateHistoryView
+
+from .staging            import StagingDirective
+
 
 # ------------------------------------------------------------------------------
 #
@@ -0,0 +1,216 @@
+import time
+
+from array       import array
+from collections import abc
+
+from .. import states as res
+
+
+# ------------------------------------------------------------------------------
+#
+class StateHistory(object):
+    '''
+    History of the states of a pipeline, stage or task.  The states are stored
+    as their numeric codes (see `states._state_codes`), each followed by the
+    time the state was entered, in a single array -- 16 bytes per transition.
+    A time of `0` marks states which were not recorded as they were entered: the
+    states a history is created with, such as the initial state of an entity or
+    the states restored by `from_dict()`.
+
+    The number of states retained is bounded by `limit` (`None` keeps all
+    states).  When the limit is exceeded, the oldest states are dropped, except
+    for the very first (initial) state.  The WFprocessor sets the limit of the
+    histories of the entities it manages from the AppManager's
+    `state_history_limit` configuration.
+    '''
+
+    __slots__ = ['_data', '_limit']
+
+    def __init__(self, states=None, ts=0, limit=None):
+
+        codes = res._state_codes
+        data  = list()
+
+        for state in states or list():
+            data.append(codes[state])
+            data.append(ts)
+
+        self._data  = array('d', data)
+        self._limit = limit
+        self._trim()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def limit(self):
+        '''
+        Maximum number of states retained (`None` for no limit).  Setting the
+        limit drops states in excess of it right away.
+        '''
+
+        return self._limit
+
+
+    @limit.setter
+    def limit(self, value):
+
+        self._limit = value
+        self._trim()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _trim(self):
+
+        limit = self._limit
+        if limit and len(self._data) > 2 * limit:
+            # keep the initial state
+            del self._data[2:len(self._data) - 2 * limit + 2]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def append(self, state, ts=None):
+        '''
+        Record `state` as entered at time `ts` (default: now).
+        '''
+
+        self._data.append(res._state_codes[state])
+        self._data.append(time.time() if ts is None else ts)
+
+        if self._limit:
+            self._trim()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def to_list(self):
+        '''
+        Return the recorded states as a list of state names.
+        '''
+
+        code_states = res._code_states
+
+        return [code_states[int(code)] for code in self._data[::2]]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def items(self):
+        '''
+        Return the recorded states as a list of `(state, timestamp)` tuples.
+        '''
+
+        return list(zip(self.to_list(), self._data[1::2]))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return len(self._data) // 2
+
+
+    def __iter__(self):
+
+        return iter(self.to_list())
+
+
+    def __getitem__(self, idx):
+
+        return self.to_list()[idx]
+
+
+    def __eq__(self, other):
+
+        if isinstance(other, StateHistory):
+            return self._data[::2] == other._data[::2]
+
+        return self.to_list() == other
+
+
+    # histories are mutable
+    __hash__ = None
+
+
+    def __repr__(self):
+
+        return repr(self.to_list())
+
+
+# ------------------------------------------------------------------------------
+#
+class StateHistoryView(abc.Sequence):
+    '''
+    Read-only view of the state history of a pipeline, stage or task, as
+    returned by their `state_history` properties.  The view is live: it
+    reflects states recorded after it was obtained, also when the history of
+    the entity is replaced.  It compares equal to the list of its states, and
+    `to_list()` returns a copy of that list.
+    '''
+
+    __slots__ = ['_entity']
+
+    def __init__(self, entity):
+
+        self._entity = entity
+
+
+    # --------------------------------------------------------------------------
+    #
+    def to_list(self):
+        '''
+        Return the recorded states as a list of state names.
+        '''
+
+        hist = self._entity._state_history
+
+        # tasks create their history on their first state transition
+        if hist is None:
+            return [res.INITIAL]
+
+        return hist.to_list()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        hist = self._entity._state_history
+
+        if hist is None:
+            return 1
+
+        return len(hist)
+
+
+    def __iter__(self):
+
+        return iter(self.to_list())
+
+
+    def __getitem__(self, idx):
+
+        return self.to_list()[idx]
+
+
+    def __eq__(self, other):
+
+        if isinstance(other, StateHistoryView):
+            other = other.to_list()
+
+        return self.to_list() == other
+
+
+    # the view changes along with the history
+    __hash__ = None
+
+
+    def __repr__(self):
+
+        return repr(self.to_list())
+
+
+# ------------------------------------------------------------------------------
+
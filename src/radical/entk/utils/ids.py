@@ -0,0 +1,84 @@
+import os
+import fcntl
+import getpass
+
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+# Allocation of the uids of pipelines, stages and tasks.  `ru.generate_id(
+# template, ru.ID_CUSTOM, ns=sid)` locks, reads and rewrites a counter file for
+# every single uid, which dominates the initialization of workflows with many
+# tasks.  `generate_ids()` reserves a contiguous range of uids with a single
+# update of a counter file.  EnTK owns those counter files: all uids of these
+# entities must be allocated here (`generate_id()` for single uids), as the
+# counters are not shared with `ru.generate_id()`.
+#
+_base = ru.get_radical_base('entk')
+
+
+# ------------------------------------------------------------------------------
+#
+def _counter_file(template, ns):
+
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'nobody'
+
+    state_dir = '%s/ids' % _base
+    if ns:
+        state_dir += '/%s' % ns
+
+    os.makedirs(state_dir, exist_ok=True)
+
+    return '%s/%s_%s.cnt' % (state_dir, user, template.replace('/', '_'))
+
+
+# ------------------------------------------------------------------------------
+#
+def generate_ids(template, count, ns=None):
+    '''
+    Return `count` uids for the given template (which needs to use
+    `%(item_counter)`), reserved in one step: uids are counted per template
+    and namespace `ns`, as by `ru.generate_id(template, ru.ID_CUSTOM, ns=ns)`.
+    '''
+
+    if '%(item_counter)' not in template:
+        raise ValueError('uid template %s lacks an item counter' % template)
+
+    if count <= 0:
+        return list()
+
+    fd = os.open(_counter_file(template, ns), os.O_RDWR | os.O_CREAT)
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        data  = os.read(fd, 256)
+        first = int(data) if data.strip() else 0
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, str.encode('%d\n' % (first + count)))
+
+    finally:
+        os.close(fd)
+
+    return [template % {'item_counter': cnt}
+            for cnt in range(first, first + count)]
+
+
+# ------------------------------------------------------------------------------
+#
+def generate_id(template, ns=None):
+    '''
+    Return a single uid for the given template, see `generate_ids()`.
+    '''
+
+    return generate_ids(template, 1, ns=ns)[0]
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,161 @@
+import os
+
+import threading as mt
+
+from ..execman import transport
+
+
+# ------------------------------------------------------------------------------
+#
+# Per-thread pool of message queue connections (see `execman.transport`).
+# pika's BlockingConnection is not thread safe, so each thread gets its own
+# connection (and one channel on it) per broker, which is then reused by all
+# EnTK components running in that thread -- the task manager, the WFprocessor
+# and the AppManager.  Connections which are found closed are transparently
+# re-established.
+#
+# Connections are never shared across processes: a pool entry inherited via
+# `fork` (as for the task manager process) is ignored by the child.
+#
+_pool     = mt.local()
+_lock     = mt.Lock()
+_counters = {'open'     : 0,
+             'reuse'    : 0,
+             'reconnect': 0,
+             'close'    : 0}
+
+
+# ------------------------------------------------------------------------------
+#
+def _key(rmq_conn_params):
+
+    if isinstance(rmq_conn_params, transport.LocalConnectionParameters):
+        return ('local', id(rmq_conn_params.broker))
+
+    return (rmq_conn_params.host,
+            rmq_conn_params.port,
+            rmq_conn_params.virtual_host,
+            getattr(rmq_conn_params.credentials, 'username', None))
+
+
+# ------------------------------------------------------------------------------
+#
+def _count(event):
+
+    with _lock:
+        _counters[event] += 1
+        return _counters[event]
+
+
+# ------------------------------------------------------------------------------
+#
+def _entries():
+
+    # drop whatever the pool inherited from a parent process
+    if getattr(_pool, 'pid', None) != os.getpid():
+        _pool.pid     = os.getpid()
+        _pool.entries = dict()
+
+    return _pool.entries
+
+
+# ------------------------------------------------------------------------------
+#
+def get_channel(rmq_conn_params, prof=None, uid=None):
+    '''
+    Return a channel to the broker described by `rmq_conn_params`, reusing the
+    calling thread's connection if it is still open.  Connection churn is
+    recorded in the given profiler (`mq_conn_open`, `mq_conn_reconnect`).
+    '''
+
+    entries = _entries()
+    key     = _key(rmq_conn_params)
+    entry   = entries.get(key)
+
+    if entry:
+
+        conn, chan = entry
+
+        if conn.is_open and chan.is_open:
+            _count('reuse')
+            return chan
+
+        # the connection or channel went away - reconnect
+        _close(conn)
+        del entries[key]
+
+        cnt = _count('reconnect')
+        if prof:
+            prof.prof('mq_conn_reconnect', uid=uid, msg=str(cnt))
+
+    conn = transport.connect(rmq_conn_params)
+    chan = conn.channel()
+
+    entries[key] = (conn, chan)
+
+    cnt = _count('open')
+    if prof:
+        prof.prof('mq_conn_open', uid=uid, msg=str(cnt))
+
+    return chan
+
+
+# ------------------------------------------------------------------------------
+#
+def invalidate(rmq_conn_params):
+    '''
+    Drop the calling thread's connection to the given broker, e.g., after an
+    error left it in an unknown state.  The next `get_channel()` reconnects.
+    '''
+
+    entry = _entries().pop(_key(rmq_conn_params), None)
+
+    if entry:
+        _close(entry[0])
+
+
+# ------------------------------------------------------------------------------
+#
+def close_connection(rmq_conn_params, prof=None, uid=None):
+    '''
+    Close the calling thread's connection to the given broker.  This should be
+    called by each thread before it terminates.
+    '''
+
+    entry = _entries().pop(_key(rmq_conn_params), None)
+
+    if not entry:
+        return
+
+    _close(entry[0])
+
+    cnt = _count('close')
+    if prof:
+        prof.prof('mq_conn_close', uid=uid, msg=str(cnt))
+
+
+# ------------------------------------------------------------------------------
+#
+def get_counters():
+    '''
+    Return a copy of the connection churn counters of this process.
+    '''
+
+    with _lock:
+        return dict(_counters)
+
+
+# ------------------------------------------------------------------------------
+#
+def _close(conn):
+
+    try:
+        if conn.is_open:
+            conn.close()
+
+    except Exception:
+        # the connection is dropped either way
+        pass
+
+
+# ------------------------------------------------------------------------------
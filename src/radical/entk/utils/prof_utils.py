@@ -244,7 +244,7 @@ def write_workflows(workflows, uid, fname=None, fwrite=True):
             p = dict()
             p['uid']           = pipe.uid
             p['name']          = pipe.name
-            p['state_history'] = pipe.state_history
+            p['state_history'] = pipe.state_history.to_list()
             p['stages']        = list()
 
             for stage in pipe.stages:
@@ -252,7 +252,7 @@ def write_workflows(workflows, uid, fname=None, fwrite=True):
                 s = dict()
                 s['uid']           = stage.uid
                 s['name']          = stage.name
-                s['state_history'] = stage.state_history
+                s['state_history'] = stage.state_history.to_list()
                 s['tasks']         = list()
 
                 for task in stage.tasks:
@@ -0,0 +1,53 @@
+import json
+
+from ..exceptions import EnTKError
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# ------------------------------------------------------------------------------
+#
+# Serialization of the messages exchanged between EnTK components.  The sender
+# picks the format ('json' or, if available, the more compact and faster
+# 'msgpack'), the receiver detects it from the message itself: JSON documents
+# sent by EnTK always start with '{' or '[', msgpack maps and arrays never do.
+#
+SERIALIZERS = ['json', 'msgpack']
+
+_JSON_START = b'{['
+
+
+# ------------------------------------------------------------------------------
+#
+def dumps(obj, serializer='json'):
+    '''
+    Serialize `obj` with the given serializer.  'msgpack' falls back to 'json'
+    if msgpack is not installed.
+    '''
+
+    if serializer == 'msgpack' and msgpack:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    return json.dumps(obj)
+
+
+# ------------------------------------------------------------------------------
+#
+def loads(data):
+    '''
+    Deserialize a message created by `dumps()`, whatever serializer was used.
+    '''
+
+    if isinstance(data, str) or data[0] in _JSON_START:
+        return json.loads(data)
+
+    if not msgpack:
+        raise EnTKError('cannot decode msgpack message: msgpack missing')
+
+    return msgpack.unpackb(data, raw=False)
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,136 @@
+from .. import exceptions as ree
+
+
+# ------------------------------------------------------------------------------
+#
+# The staging lists of a task (`upload_input_data`, `copy_input_data`, etc.)
+# hold directives of the form `'source > target'` or just `'source'`.  They are
+# split once, when assigned to the task, into `StagingDirective`s, and are sent
+# to the task manager in their serialized form: the source, or a `[source,
+# target]` pair.  Tasks received by a task manager keep that form, and
+# `parse()` returns source and target for all of these forms, without splitting
+# strings again.
+#
+
+
+# ------------------------------------------------------------------------------
+#
+class StagingDirective(str):
+    '''
+    A staging directive, split into its `source` and `target` (`None` if not
+    given).  Directives are still strings, so that the staging lists behave as
+    before for application code.  They can also be created from a `[source,
+    target]` pair.
+    '''
+
+    def __new__(cls, directive):
+
+        if isinstance(directive, str):
+
+            if isinstance(directive, StagingDirective):
+                return directive
+
+            self = str.__new__(cls, directive)
+
+            if '>' in directive:
+                parts       = directive.split('>')
+                self.source = parts[0].strip()
+                self.target = parts[1].strip()
+            else:
+                self.source = directive.strip()
+                self.target = None
+
+            return self
+
+        if isinstance(directive, (list, tuple)) and len(directive) == 2:
+
+            source, target = directive
+
+            self = str.__new__(cls, '%s > %s' % (source, target))
+            self.source = source
+            self.target = target
+
+            return self
+
+        raise ree.TypeError(expected_type=str, actual_type=type(directive))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def serialize(self):
+        '''
+        Return the directive as its source or, if it has a target, as
+        a `[source, target]` pair.
+        '''
+
+        if self.target is None:
+            return self.source
+
+        return [self.source, self.target]
+
+
+# ------------------------------------------------------------------------------
+#
+def to_directives(value):
+    '''
+    Convert a staging list (of strings, pairs or directives) into a list of
+    `StagingDirective`s.
+    '''
+
+    if not isinstance(value, list):
+        raise ree.TypeError(expected_type=list, actual_type=type(value))
+
+    return [StagingDirective(directive) for directive in value]
+
+
+# ------------------------------------------------------------------------------
+#
+def serialize(directives):
+    '''
+    Serialize a staging list (`None` for an empty one).  The list may also hold
+    strings appended by the application, and serialized directives.
+    '''
+
+    if not directives:
+        return list()
+
+    ret = list()
+    for directive in directives:
+
+        if isinstance(directive, StagingDirective):
+            ret.append(directive.serialize())
+
+        elif isinstance(directive, str):
+            ret.append(StagingDirective(directive).serialize())
+
+        else:
+            ret.append(directive)
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def parse(directive):
+    '''
+    Return source and target (or `None`) of a directive, which can be given as
+    a `StagingDirective`, a string or a serialized directive.
+    '''
+
+    if isinstance(directive, StagingDirective):
+        return directive.source, directive.target
+
+    if isinstance(directive, str):
+
+        # serialized directives without target are not split
+        if '>' not in directive:
+            return directive.strip(), None
+
+        directive = StagingDirective(directive)
+        return directive.source, directive.target
+
+    return directive[0], directive[1]
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+'''
+Throughput of the conversion of tasks into RP ComputeUnitDescriptions, as done
+by the RP task manager for each chunk of tasks it submits: tasks with heavy
+staging lists (`n_staging` entries in each of the eight staging directive
+lists, half of them with placeholders to resolve) are converted
+
+  - serially, via `create_cud_from_task()`, and
+  - by a pool of `n_workers` processes, which prepare the CUD attributes via
+    `get_cud_dicts_from_msgs()` while the CUDs are created from them in order.
+    The workers get the placeholders once, as changes of a journaled index.
+
+The pool only pays off for large bulks and with enough idle cores: the task
+manager converts bulks of fewer than `ENTK_CUD_POOL_MIN` tasks serially.  Use
+this benchmark to find the crossover on the target machine.
+
+usage: bench_cud_construction.py [n_tasks] [n_staging] [n_workers]
+'''
+
+import os
+import sys
+import time
+import itertools
+import multiprocessing as mp
+
+from radical.entk                           import Task, states
+from radical.entk.execman.rp.task_processor import create_cud_from_task
+from radical.entk.execman.rp.task_processor import create_cud_from_dict
+from radical.entk.execman.rp.task_processor import get_cud_dicts_from_msgs
+from radical.entk.execman.rp.task_processor import init_cud_worker
+from radical.entk.execman.placeholders      import Placeholders
+
+
+# ------------------------------------------------------------------------------
+#
+def make_task(i, n_staging):
+
+    ref = '$Pipeline_p0_Stage_s0_Task_t%d' % i
+
+    t = Task()
+    t._uid            = 'task.%06d' % i
+    t.name            = 't%d' % i
+    t.executable      = '/bin/date'
+    t.arguments       = ['-r', '%s/date.txt' % ref]
+    t.parent_stage    = {'uid': 'stage.0001', 'name': 's1'}
+    t.parent_pipeline = {'uid': 'pipeline.0000', 'name': 'p0'}
+
+    inputs  = ['%s/in.%d > in.%d' % (ref, j, j) if j % 2 else 'in.%d' % j
+               for j in range(n_staging)]
+    outputs = ['out.%d > $SHARED/out.%d.%d' % (j, i, j) if j % 2
+               else 'out.%d' % j for j in range(n_staging)]
+
+    t.link_input_data      = inputs
+    t.upload_input_data    = inputs
+    t.copy_input_data      = inputs
+    t.move_input_data      = inputs
+    t.copy_output_data     = outputs
+    t.link_output_data     = outputs
+    t.download_output_data = outputs
+    t.move_output_data     = outputs
+    t.state                = states.SCHEDULING
+
+    return t
+
+
+# ------------------------------------------------------------------------------
+#
+def bench_serial(msgs, placeholders):
+
+    start = time.time()
+    for msg in msgs:
+        task = Task()
+        task.from_dict(msg, validate=False)
+        create_cud_from_task(task, placeholders)
+
+    return len(msgs) / (time.time() - start)
+
+
+# ------------------------------------------------------------------------------
+#
+def bench_pool(msgs, placeholders, pool, n_workers):
+
+    start    = time.time()
+    changes  = placeholders.changes(0)
+    size     = -(-len(msgs) // n_workers)
+    parts    = [(msgs[i:i + size], 0, changes)
+                for i in range(0, len(msgs), size)]
+
+    results   = pool.starmap(get_cud_dicts_from_msgs, parts)
+    cud_dicts = itertools.chain.from_iterable(res[2] for res in results)
+    cuds      = [create_cud_from_dict(cud_dict) for cud_dict in cud_dicts]
+
+    rate = len(msgs) / (time.time() - start)
+
+    # order is preserved
+    for msg, cud in zip(msgs, cuds):
+        assert cud.name.split(',')[0] == msg['uid']
+
+    return rate
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_tasks   = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_staging = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    n_workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    placeholders = Placeholders(journal=True)
+    for i in range(n_tasks):
+        placeholders.add('p0', 's0', 't%d' % i, {'path'   : '/scratch/t%d' % i,
+                                                 'rts_uid': 'unit.%06d' % i})
+    msgs = [make_task(i, n_staging).to_dict() for i in range(n_tasks)]
+
+    pool = mp.Pool(n_workers, initializer=init_cud_worker)
+    try:
+        # warm up the workers
+        bench_pool(msgs[:n_workers], placeholders, pool, n_workers)
+
+        serial = bench_serial(msgs, placeholders)
+        pooled = bench_pool(msgs, placeholders, pool, n_workers)
+
+    finally:
+        pool.close()
+        pool.join()
+
+    print('tasks      : %d with %d entries per staging list'
+          % (n_tasks, n_staging))
+    print('serial     : %8.0f CUDs/s' % serial)
+    print('%2d workers : %8.0f CUDs/s (%.2fx)'
+          % (n_workers, pooled, pooled / serial))
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+'''
+Contention benchmark for the pipeline locks: the three threads which operate on
+the workflow -- the WFprocessor's enqueuer and dequeuer, and the AppManager's
+synchronizer -- work concurrently through a workflow of (by default) 1000
+pipelines with one stage of 1000 tasks each:
+
+  - the enqueuer creates and submits the workload (the pending queue is not
+    declared, so messages are serialized and then dropped),
+  - the synchronizer applies SUBMITTING and EXECUTED updates to tasks once they
+    got scheduled,
+  - the dequeuer completes tasks once they got executed.
+
+The pipeline locks are instrumented to report the time they were held, and the
+time threads waited to acquire them.
+
+usage: bench_lock_contention.py [n_pipelines] [n_tasks]
+'''
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+os.environ['RADICAL_PROFILE']    = 'True'
+os.environ['RADICAL_REPORT_TGT'] = os.devnull
+
+import radical.utils as ru
+
+from radical.entk                    import Pipeline, Stage, Task, states
+from radical.entk                    import AppManager
+from radical.entk.appman.wfprocessor import WFprocessor
+from radical.entk.execman.transport  import LocalConnectionParameters
+
+
+# ------------------------------------------------------------------------------
+#
+class TimedLock(object):
+
+    waited = dict()
+    held   = dict()
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._t0   = None
+
+    def __enter__(self):
+
+        name  = threading.current_thread().name
+        start = time.time()
+        self._lock.acquire()
+        self._t0 = time.time()
+        self.waited[name] = self.waited.get(name, 0.0) + self._t0 - start
+
+    def __exit__(self, *args):
+
+        name = threading.current_thread().name
+        self.held[name] = self.held.get(name, 0.0) + time.time() - self._t0
+        self._lock.release()
+
+
+# ------------------------------------------------------------------------------
+#
+def build(n_pipelines, n_tasks):
+
+    workflow = list()
+    for _ in range(n_pipelines):
+
+        task = Task()
+        task.executable = '/bin/date'
+
+        stage = Stage()
+        stage.add_task_array(task, [[str(i)] for i in range(n_tasks)])
+
+        pipe = Pipeline()
+        pipe.add_stages(stage)
+        pipe._lock = TimedLock()
+
+        workflow.append(pipe)
+
+    return workflow
+
+
+# ------------------------------------------------------------------------------
+#
+def wait_for(task, state):
+
+    while task.state not in state:
+        time.sleep(0.001)
+
+
+# ------------------------------------------------------------------------------
+#
+def enqueuer(wfp):
+
+    workload, scheduled_stages = wfp._create_workload()
+    wfp._execute_workload(workload, scheduled_stages)
+
+
+def synchronizer(amgr, workflow):
+
+    for pipe in workflow:
+        for task in pipe.stages[0].tasks:
+            wait_for(task, [states.SCHEDULING, states.SCHEDULED])
+            amgr._apply_task_update({'uid': task.uid,
+                                     'state': states.SUBMITTING})
+            amgr._apply_task_update({'uid': task.uid,
+                                     'state': states.COMPLETED})
+
+
+def dequeuer(wfp, workflow):
+
+    for pipe in workflow:
+        for task in pipe.stages[0].tasks:
+            wait_for(task, [states.COMPLETED])
+            deq_task = Task()
+            deq_task._uid       = task.uid
+            deq_task._exit_code = 0
+            wfp._update_dequeued_task(deq_task)
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_pipelines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_tasks     = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    os.chdir(tempfile.mkdtemp())
+
+    workflow = build(n_pipelines, n_tasks)
+
+    sid = ru.generate_id('re.session', ru.ID_PRIVATE)
+    wfp = WFprocessor(sid=sid,
+                      workflow=workflow,
+                      pending_queue=['pendingq-1'],
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=LocalConnectionParameters(),
+                      resubmit_failed=False)
+    wfp.initialize_workflow()
+
+    # the synchronizer only needs the workflow processor and a logger
+    amgr = AppManager.__new__(AppManager)
+    amgr._wfp    = wfp
+    amgr._logger = wfp._logger
+
+    threads = [threading.Thread(target=enqueuer, name='enqueuer',
+                                args=(wfp,)),
+               threading.Thread(target=synchronizer, name='synchronizer',
+                                args=(amgr, workflow)),
+               threading.Thread(target=dequeuer, name='dequeuer',
+                                args=(wfp, workflow))]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+    stop = time.time()
+
+    assert not wfp.workflow_incomplete()
+
+    print('tasks      : %d in %d pipelines' % (n_pipelines * n_tasks,
+                                               n_pipelines))
+    print('total      : %.1f s' % (stop - start))
+    for thread in threads:
+        print('%-12s held %6.1f s, waited %6.1f s'
+              % (thread.name, TimedLock.held.get(thread.name, 0.0),
+                              TimedLock.waited.get(thread.name, 0.0)))
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+'''
+Benchmark for the creation of large ensembles: compares adding (by default)
+100k tasks which only differ in their arguments one by one via
+`Stage.add_tasks()` with `Stage.add_task_array()` (eager and lazy).
+
+usage: bench_stage_task_array.py [n_tasks]
+'''
+
+import sys
+import time
+
+from radical.entk import Stage, Task
+
+
+# ------------------------------------------------------------------------------
+#
+def describe(task):
+
+    task.executable      = '/bin/sleep'
+    task.pre_exec        = ['module load python']
+    task.cpu_reqs        = {'processes'           : 1,
+                            'process_type'        : None,
+                            'threads_per_process' : 1,
+                            'thread_type'         : None}
+    task.copy_input_data = ['$SHARED/input.dat']
+
+    return task
+
+
+# ------------------------------------------------------------------------------
+#
+def add_tasks(n_tasks):
+
+    stage = Stage()
+    tasks = list()
+
+    for i in range(n_tasks):
+        task = describe(Task())
+        task.arguments = ['%d' % i]
+        tasks.append(task)
+
+    stage.add_tasks(tasks)
+
+    return stage
+
+
+# ------------------------------------------------------------------------------
+#
+def add_task_array(n_tasks, lazy):
+
+    stage = Stage()
+    stage.add_task_array(describe(Task()),
+                         arguments=[['%d' % i] for i in range(n_tasks)],
+                         lazy=lazy)
+
+    return stage
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for name, func in [('add_tasks',             lambda: add_tasks(n_tasks)),
+                       ('add_task_array',        lambda: add_task_array(n_tasks,
+                                                                        False)),
+                       ('add_task_array (lazy)', lambda: add_task_array(n_tasks,
+                                                                        True))]:
+        start  = time.time()
+        stage  = func()
+        added  = time.time() - start
+        tasks  = stage.tasks
+        total  = time.time() - start
+
+        assert len(tasks) == n_tasks
+
+        print('%-22s: add %6.3f s, incl. materialization %6.3f s'
+              % (name, added, total))
+
+
+# ------------------------------------------------------------------------------
+
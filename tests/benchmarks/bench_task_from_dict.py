@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+'''
+Microbenchmark for the deserialization of tasks as done by the task manager
+(full task descriptions) and the WFprocessor (state deltas): compares the
+validating `Task.from_dict()` with the trusted `from_dict(validate=False)`.
+
+usage: bench_task_from_dict.py [n_tasks] [serializer]
+'''
+
+import sys
+import time
+
+from radical.entk       import Task, states
+from radical.entk.utils import serializer
+
+
+# ------------------------------------------------------------------------------
+#
+def make_task(i):
+
+    t = Task()
+    t._uid            = 'task.%04d' % i
+    t.name            = 't%d' % i
+    t.executable      = '/bin/sleep'
+    t.arguments       = ['1']
+    t.pre_exec        = ['module load python']
+    t.cpu_reqs        = {'processes'           : 1,
+                         'process_type'        : None,
+                         'threads_per_process' : 1,
+                         'thread_type'         : None}
+    t.copy_input_data = ['$SHARED/input.dat']
+    t.parent_stage    = {'uid': 'stage.0000', 'name': 's0'}
+    t.parent_pipeline = {'uid': 'pipeline.0000', 'name': 'p0'}
+    t.state           = states.SCHEDULING
+
+    return t
+
+
+# ------------------------------------------------------------------------------
+#
+def bench(msgs, validate):
+
+    start = time.time()
+    for msg in msgs:
+        task = Task()
+        task.from_dict(serializer.loads(msg), validate=validate)
+
+    return (time.time() - start) / len(msgs) * 1e6
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    ser     =     sys.argv[2]  if len(sys.argv) > 2 else 'json'
+
+    tasks   = [make_task(i) for i in range(n_tasks)]
+    full    = [serializer.dumps(t.to_dict(),   ser) for t in tasks]
+    delta   = [serializer.dumps(t._to_delta(), ser) for t in tasks]
+
+    # the first round warms up caches and the allocator
+    for msgs, name in [(full, 'full'), (delta, 'delta')]:
+        bench(msgs, True)
+        print('%-5s  validate: %6.2f us/task  trusted: %6.2f us/task'
+              % (name, bench(msgs, True), bench(msgs, False)))
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+'''
+Memory benchmark: build a workflow of (by default) one million tasks, as an
+application would before handing it to the AppManager, and report the memory
+used per task.  Tasks get an executable and arguments only, the staging lists,
+requirements and parent dicts are left at their defaults.
+
+usage: bench_task_memory.py [n_tasks] [n_stages]
+'''
+
+import sys
+import time
+import tracemalloc
+
+from radical.entk import Pipeline, Stage, Task
+
+
+# ------------------------------------------------------------------------------
+#
+def build(n_tasks, n_stages):
+
+    pipe = Pipeline()
+
+    for _ in range(n_stages):
+
+        stage = Stage()
+        tasks = list()
+
+        for i in range(n_tasks // n_stages):
+            t = Task()
+            t.executable = '/bin/sleep'
+            t.arguments  = ['%d' % i]
+            tasks.append(t)
+
+        stage.add_tasks(set(tasks))
+        pipe.add_stages(stage)
+
+    return pipe
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_tasks  = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n_stages = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    tracemalloc.start()
+
+    start = time.time()
+    pipe  = build(n_tasks, n_stages)
+    stop  = time.time()
+
+    used, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('tasks    : %d in %d stages'  % (n_tasks, n_stages))
+    print('build    : %.1f s'            % (stop - start))
+    print('memory   : %.1f MB (peak %.1f MB)' % (used / 1e6, peak / 1e6))
+    print('per task : %d bytes'          % (used / n_tasks))
+
+
+# ------------------------------------------------------------------------------
+
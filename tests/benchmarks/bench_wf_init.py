@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+'''
+Benchmark for the workflow initialization of the WFprocessor (uid assignment
+and registration of all pipelines, stages and tasks): reports the time between
+the `wf_init_start` and `wf_init_stop` events in the WFprocessor's profile, and
+the time until the first workload is ready for submission.  With `lazy` set,
+stages are only initialized once they become current (`lazy_init`).
+
+usage: bench_wf_init.py [n_pipelines] [n_stages] [n_tasks] [lazy]
+'''
+
+import os
+import sys
+import glob
+import time
+import tempfile
+
+os.environ['RADICAL_PROFILE'] = 'True'
+
+import radical.utils as ru
+
+from radical.entk                    import Pipeline, Stage, Task
+from radical.entk.appman.wfprocessor import WFprocessor
+from radical.entk.execman.transport  import LocalConnectionParameters
+
+
+# ------------------------------------------------------------------------------
+#
+def build(n_pipelines, n_stages, n_tasks):
+
+    workflow = set()
+    for _ in range(n_pipelines):
+
+        pipe = Pipeline()
+        for _ in range(n_stages):
+
+            stage = Stage()
+            for _ in range(n_tasks):
+                task = Task()
+                task.executable = '/bin/date'
+                stage.add_tasks(task)
+
+            pipe.add_stages(stage)
+
+        workflow.add(pipe)
+
+    return workflow
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    n_pipelines = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    n_stages    = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    n_tasks     = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    lazy        =     sys.argv[4]  == 'lazy' if len(sys.argv) > 4 else False
+
+    os.chdir(tempfile.mkdtemp())
+
+    sid = ru.generate_id('re.session', ru.ID_PRIVATE)
+    wfp = WFprocessor(sid=sid,
+                      workflow=build(n_pipelines, n_stages, n_tasks),
+                      pending_queue=['pendingq-1'],
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=LocalConnectionParameters(),
+                      resubmit_failed=False,
+                      lazy_init=lazy)
+
+    start = time.time()
+    wfp.initialize_workflow()
+    workload, _ = wfp._create_workload()
+    first = time.time() - start
+
+    wfp._prof.close()
+
+    ts = dict()
+    for fname in glob.glob('%s/%s/*.prof' % (os.getcwd(), sid)):
+        with open(fname) as fin:
+            for line in fin:
+                elems = line.split(',')
+                if len(elems) > 1 and elems[1] in ['wf_init_start',
+                                                   'wf_init_stop']:
+                    ts[elems[1]] = float(elems[0])
+
+    n_entities = n_pipelines * n_stages * (n_tasks + 1) + n_pipelines
+    duration   = ts['wf_init_stop'] - ts['wf_init_start']
+
+    print('entities      : %d (lazy: %s)' % (n_entities, lazy))
+    print('wf_init       : %.3f s' % duration)
+    print('per entity    : %.1f us' % (duration / n_entities * 1e6))
+    print('first workload: %.3f s (%d tasks)' % (first, len(workload)))
+
+
+# ------------------------------------------------------------------------------
+
@@ -15,6 +15,8 @@ from radical.entk.exceptions   import MissingError, EnTKError
 from radical.entk              import Pipeline, Stage, Task, states
 
 from radical.entk              import AppManager           as Amgr
+from radical.entk.appman.wfprocessor import WFprocessor
+from radical.entk              import appman               as rea
 from radical.entk.execman.base import Base_TaskManager     as BaseTmgr
 from radical.entk.execman.base import Base_ResourceManager as BaseRmgr
 
@@ -138,6 +140,16 @@ def test_amgr_read_config():
     assert amgr._num_completed_qs == 1
     assert amgr._rts_config       == {"sandbox_cleanup": False,
                                       "db_cleanup"     : False}
+    assert amgr._rmq_consumer     == 'poll'
+    assert amgr._rmq_prefetch     == 64
+    assert amgr._transport        == 'rabbitmq'
+    assert amgr._serializer       == 'json'
+    assert amgr._submit_chunk     == 1024
+    assert amgr._cud_workers      == 0
+    assert amgr._evict_ph         is True
+    assert amgr._lazy_init        is False
+    assert amgr._state_history_limit is None
+    assert amgr._report_mode      == 'transitions'
 
     d = {"hostname"       : "radical.two",
          "port"           : 25672,
@@ -152,7 +164,15 @@ def test_amgr_read_config():
                              "db_cleanup"     : True},
          "pending_qs"     : 2,
          "completed_qs"   : 3,
-         "rmq_cleanup"    : False}
+         "rmq_cleanup"    : False,
+         "rmq_consumer"   : "push",
+         "rmq_prefetch"   : 16,
+         "submit_chunk"   : 0,
+         "cud_workers"    : 4,
+         "evict_placeholders": False,
+         "lazy_init"      : True,
+         "state_history_limit": 10,
+         "report_mode"    : "progress"}
 
     ru.write_json(d, './config.json')
     amgr._read_config(config_path='./',
@@ -179,6 +199,14 @@ def test_amgr_read_config():
     assert amgr._num_pending_qs   == d['pending_qs']
     assert amgr._num_completed_qs == d['completed_qs']
     assert amgr._rmq_cleanup      == d['rmq_cleanup']
+    assert amgr._rmq_consumer     == d['rmq_consumer']
+    assert amgr._rmq_prefetch     == d['rmq_prefetch']
+    assert amgr._submit_chunk     == d['submit_chunk']
+    assert amgr._cud_workers      == d['cud_workers']
+    assert amgr._evict_ph         == d['evict_placeholders']
+    assert amgr._lazy_init        == d['lazy_init']
+    assert amgr._state_history_limit == d['state_history_limit']
+    assert amgr._report_mode      == d['report_mode']
 
     os.remove('./config.json')
 
@@ -287,6 +315,42 @@ def test_amgr_run_mock():
     appman.run()
 
 
+# ------------------------------------------------------------------------------
+#
+def test_amgr_run_mock_local():
+
+    p = Pipeline()
+    s = Stage()
+    t = Task()
+
+    t.name       = 'simulation'
+    t.executable = '/bin/date'
+    s.tasks      = t
+    p.add_stages(s)
+
+    res_dict = {'resource': 'local.localhost',
+                'walltime': 5,
+                'cpus'    : 1,
+                'project' : ''}
+
+    # no RabbitMQ needed
+    config = ru.read_json('%s/config.json'
+                          % os.path.dirname(os.path.abspath(rea.__file__)))
+    config['transport']    = 'local'
+    config['rmq_consumer'] = 'push'
+    ru.write_json(config, './config.json')
+
+    appman = Amgr(config_path='./', rts="mock")
+    os.remove('./config.json')
+
+    appman.resource_desc = res_dict
+
+    appman.workflow = [p]
+    appman.run()
+
+    assert p.state == states.DONE
+
+
 # ------------------------------------------------------------------------------
 #
 def test_amgr_resource_terminate():
@@ -446,6 +510,14 @@ def test_amgr_synchronizer():
     amgr._rmgr         = rmgr
     rmgr._task_manager = tmgr
 
+    # the synchronizer looks up tasks in the uid map of the WFprocessor
+    amgr._wfp = WFprocessor(sid=amgr._sid,
+                            workflow=amgr.workflow,
+                            pending_queue=amgr._pending_queue,
+                            completed_queue=amgr._completed_queue,
+                            resubmit_failed=False,
+                            rmq_conn_params=amgr._rmq_conn_params)
+
     for t in p.stages[0].tasks:
         assert t.state == states.INITIAL
 
@@ -502,6 +574,52 @@ def test_sid_in_mqs():
             raise EnTKError(ex)
 
 
+# ------------------------------------------------------------------------------
+#
+def test_amgr_task_update_ack():
+    '''
+    **Purpose**: Test that single task updates are replied to and acknowledged
+                 even if they are ignored
+    '''
+
+    class Channel(object):
+
+        def __init__(self):
+            self.published = list()
+            self.acked     = list()
+
+        def basic_publish(self, exchange, routing_key, body, properties=None):
+            self.published.append((routing_key, body,
+                                   properties.correlation_id))
+
+        def basic_ack(self, delivery_tag):
+            self.acked.append(delivery_tag)
+
+    class MethodFrame(object):
+        delivery_tag = 42
+
+    class WFP(object):
+        def _lookup(self, uid):
+            return None, None, None
+
+    class Quiet(object):
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    amgr = Amgr.__new__(Amgr)
+    amgr._wfp         = WFP()
+    amgr._logger      = Quiet()
+    amgr._prof        = Quiet()
+    amgr._report_mode = 'transitions'
+
+    channel = Channel()
+    amgr._task_update({'object': {'uid': 'task.0000', 'state': states.DONE}},
+                      'reply-q', 'corr.1', channel, MethodFrame())
+
+    assert channel.published == [('reply-q', 'task.0000-ack', 'corr.1')]
+    assert channel.acked     == [42]
+
+
 # ------------------------------------------------------------------------------
 #
 def test_state_order():
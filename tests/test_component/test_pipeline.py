@@ -266,7 +266,7 @@ def test_pipeline_assign_uid():
         import shutil
         import os
         home = os.environ.get('HOME','/home')
-        test_fold = glob.glob('%s/.radical/utils/test*'%home)
+        test_fold = glob.glob('%s/.radical/entk/ids/test*'%home)
         for f in test_fold:
             shutil.rmtree(f)
     except:
@@ -0,0 +1,131 @@
+import os
+import pickle
+import pytest
+import tempfile
+
+from radical.entk.exceptions            import EnTKError
+from radical.entk.execman.placeholders import Placeholders
+
+
+# ------------------------------------------------------------------------------
+#
+def test_placeholders_index():
+
+    ph = Placeholders.from_dict({'p1': {'s1': {'t1': {'path'   : '/p1/t1',
+                                                      'rts_uid': 'unit.0001'},
+                                               't2': {'path'   : '/p1/t2',
+                                                      'rts_uid': 'unit.0002'}}},
+                                 'p2': {'s1': {'t1': {'path'   : '/p2/t1',
+                                                      'rts_uid': 'unit.0003'}}}})
+    assert len(ph) == 3
+    assert 'p1' in ph
+
+    assert ph.get('p1', 's1', 't2')['path'] == '/p1/t2'
+    assert ph.get('p1', 's2', 't2') is None
+
+    # tasks of the given pipeline take precedence
+    assert ph.find('t1', 'p2')['rts_uid'] == 'unit.0003'
+    assert ph.find('t1', 'p1')['rts_uid'] == 'unit.0001'
+    assert ph.find('t2', 'p2')['rts_uid'] == 'unit.0002'
+    assert ph.find('t3', 'p1') is None
+
+    ph.add('p2', 's2', 't3', {'path': '/p2/t3', 'rts_uid': 'unit.0004'})
+    assert len(ph) == 4
+
+    # eviction removes all entries of a pipeline
+    ph.evict('p1')
+    assert len(ph) == 2
+    assert 'p1' not in ph
+    assert ph.get('p1', 's1', 't1') is None
+    assert ph.find('t1', 'p1')['rts_uid'] == 'unit.0003'
+    assert ph.find('t2', 'p2') is None
+
+    ph.evict('p1')
+    ph.evict('p2')
+    assert len(ph) == 0
+    assert ph.find('t1', 'p2') is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_placeholders_spill():
+
+    spill_dir = tempfile.mkdtemp() + '/placeholders'
+
+    ph = Placeholders(spill_dir=spill_dir)
+    ph.add('p1', 's1', 't1', {'path': '/p1/t1', 'rts_uid': 'unit.0001'})
+    ph.add('p1', 's2', 't2', {'path': '/p1/t2', 'rts_uid': 'unit.0002'})
+    ph.add('p2', 's1', 't1', {'path': '/p2/t1', 'rts_uid': 'unit.0003'})
+
+    # evicted entries are moved to disk, but are still found
+    ph.evict('p1')
+    assert len(ph)     == 1
+    assert ph.spilled  == 1
+    assert 'p1' in ph
+    assert len(os.listdir(spill_dir)) == 1
+
+    assert ph.get('p1', 's2', 't2')['path'] == '/p1/t2'
+    assert ph.get('p1', 's1', 't2') is None
+    assert ph.find('t2', 'p2')['rts_uid']   == 'unit.0002'
+    assert ph.find('t1', 'p2')['rts_uid']   == 'unit.0003'
+    assert ph.find('t1', 'p1')['rts_uid']   == 'unit.0001'
+
+    # a later pipeline of the same name is merged into the same file
+    ph.add('p1', 's3', 't3', {'path': '/p1/t3', 'rts_uid': 'unit.0004'})
+    ph.evict('p1')
+    assert ph.spilled == 1
+    assert ph.get('p1', 's3', 't3')['rts_uid'] == 'unit.0004'
+    assert ph.get('p1', 's1', 't1')['rts_uid'] == 'unit.0001'
+
+    # copies (as sent to the CUD workers) read the same spill files
+    copy = pickle.loads(pickle.dumps(ph))
+    assert copy.get('p1', 's2', 't2')['path'] == '/p1/t2'
+    assert copy.find('t1', 'p2')['path']      == '/p2/t1'
+
+    ph.close()
+    assert ph.spilled == 0
+    assert not os.path.exists(spill_dir)
+    assert ph.get('p1', 's2', 't2') is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_placeholders_journal():
+
+    spill_dir = tempfile.mkdtemp() + '/placeholders'
+
+    ph = Placeholders(spill_dir=spill_dir, journal=True)
+    ph.add('p1', 's1', 't1', {'path': '/p1/t1', 'rts_uid': 'unit.0001'})
+
+    # copies are replicas which are up to date
+    replica = pickle.loads(pickle.dumps(ph))
+    assert replica.get('p1', 's1', 't1')['path'] == '/p1/t1'
+    assert replica.apply(0, ph.changes(0)) == 1
+
+    ph.add('p2', 's1', 't1', {'path': '/p2/t1', 'rts_uid': 'unit.0002'})
+    ph.evict('p1')
+
+    other = Placeholders()
+    assert other.apply(0, ph.changes(0))   == 3
+    assert replica.apply(0, ph.changes(0)) == 3
+    assert replica.apply(0, ph.changes(0)) == 3
+
+    for index in [replica, other]:
+        assert len(index)     == 1
+        assert index.spilled  == 1
+        assert index.get('p1', 's1', 't1')['path'] == '/p1/t1'
+        assert index.find('t1', 'p2')['path']      == '/p2/t1'
+
+    # changes known to all replicas are dropped
+    ph.trim(3)
+    ph.add('p3', 's1', 't1', {'path': '/p3/t1', 'rts_uid': 'unit.0003'})
+    assert len(ph.changes(3)) == 1
+    assert other.apply(3, ph.changes(3)) == 4
+
+    with pytest.raises(EnTKError):
+        Placeholders().apply(3, ph.changes(3))
+
+    ph.close()
+
+
+# ------------------------------------------------------------------------------
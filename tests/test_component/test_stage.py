@@ -181,6 +181,68 @@ def test_stage_task_addition():
     assert t2 in s.tasks
 
 
+# ------------------------------------------------------------------------------
+#
+def test_stage_task_array_addition():
+
+    t = Task()
+    t.name            = 'sleep'
+    t.executable      = '/bin/sleep'
+    t.copy_input_data = ['in.dat']
+    t.cpu_reqs        = {'processes'           : 2,
+                         'process_type'        : None,
+                         'threads_per_process' : 1,
+                         'thread_type'         : None}
+
+    s = Stage()
+    s.add_task_array(t, arguments=[['1'], ['2'], ['3']])
+
+    # the template is copied
+    t.executable = '/bin/date'
+
+    assert s._task_count == 3
+    assert t not in s.tasks
+    assert sorted([task.arguments for task in s.tasks]) == [['1'], ['2'], ['3']]
+
+    for task in s.tasks:
+        assert task.uid                  is None
+        assert task.name                 == ''
+        assert task.state                == states.INITIAL
+        assert task.executable           == '/bin/sleep'
+        assert task.copy_input_data      == ['in.dat']
+        assert task.cpu_reqs['processes'] == 2
+        assert task._link_input_data     is None
+
+    # containers are not shared between tasks
+    t1, t2, _ = s.tasks
+    assert t1.copy_input_data is not t2.copy_input_data
+    assert t1.cpu_reqs        is not t2.cpu_reqs
+
+    # lazy arrays are only materialized on access
+    s = Stage()
+    s.add_task_array(t, arguments=[['1'], ['2']], lazy=True)
+    s._validate()
+
+    assert s._task_count == 2
+    assert not s._tasks
+
+    assert len(s.tasks) == 2
+    assert not s._task_arrays
+    assert set([task.executable for task in s.tasks]) == set(['/bin/date'])
+
+    with pytest.raises(TypeError):
+        s.add_task_array('task', arguments=[['1']])
+
+    with pytest.raises(TypeError):
+        s.add_task_array(t, arguments=['1'])
+
+    with pytest.raises(MissingError):
+        s.add_task_array(t, arguments=[])
+
+    with pytest.raises(MissingError):
+        s.add_task_array(Task(), arguments=[['1']])
+
+
 # ------------------------------------------------------------------------------
 #
 def test_stage_to_dict():
@@ -252,6 +314,49 @@ def test_stage_check_complete():
     assert s._check_stage_complete() == True
 
 
+# ------------------------------------------------------------------------------
+#
+def test_stage_progress():
+
+    s = Stage()
+    t1 = Task()
+    t1.executable = '/bin/date'
+    t2 = Task()
+    t2.executable = '/bin/date'
+    t2.state = states.DONE
+    s.add_tasks([t1, t2])
+
+    # tasks are counted in the state they are added in, but only once
+    s.add_tasks(t2)
+    assert s.progress == {'total': 2, 'pending': 1, 'done': 1, 'failed': 0}
+
+    t = Task()
+    t.executable = '/bin/date'
+    s.add_task_array(t, arguments=[['1'], ['2']], lazy=True)
+    assert s.progress == {'total': 4, 'pending': 3, 'done': 1, 'failed': 0}
+
+    for task in s.tasks:
+        if task not in [t1, t2]:
+            task.state = states.SCHEDULING
+            task.state = states.FAILED
+
+    assert s.progress == {'total': 4, 'pending': 1, 'done': 1, 'failed': 2}
+    assert not s._check_stage_complete()
+
+    t1.state = states.DONE
+    assert s.progress == {'total': 4, 'pending': 0, 'done': 2, 'failed': 2}
+    assert s._check_stage_complete()
+
+    # resubmission of a failed task
+    t1.state = states.INITIAL
+    assert s.progress == {'total': 4, 'pending': 1, 'done': 1, 'failed': 2}
+    assert not s._check_stage_complete()
+
+    # replacing the tasks resets the counts
+    s.tasks = [t1, t2]
+    assert s.progress == {'total': 2, 'pending': 1, 'done': 1, 'failed': 0}
+
+
 # ------------------------------------------------------------------------------
 #
 @given(t=st.text(),
@@ -301,7 +406,7 @@ def test_stage_assign_uid():
         import shutil
         import os
         home = os.environ.get('HOME','/home')
-        test_fold = glob.glob('%s/.radical/utils/test*'%home)
+        test_fold = glob.glob('%s/.radical/entk/ids/test*'%home)
         for f in test_fold:
             shutil.rmtree(f)
     except:
@@ -309,6 +414,30 @@ def test_stage_assign_uid():
     s._assign_uid('test')
     assert s.uid == 'stage.0000'
 
+    # lazy task arrays are not created when uids are assigned, but their uids
+    # are allocated along with those of the other tasks
+    t = Task()
+    t.executable = '/bin/date'
+
+    s = Stage()
+    s.name = 's1'
+    s.parent_pipeline['uid'] = 'p'
+    s.add_tasks(t)
+    s.add_task_array(t, arguments=[['1'], ['2']], lazy=True)
+    s._assign_uid('test', 'stage.0001')
+
+    assert s._task_arrays
+    assert len(s._tasks) == 1
+    assert t.uid == 'task.0000'
+
+    assert len(s.tasks) == 3
+    assert sorted([task.uid for task in s.tasks]) == \
+           ['task.0000', 'task.0001', 'task.0002']
+
+    for task in s.tasks:
+        assert task.parent_stage    == {'uid': 'stage.0001', 'name': 's1'}
+        assert task.parent_pipeline == {'uid': 'p', 'name': None}
+
 
 # ------------------------------------------------------------------------------
 #
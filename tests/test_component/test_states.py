@@ -84,3 +84,30 @@ def test_task_states():
         7: states.COMPLETED,
         10: [states.DONE, states.FAILED, states.CANCELED]
     }
+
+
+def test_state_codes():
+
+    assert len(set(states._state_codes.values())) == len(states.state_numbers)
+
+    for state, code in states._state_codes.items():
+        assert states._code_states[code] == state
+
+    # states are interned: equal strings map to the state constants
+    value = ''.join(['DO', 'NE'])
+    assert value is not states.DONE
+    assert states._task_states[value] is states.DONE
+    assert 'SUSPENDED' not in states._task_states
+
+
+def test_state_transitions():
+
+    assert states._task_transitions[states.INITIAL] == frozenset(
+                [states.SCHEDULING, states.SCHEDULED, states.SUBMITTING,
+                 states.COMPLETED, states.DONE, states.FAILED,
+                 states.CANCELED])
+    assert states._task_transitions[states.COMPLETED] == frozenset(
+                [states.DONE, states.FAILED, states.CANCELED])
+    assert states._task_transitions[states.FAILED] == frozenset(
+                [states.INITIAL, states.SCHEDULING])
+    assert not states._task_transitions[states.DONE]
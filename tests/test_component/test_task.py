@@ -414,6 +414,122 @@ def test_task_from_dict():
     assert t.executable == d['executable']
 
 
+# ------------------------------------------------------------------------------
+#
+def test_task_from_dict_trusted():
+    '''
+    **Purpose**: Test that 'from_dict' without validation creates the same Task
+                 as the validating version, and skips the setter checks
+    '''
+
+    t = Task()
+    t._uid       = 'task.0000'
+    t.name       = 't1'
+    t.executable = '/bin/date'
+    t.arguments  = ['-u']
+    t.cpu_reqs   = {'processes'           : 4,
+                    'process_type'        : 'MPI',
+                    'threads_per_process' : 2,
+                    'thread_type'         : 'OpenMP'}
+    t.parent_stage    = {'uid': 's1', 'name': 'stage1'}
+    t.parent_pipeline = {'uid': 'p1', 'name': 'pipe1'}
+    t.state      = states.SCHEDULED
+
+    t1 = Task()
+    t1.from_dict(t.to_dict())
+
+    t2 = Task()
+    t2.from_dict(t.to_dict(), validate=False)
+
+    assert t2.to_dict() == t1.to_dict()
+    assert t2.luid      == t1.luid
+
+    # deltas apply as well, `None` values are ignored
+    t.state = states.COMPLETED
+    t.path  = '/tmp/task.0000'
+    t2.from_dict(t._to_delta(), validate=False)
+
+    assert t2.state     == states.COMPLETED
+    assert t2.path      == '/tmp/task.0000'
+    assert t2.exit_code is None
+
+    # no validation takes place
+    t3 = Task()
+    t3.from_dict({'uid': 'task.0001', 'state': 'invalid'}, validate=False)
+    assert t3.state == 'invalid'
+
+    with pytest.raises(ree.ValueError):
+        Task().from_dict({'state_history': ['invalid']})
+
+
+# ------------------------------------------------------------------------------
+#
+def test_task_lazy_attributes():
+    '''
+    **Purpose**: Test that containers are only allocated on first access, and
+                 that in-place changes to them are retained
+    '''
+
+    t = Task()
+
+    assert not hasattr(t, '__dict__')
+    assert t._copy_input_data is None
+    assert t._p_stage         is None
+    assert t._cpu_reqs        is None
+
+    # `to_dict` does not allocate
+    d = t.to_dict()
+    assert d['copy_input_data'] == list()
+    assert d['parent_stage']    == {'uid': None, 'name': None}
+    assert d['cpu_reqs']        == Task._default_cpu_reqs
+    assert t._copy_input_data is None
+    assert t._p_stage         is None
+    assert t._cpu_reqs        is None
+
+    t.copy_input_data.append('in.dat')
+    t.parent_stage['uid']      = 'stage.0000'
+    t.cpu_reqs['processes']    = 4
+
+    assert t.copy_input_data    == ['in.dat']
+    assert t.parent_stage       == {'uid': 'stage.0000', 'name': None}
+    assert t.cpu_reqs['processes']         == 4
+    assert Task._default_cpu_reqs['processes'] == 1
+    assert Task().cpu_reqs['processes']    == 1
+
+    with pytest.raises(AttributeError):
+        t.no_such_attribute = 1
+
+
+# ------------------------------------------------------------------------------
+#
+def test_task_to_delta():
+
+    t = Task()
+    t._uid       = 'task.0000'
+    t.executable = '/bin/date'
+    t.state      = states.COMPLETED
+    t.exit_code  = 1
+    t.path       = '/tmp/task.0000'
+
+    d = t._to_delta()
+    assert d == {'uid'      : 'task.0000',
+                 'state'    : states.COMPLETED,
+                 'exit_code': 1,
+                 'path'     : '/tmp/task.0000'}
+
+    # a delta applies on top of the full description
+    t2 = Task()
+    t2.from_dict(t.to_dict())
+    t2.state = states.SCHEDULED
+    t2.from_dict(d)
+
+    assert t2.uid        == t.uid
+    assert t2.state      == states.COMPLETED
+    assert t2.exit_code  == 1
+    assert t2.path       == '/tmp/task.0000'
+    assert t2.executable == '/bin/date'
+
+
 # ------------------------------------------------------------------------------
 #
 def test_task_assign_uid():
@@ -421,7 +537,7 @@ def test_task_assign_uid():
     t = Task()
     try:
         home   = os.environ.get('HOME', '/home')
-        folder = glob.glob('%s/.radical/utils/test*' % home)
+        folder = glob.glob('%s/.radical/entk/ids/test*' % home)
 
         for f in folder:
             shutil.rmtree(f)
@@ -455,6 +571,9 @@ if __name__ == '__main__':
     test_dict_to_task()
     test_task_to_dict()
     test_task_from_dict()
+    test_task_from_dict_trusted()
+    test_task_lazy_attributes()
+    test_task_to_delta()
     test_task_assign_uid()
     test_task_validate()
 
@@ -21,6 +21,7 @@ from radical.entk.execman.rp   import TaskManager          as RPTmgr
 from radical.entk.execman.rp   import ResourceManager      as RPRmgr
 from radical.entk.execman.mock import TaskManager          as MockTmgr
 from radical.entk.execman.mock import ResourceManager      as MockRmgr
+from radical.entk.execman      import transport
 from radical.entk              import exceptions           as ree
 from radical.entk              import Task, states
 
@@ -63,6 +64,7 @@ def test_tmgr_base_initialization():
     assert tmgr._completed_queue == ['completed-1']
     assert tmgr._rmq_conn_params == rmq_conn_params
     assert tmgr._rts             is None
+    assert tmgr._submit_chunk    == 1024
 
     assert tmgr._log
     assert tmgr._prof
@@ -304,6 +306,31 @@ def test_tmgr_base_methods():
         tmgr.start_manager()
 
 
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_base_chunks():
+
+    rmq_conn_params = transport.LocalConnectionParameters()
+    sid  = 'test.0021'
+    rmgr = BaseRmgr({}, sid, None, {})
+    tmgr = BaseTmgr(sid=sid,
+                    pending_queue=['pending-1'],
+                    completed_queue=['completed-1'],
+                    rmgr=rmgr,
+                    rmq_conn_params=rmq_conn_params,
+                    rts=None,
+                    submit_chunk=4)
+
+    msgs = list(range(10))
+    assert list(tmgr._chunks(msgs)) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert list(tmgr._chunks([]))   == []
+
+    tmgr._submit_chunk = 0
+    assert list(tmgr._chunks(msgs)) == [msgs]
+
+    shutil.rmtree(sid, ignore_errors=True)
+
+
 # ------------------------------------------------------------------------------
 #
 def test_tmgr_mock_initialization():
@@ -89,4 +89,82 @@ def test_utils_sync_with_master():
 
 
 # ------------------------------------------------------------------------------
+#
+def func_bulk(objs, obj_type, new_state, queue1):
+
+    hostname = os.environ.get('RMQ_HOSTNAME', 'localhost')
+    port = int(os.environ.get('RMQ_PORT', 5672))
+
+    rmq_conn_params = pika.ConnectionParameters(host=hostname, port=port)
+
+    sid  = 'test.0013'
+    rmgr = BaseRmgr({}, sid, None, {})
+    tmgr = BaseTmgr(sid=sid,
+                    pending_queue=['pending-1'],
+                    completed_queue=['completed-1'],
+                    rmgr=rmgr,
+                    rmq_conn_params=rmq_conn_params,
+                    rts=None)
+
+    # force several batches with several of them in flight
+    tmgr._sync_batch  = 3
+    tmgr._sync_window = 2
+
+    mq_connection = pika.BlockingConnection(rmq_conn_params)
+    mq_channel = mq_connection.channel()
+
+    tmgr._advance_bulk(objs, obj_type, new_state, mq_channel, queue1)
+
+    mq_connection.close()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_utils_sync_with_master_bulk():
+
+    hostname = os.environ.get('RMQ_HOSTNAME', 'localhost')
+    port = int(os.environ.get('RMQ_PORT', 5672))
+
+    mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
+                                                      host=hostname, port=port))
+    mq_channel = mq_connection.channel()
+
+    queue1 = 'test-1-2-3'       # Expected queue name structure 'X-A-B-C'
+    queue2 = 'test-3-2-1'       # Expected queue name structure 'X-C-B-A'
+    mq_channel.queue_declare(queue=queue1)
+    mq_channel.queue_declare(queue=queue2)
+
+    objs    = [Task() for _ in range(10)]
+    thread1 = mt.Thread(target=func_bulk,
+                        args=(objs, 'Task', states.DONE, queue1))
+    thread1.start()
+
+    uids = list()
+    while len(uids) < len(objs):
+        method_frame, props, body = mq_channel.basic_get(queue=queue1)
+        if body:
 
+            msg = json.loads(body)
+            assert len(msg['objects']) <= 3
+            for obj in msg['objects']:
+                assert obj['state'] == states.DONE
+                uids.append(obj['uid'])
+
+            nprops = pika.BasicProperties(correlation_id=props.correlation_id)
+            mq_channel.basic_publish(exchange='',
+                                     routing_key=queue2,
+                                     properties=nprops,
+                                     body='ack')
+            mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+
+    thread1.join()
+
+    assert uids == [obj.uid for obj in objs]
+
+    mq_channel.queue_delete(queue=queue1)
+    mq_channel.queue_delete(queue=queue2)
+
+    mq_connection.close()
+
+
+# ------------------------------------------------------------------------------
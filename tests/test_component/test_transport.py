@@ -0,0 +1,155 @@
+import time
+import pika
+import threading
+
+import multiprocessing as mp
+
+from radical.entk.execman import transport
+
+
+# ------------------------------------------------------------------------------
+#
+def test_transport_connect():
+
+    params = transport.LocalConnectionParameters()
+    conn   = transport.connect(params)
+    chan   = conn.channel()
+
+    assert isinstance(params, pika.ConnectionParameters)
+    assert isinstance(conn,   transport.LocalConnection)
+    assert chan.connection is conn
+    assert chan.is_open
+
+    conn.close()
+
+    assert not conn.is_open
+    assert not chan.is_open
+
+
+# ------------------------------------------------------------------------------
+#
+def test_transport_local_publish_get():
+
+    params = transport.LocalConnectionParameters()
+    chan   = transport.connect(params).channel()
+
+    chan.queue_declare(queue='q-1')
+
+    # messages to undeclared queues are dropped
+    chan.basic_publish(exchange='', routing_key='q-2', body='lost')
+    assert chan.basic_get(queue='q-2') == (None, None, None)
+
+    props = pika.BasicProperties(correlation_id='c-1', reply_to='q-2')
+    chan.basic_publish(exchange='', routing_key='q-1', body='msg-1',
+                       properties=props)
+    chan.basic_publish(exchange='', routing_key='q-1', body='msg-2')
+
+    method_frame, props, body = chan.basic_get(queue='q-1')
+    assert body                 == b'msg-1'
+    assert props.correlation_id == 'c-1'
+    assert props.reply_to       == 'q-2'
+    chan.basic_ack(delivery_tag=method_frame.delivery_tag)
+
+    # deleting a queue purges it
+    chan.queue_delete(queue='q-1')
+    assert chan.basic_get(queue='q-1') == (None, None, None)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_transport_local_consume():
+
+    params = transport.LocalConnectionParameters()
+    conn   = transport.connect(params)
+    chan   = conn.channel()
+    recv   = list()
+
+    def on_msg(channel, method_frame, props, body):
+        recv.append(body)
+
+    chan.queue_declare(queue='q-1')
+    tag = chan.basic_consume(on_msg, queue='q-1')
+
+    for i in range(3):
+        chan.basic_publish(exchange='', routing_key='q-1', body='%d' % i)
+
+    start = time.time()
+    while len(recv) < 3 and time.time() - start < 10:
+        conn.process_data_events(time_limit=None)
+
+    assert recv == [b'0', b'1', b'2']
+
+    chan.basic_cancel(tag)
+    chan.basic_publish(exchange='', routing_key='q-1', body='3')
+    conn.process_data_events(time_limit=0.1)
+
+    assert len(recv) == 3
+
+
+# ------------------------------------------------------------------------------
+#
+def func_for_transport_test(params):
+
+    chan = transport.connect(params).channel()
+    chan.basic_publish(exchange='', routing_key='q-1', body='from child')
+
+
+# ------------------------------------------------------------------------------
+#
+def test_transport_local_processes():
+
+    params = transport.LocalConnectionParameters()
+    chan   = transport.connect(params).channel()
+
+    # queues need to exist before the other process is started
+    chan.queue_declare(queue='q-1')
+
+    proc = mp.Process(target=func_for_transport_test, args=(params,))
+    proc.start()
+    proc.join()
+
+    body = None
+    start = time.time()
+    while not body and time.time() - start < 10:
+        _, _, body = chan.basic_get(queue='q-1')
+
+    assert body == b'from child'
+
+
+# ------------------------------------------------------------------------------
+#
+def test_transport_local_purge_busy():
+
+    params = transport.LocalConnectionParameters()
+    chan   = transport.connect(params).channel()
+    chan.queue_declare(queue='q-1')
+
+    stop = threading.Event()
+
+    def publish():
+        pub = transport.connect(params).channel()
+        while not stop.is_set():
+            pub.basic_publish(exchange='', routing_key='q-1', body='msg')
+            time.sleep(0.001)
+
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+
+    try:
+        time.sleep(0.1)
+
+        # a steady publisher does not keep the purge going
+        start = time.time()
+        chan.queue_purge(queue='q-1')
+        assert time.time() - start < 1
+
+    finally:
+        stop.set()
+        publisher.join()
+
+    # all messages are purged once the publisher stopped
+    chan.queue_purge(queue='q-1')
+    assert chan.basic_get(queue='q-1') == (None, None, None)
+
+
+# ------------------------------------------------------------------------------
@@ -9,6 +9,8 @@ import threading as mt
 from radical.entk.appman.wfprocessor import WFprocessor
 from radical.entk                    import AppManager as Amgr
 from radical.entk                    import Pipeline, Stage, Task, states
+from radical.entk.execman            import transport
+from radical.entk.utils              import serializer
 
 
 hostname =     os.environ.get('RMQ_HOSTNAME', 'localhost')
@@ -87,6 +89,263 @@ def test_wfp_initialize_workflow():
         assert t.uid is not None
 
 
+# ------------------------------------------------------------------------------
+#
+def test_wfp_uid_map():
+
+    p = Pipeline()
+    s = Stage()
+    t = Task()
+
+    t.executable = '/bin/date'
+    s.add_tasks(t)
+    p.add_stages(s)
+    rmq_conn_params = pika.ConnectionParameters(host=hostname, port=port)
+
+    wfp = WFprocessor(sid='test',
+                      workflow=[p],
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      rmq_conn_params=rmq_conn_params,
+                      resubmit_failed=False)
+
+    wfp.initialize_workflow()
+
+    assert wfp._lookup(p.uid) == (p, None, None)
+    assert wfp._lookup(s.uid) == (p, s,    None)
+    assert wfp._lookup(t.uid) == (p, s,    t)
+    assert wfp._lookup('foo') == (None, None, None)
+
+    # stages and tasks added at runtime are registered once they get scheduled
+    t2 = Task()
+    t2.executable = '/bin/date'
+    s.add_tasks(t2)
+
+    s2 = Stage()
+    t3 = Task()
+    t3.executable = '/bin/date'
+    s2.add_tasks(t3)
+    p.add_stages(s2)
+
+    wfp._create_workload()
+    assert wfp._lookup(t2.uid) == (p, s, t2)
+
+    for task in s.tasks:
+        task.exit_code = 0
+        wfp._update_dequeued_task(task)
+
+    assert s.state == states.DONE
+    assert p.current_stage == 2
+
+    wfp._create_workload()
+    assert wfp._lookup(s2.uid) == (p, s2, None)
+    assert wfp._lookup(t3.uid) == (p, s2, t3)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_lazy_task_array():
+
+    p = Pipeline()
+    s = Stage()
+    t = Task()
+
+    t.executable = '/bin/date'
+    s.add_task_array(t, arguments=[['1'], ['2']], lazy=True)
+    p.add_stages(s)
+    rmq_conn_params = pika.ConnectionParameters(host=hostname, port=port)
+
+    wfp = WFprocessor(sid='test',
+                      workflow=[p],
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      rmq_conn_params=rmq_conn_params,
+                      resubmit_failed=False)
+
+    # the array tasks are only created once the stage gets scheduled
+    wfp.initialize_workflow()
+    assert s._task_arrays
+
+    wfp._create_workload()
+    assert not s._task_arrays
+
+    for task in s.tasks:
+        assert task.uid is not None
+        assert task.state == states.SCHEDULING
+        assert wfp._lookup(task.uid) == (p, s, task)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_state_history_limit():
+
+    rmq_conn_params = pika.ConnectionParameters(host=hostname, port=port)
+    pipes           = list()
+
+    for limit in [3, None]:
+
+        p = Pipeline()
+        s = Stage()
+        t = Task()
+
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+        p.add_stages(s)
+        pipes.append(p)
+
+        wfp = WFprocessor(sid='test',
+                          workflow=[p],
+                          pending_queue=list(),
+                          completed_queue=list(),
+                          rmq_conn_params=rmq_conn_params,
+                          resubmit_failed=True,
+                          state_history_limit=limit)
+        wfp.initialize_workflow()
+
+        # tasks added at runtime get the limit once they get scheduled
+        t2 = Task()
+        t2.executable = '/bin/date'
+        s.add_tasks(t2)
+        wfp._create_workload()
+
+        for _ in range(3):
+            for task in s.tasks:
+                task.state = states.FAILED
+                task.exit_code = 1
+                wfp._update_dequeued_task(task)
+
+    # the limit only applies to the entities of the limited workflow
+    for task in pipes[0].stages[0].tasks:
+        assert task.state_history == [states.INITIAL, states.FAILED,
+                                      states.INITIAL]
+        assert task._state_history.limit == 3
+
+    assert pipes[0].stages[0]._state_history.limit == 3
+    assert pipes[0]._state_history.limit           == 3
+
+    for task in pipes[1].stages[0].tasks:
+        assert len(task.state_history) > 3
+        assert task._state_history.limit is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_wakeup():
+
+    p = Pipeline()
+    s = Stage()
+    t = Task()
+
+    t.executable = '/bin/date'
+    s.add_tasks(t)
+    p.add_stages(s)
+    rmq_conn_params = pika.ConnectionParameters(host=hostname, port=port)
+
+    wfp = WFprocessor(sid='test',
+                      workflow=[p],
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      rmq_conn_params=rmq_conn_params,
+                      resubmit_failed=False)
+
+    wfp.initialize_workflow()
+    assert wfp._wakeup.is_set()
+    wfp._wakeup.clear()
+
+    # adding work to a registered pipeline or stage wakes up the enqueuer
+    t2 = Task()
+    t2.executable = '/bin/date'
+    s.add_tasks(t2)
+    assert wfp._wakeup.is_set()
+    wfp._wakeup.clear()
+
+    s2 = Stage()
+    s2.add_tasks(Task())
+    p.add_stages(s2)
+    assert wfp._wakeup.is_set()
+    wfp._wakeup.clear()
+
+    p.suspend()
+    assert not wfp._wakeup.is_set()
+    p.resume()
+    assert wfp._wakeup.is_set()
+    wfp._wakeup.clear()
+
+    # so does the completion of a stage
+    wfp._create_workload()
+    for task in s.tasks:
+        task.exit_code = 0
+        wfp._update_dequeued_task(task)
+
+    assert s.state == states.DONE
+    assert wfp._wakeup.is_set()
+    assert p.uid in wfp._stage_done_ts
+
+    wfp._create_workload()
+    assert p.uid not in wfp._stage_done_ts
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_ready_frontier():
+
+    pipes = list()
+    for _ in range(3):
+        p = Pipeline()
+        for _ in range(2):
+            s = Stage()
+            t = Task()
+            t.executable = '/bin/date'
+            s.add_tasks(t)
+            p.add_stages(s)
+        pipes.append(p)
+
+    rmq_conn_params = pika.ConnectionParameters(host=hostname, port=port)
+
+    wfp = WFprocessor(sid='test',
+                      workflow=pipes,
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      rmq_conn_params=rmq_conn_params,
+                      resubmit_failed=False)
+
+    wfp.initialize_workflow()
+    assert list(wfp._ready) == pipes
+
+    workload, stages = wfp._create_workload()
+    assert len(workload) == 3
+    assert len(stages)   == 3
+    assert not wfp._ready
+
+    # nothing changed, nothing to inspect
+    workload, stages = wfp._create_workload()
+    assert not workload
+    assert not stages
+
+    # completing the first stage of a pipeline puts it back into the frontier
+    p = pipes[1]
+    for task in p.stages[0].tasks:
+        task.exit_code = 0
+        wfp._update_dequeued_task(task)
+
+    assert list(wfp._ready) == [p]
+
+    workload, stages = wfp._create_workload()
+    assert workload == list(p.stages[1].tasks)
+    assert stages   == [p.stages[1]]
+
+    # suspended pipelines are dropped until they get resumed
+    p = pipes[2]
+    p.suspend()
+    wfp._mark_ready(p)
+    workload, _ = wfp._create_workload()
+    assert not workload
+    assert not wfp._ready
+
+    p.resume()
+    assert list(wfp._ready) == [p]
+
+
 # ------------------------------------------------------------------------------
 #
 def func_for_enqueue_test(p):
@@ -147,6 +406,54 @@ def test_wfp_enqueue():
         assert t.state == states.SCHEDULED
 
 
+# ------------------------------------------------------------------------------
+#
+def test_wfp_execute_workload_sharded():
+
+    p = Pipeline()
+    s = Stage()
+
+    for _ in range(7):
+        t = Task()
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+    p.add_stages(s)
+
+    rmq_conn_params = transport.LocalConnectionParameters()
+    pending_queue   = ['pendingq-1', 'pendingq-2', 'pendingq-3']
+
+    mq_channel = transport.connect(rmq_conn_params).channel()
+    for q in pending_queue:
+        mq_channel.queue_declare(queue=q)
+
+    wfp = WFprocessor(sid='rp.session.local.0000',
+                      workflow=[p],
+                      pending_queue=pending_queue,
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=rmq_conn_params,
+                      resubmit_failed=False)
+
+    wfp.initialize_workflow()
+
+    workload, scheduled_stages = wfp._create_workload()
+    wfp._execute_workload(workload, scheduled_stages)
+
+    # the workload is spread evenly over all pending queues
+    uids = list()
+    for q, size in zip(pending_queue, [3, 3, 1]):
+
+        _, _, body = mq_channel.basic_get(queue=q)
+        shard = json.loads(body)
+
+        assert len(shard) == size
+        uids += [t['uid'] for t in shard]
+
+    assert sorted(uids) == sorted([t.uid for t in s.tasks])
+
+    for t in s.tasks:
+        assert t.state == states.SCHEDULED
+
+
 # ------------------------------------------------------------------------------
 #
 def func_for_dequeue_test(p):
@@ -363,3 +670,192 @@ def test_wfp_check_processor():
 
 # ------------------------------------------------------------------------------
 
+#
+def test_wfp_lazy_init():
+
+    p = Pipeline()
+    for _ in range(3):
+        s = Stage()
+        for _ in range(2):
+            t = Task()
+            t.executable = '/bin/date'
+            s.add_tasks(t)
+        p.add_stages(s)
+
+    # the last stage is invalid, which is only detected once it runs
+    p.stages[2].add_tasks(Task())
+
+    wfp = WFprocessor(sid='rp.session.local.0000',
+                      workflow=[p],
+                      pending_queue=['pendingq-1'],
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=transport.LocalConnectionParameters(),
+                      resubmit_failed=False,
+                      lazy_init=True)
+
+    wfp.initialize_workflow()
+
+    assert p.uid
+    assert not [s for s in p.stages if s.uid]
+
+    # stages get initialized once they become current
+    workload, scheduled_stages = wfp._create_workload()
+
+    assert scheduled_stages == [p.stages[0]]
+    assert sorted([t.uid for t in workload]) == \
+           sorted([t.uid for t in p.stages[0].tasks])
+    assert wfp._lookup(p.stages[0].uid) == (p, p.stages[0], None)
+    assert not p.stages[1].uid
+
+    for t in p.stages[0].tasks:
+        assert t.parent_stage['uid']    == p.stages[0].uid
+        assert t.parent_pipeline['uid'] == p.uid
+        t.state = states.DONE
+
+    for _ in range(2):
+
+        wfp._advance(p.stages[p.current_stage - 1], 'Stage', states.DONE)
+        p._increment_stage()
+        wfp._mark_ready(p)
+
+        workload, _ = wfp._create_workload()
+
+    # the invalid stage fails the pipeline
+    assert not workload
+    assert p.stages[2].uid
+    assert p.stages[2].state == states.FAILED
+    assert p.state           == states.FAILED
+    assert p.completed
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_wait_workflow():
+
+    pipes = list()
+    for _ in range(2):
+        p = Pipeline()
+        s = Stage()
+        t = Task()
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+        p.add_stages(s)
+        pipes.append(p)
+
+    wfp = WFprocessor(sid='rp.session.local.0000',
+                      workflow=pipes,
+                      pending_queue=['pendingq-1'],
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=transport.LocalConnectionParameters(),
+                      resubmit_failed=False)
+
+    wfp.initialize_workflow()
+
+    assert wfp.workflow_incomplete()
+    assert wfp.wait_workflow(timeout=0.1)
+
+    # completing pipelines wakes up waiters
+    def complete():
+        for p in pipes:
+            with p.lock:
+                p._increment_stage()
+                p._increment_stage()
+
+    th = mt.Timer(0.1, complete)
+    th.start()
+
+    assert not wfp.wait_workflow(timeout=10)
+    assert not wfp.workflow_incomplete()
+    assert not wfp._incomplete
+
+    th.join()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_publish_completed():
+
+    pipes = list()
+    for name in ['p0', 'p1', 'p1']:
+        p = Pipeline()
+        p.name = name
+        s = Stage()
+        t = Task()
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+        p.add_stages(s)
+        pipes.append(p)
+
+    params = transport.LocalConnectionParameters()
+    chan   = transport.connect(params).channel()
+    chan.queue_declare(queue='pendingq-1')
+
+    wfp = WFprocessor(sid='rp.session.local.0000',
+                      workflow=pipes,
+                      pending_queue=['pendingq-1'],
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=params,
+                      resubmit_failed=False)
+    wfp.initialize_workflow()
+
+    def complete(pipe):
+        with pipe.lock:
+            pipe._increment_stage()
+            pipe._increment_stage()
+
+    def published():
+        _, _, body = chan.basic_get(queue='pendingq-1')
+        return serializer.loads(body) if body else None
+
+    # nothing completed yet
+    wfp._publish_completed()
+    assert published() is None
+
+    # 'p1' is held back while another pipeline of that name is incomplete
+    complete(pipes[0])
+    complete(pipes[1])
+    wfp._publish_completed()
+    assert published() == {'completed': ['p0']}
+
+    complete(pipes[2])
+    wfp._publish_completed()
+    assert published() == {'completed': ['p1']}
+
+    wfp._publish_completed()
+    assert published() is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_report_progress():
+
+    p = Pipeline()
+    s = Stage()
+    for _ in range(4):
+        t = Task()
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+    p.add_stages(s)
+
+    wfp = WFprocessor(sid='rp.session.local.0000',
+                      workflow=[p],
+                      pending_queue=['pendingq-1'],
+                      completed_queue=['completedq-1'],
+                      rmq_conn_params=transport.LocalConnectionParameters(),
+                      resubmit_failed=False,
+                      report_mode='progress')
+
+    wfp.initialize_workflow()
+
+    # transitions are buffered for the reporter thread
+    workload, _ = wfp._create_workload()
+
+    assert len(workload)        == 4
+    assert len(wfp._report_buf) == 6
+    assert [e[2] for e in wfp._report_buf] == [states.SCHEDULING] * 6
+
+    wfp._flush_reports()
+    assert not wfp._report_buf
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import pytest
+
+from radical.entk        import Task, states
+from radical.entk.utils  import StateHistory
+
+
+# ------------------------------------------------------------------------------
+#
+def test_state_history():
+
+    hist = StateHistory([states.INITIAL])
+    hist.append(states.SCHEDULING, ts=1.0)
+    hist.append(states.DONE,       ts=2.0)
+
+    assert len(hist)     == 3
+    assert hist          == [states.INITIAL, states.SCHEDULING, states.DONE]
+    assert hist[-1]      == states.DONE
+    assert hist[1:]      == [states.SCHEDULING, states.DONE]
+    assert hist.items()[1:] == [(states.SCHEDULING, 1.0), (states.DONE, 2.0)]
+    assert hist          == StateHistory(hist.to_list())
+
+
+# ------------------------------------------------------------------------------
+#
+def test_state_history_limit():
+
+    hist = StateHistory([states.INITIAL, states.SCHEDULING,
+                         states.SCHEDULED, states.SUBMITTING], limit=3)
+
+    # the initial state is retained
+    assert hist == [states.INITIAL, states.SCHEDULED, states.SUBMITTING]
+
+    t = Task()
+    t.state = states.SCHEDULING
+    t._state_history.limit = 3
+    for _ in range(5):
+        t.state = states.FAILED
+        t.state = states.INITIAL
+
+    assert t.state_history == [states.INITIAL, states.FAILED, states.INITIAL]
+
+    # the limit is kept when the history is replaced, and is not shared with
+    # other histories
+    t.state_history = [states.INITIAL, states.SCHEDULING, states.SCHEDULED,
+                       states.SUBMITTING]
+    assert t.state_history == [states.INITIAL, states.SCHEDULED,
+                               states.SUBMITTING]
+    assert StateHistory([states.INITIAL] * 5).limit is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_state_history_view():
+
+    t    = Task()
+    view = t.state_history
+
+    assert view == [states.INITIAL]
+    assert not hasattr(view, 'append')
+
+    # the view is live, also when the history is replaced
+    t.state = states.SCHEDULING
+    assert view     == [states.INITIAL, states.SCHEDULING]
+    assert view[-1] == states.SCHEDULING
+    assert len(view) == 2
+
+    t.state_history = [states.INITIAL, states.FAILED]
+    assert view == [states.INITIAL, states.FAILED]
+
+    # copies are not
+    states_list = view.to_list()
+    t.state = states.INITIAL
+    assert states_list == [states.INITIAL, states.FAILED]
+
+    t2 = Task()
+    t2.state_history = view
+    assert t2.state_history == view
+
+    # neither histories nor views are hashable
+    with pytest.raises(TypeError):
+        hash(view)
+
+    with pytest.raises(TypeError):
+        hash(StateHistory([states.INITIAL]))
+
+
+# ------------------------------------------------------------------------------
+#
+def test_state_history_to_dict():
+
+    t = Task()
+    t.state = states.SCHEDULING
+
+    assert t.to_dict()['state_history'] == [states.INITIAL, states.SCHEDULING]
+    assert 'state_history' not in t.to_dict(history=False)
+
+    t2 = Task()
+    t2.from_dict(t.to_dict())
+    assert t2.state_history == [states.INITIAL, states.SCHEDULING]
+
+    # without history, the history of the receiving task is kept
+    t2.from_dict(t.to_dict(history=False), validate=False)
+    assert t2.state_history == [states.INITIAL, states.SCHEDULING]
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import pytest
+
+import radical.utils as ru
+
+from radical.entk       import Task, Stage
+from radical.entk.utils import generate_id, generate_ids
+
+
+# ------------------------------------------------------------------------------
+#
+def test_generate_ids():
+
+    sid = ru.generate_id('test.ids', ru.ID_UNIQUE)
+    tpl = 'task.%(item_counter)04d'
+
+    assert generate_ids(tpl, 3, ns=sid) == ['task.0000', 'task.0001',
+                                            'task.0002']
+    assert generate_ids(tpl, 0, ns=sid) == list()
+
+    # block and single allocations share the counter of the namespace
+    assert generate_id(tpl, ns=sid) == 'task.0003'
+    assert generate_ids(tpl, 2, ns=sid) == ['task.0004', 'task.0005']
+
+    # templates are counted independently
+    assert generate_ids('stage.%(item_counter)04d', 1, ns=sid) == ['stage.0000']
+
+    with pytest.raises(ValueError):
+        generate_ids('task.%(counter)04d', 1, ns=sid)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_assign_uids():
+
+    sid = ru.generate_id('test.ids', ru.ID_UNIQUE)
+
+    # entities which get their uids in blocks (by their parents) or one at
+    # a time (as the WFprocessor does at runtime) never share a uid
+    stage = Stage()
+    for _ in range(3):
+        task = Task()
+        task.executable = '/bin/date'
+        stage.add_tasks(task)
+
+    stage._assign_uid(sid)
+
+    task = Task()
+    task._assign_uid(sid)
+
+    uids = [t.uid for t in stage.tasks] + [task.uid]
+    assert sorted(uids) == ['task.0000', 'task.0001', 'task.0002', 'task.0003']
+
+    stage = Stage()
+    stage._assign_uid(sid)
+    assert stage.uid == 'stage.0001'
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import os
+import pika
+
+import threading as mt
+
+from radical.entk.utils import get_channel, invalidate
+from radical.entk.utils import close_connection, get_counters
+
+hostname =     os.environ.get('RMQ_HOSTNAME', 'localhost')
+port     = int(os.environ.get('RMQ_PORT', 5672))
+
+
+# ------------------------------------------------------------------------------
+#
+def test_get_channel():
+
+    params = pika.ConnectionParameters(host=hostname, port=port)
+    before = get_counters()
+
+    chan_1 = get_channel(params)
+    chan_2 = get_channel(params)
+
+    # the same thread reuses its connection
+    assert chan_1 is chan_2
+    assert chan_1.is_open
+
+    after = get_counters()
+    assert after['open']  == before['open']  + 1
+    assert after['reuse'] == before['reuse'] + 1
+
+    # another thread gets its own connection
+    chans = list()
+    thread = mt.Thread(target=lambda: chans.append(get_channel(params)))
+    thread.start()
+    thread.join()
+
+    assert chans[0] is not chan_1
+
+    chans[0].connection.close()
+    close_connection(params)
+
+    assert not chan_1.is_open
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reconnect():
+
+    params = pika.ConnectionParameters(host=hostname, port=port)
+
+    chan_1 = get_channel(params)
+    before = get_counters()
+
+    # a connection which went away is replaced transparently
+    chan_1.connection.close()
+    chan_2 = get_channel(params)
+
+    assert chan_2 is not chan_1
+    assert chan_2.is_open
+    assert get_counters()['reconnect'] == before['reconnect'] + 1
+
+    # an invalidated connection is replaced as well
+    invalidate(params)
+    chan_3 = get_channel(params)
+
+    assert chan_3 is not chan_2
+    assert not chan_2.is_open
+
+    close_connection(params)
+
+
+# ------------------------------------------------------------------------------
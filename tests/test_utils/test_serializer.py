@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+import json
+import pytest
+
+from radical.entk            import Task
+from radical.entk.utils      import serializer
+from radical.entk.exceptions import EnTKError
+
+
+# ------------------------------------------------------------------------------
+#
+def test_serializer_json():
+
+    obj = {'type'   : 'Task',
+           'objects': [Task().to_dict(), Task()._to_delta()]}
+
+    data = serializer.dumps(obj)
+
+    assert json.loads(data) == obj
+    assert serializer.loads(data)          == obj
+    assert serializer.loads(data.encode()) == obj
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.skipif(not serializer.msgpack, reason='msgpack not installed')
+def test_serializer_msgpack():
+
+    obj  = {'type'   : 'Task',
+            'objects': [Task().to_dict(), Task()._to_delta()]}
+    data = serializer.dumps(obj, 'msgpack')
+
+    assert isinstance(data, bytes)
+    assert len(data) < len(serializer.dumps(obj))
+    assert serializer.loads(data) == obj
+
+    # lists (workloads) are detected as well
+    assert serializer.loads(serializer.dumps([obj], 'msgpack')) == [obj]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_serializer_msgpack_missing():
+
+    msgpack = serializer.msgpack
+    data    = serializer.dumps({'uid': 'task.0000'}, 'msgpack')
+
+    try:
+        serializer.msgpack = None
+
+        # fall back to json when encoding, fail when decoding msgpack
+        assert serializer.dumps({'uid': 'task.0000'}, 'msgpack') == \
+               serializer.dumps({'uid': 'task.0000'}, 'json')
+
+        if msgpack:
+            with pytest.raises(EnTKError):
+                serializer.loads(data)
+
+    finally:
+        serializer.msgpack = msgpack
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import json
+import pickle
+import pytest
+
+from radical.entk               import Task
+from radical.entk               import exceptions as ree
+from radical.entk.utils         import StagingDirective
+from radical.entk.utils.staging import parse
+
+
+# ------------------------------------------------------------------------------
+#
+def test_staging_directive():
+
+    sd = StagingDirective('in.dat > data/in.dat')
+    assert sd        == 'in.dat > data/in.dat'
+    assert sd.source == 'in.dat'
+    assert sd.target == 'data/in.dat'
+    assert sd.serialize() == ['in.dat', 'data/in.dat']
+
+    sd = StagingDirective(' in.dat')
+    assert sd.source == 'in.dat'
+    assert sd.target is None
+    assert sd.serialize() == 'in.dat'
+
+    # directives are created from their serialized form without being split
+    sd = StagingDirective(['in.dat', 'data/in.dat'])
+    assert sd        == 'in.dat > data/in.dat'
+    assert sd.target == 'data/in.dat'
+    assert StagingDirective(sd) is sd
+
+    sd = pickle.loads(pickle.dumps(sd))
+    assert sd.source == 'in.dat'
+    assert sd.target == 'data/in.dat'
+
+    for value in [1, None, ['in.dat']]:
+        with pytest.raises(ree.TypeError):
+            StagingDirective(value)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_task_staging_directives():
+
+    t = Task()
+    t.copy_input_data  = ['in.dat > data/in.dat', 'conf']
+    t.copy_output_data = [['out.dat', '$SHARED/out.dat']]
+    t.link_input_data.append('raw > raw.dat')
+
+    assert t.copy_input_data  == ['in.dat > data/in.dat', 'conf']
+    assert t.copy_output_data == ['out.dat > $SHARED/out.dat']
+    assert t.copy_input_data[0].target == 'data/in.dat'
+
+    d = t.to_dict()
+    assert d['copy_input_data']  == [['in.dat', 'data/in.dat'], 'conf']
+    assert d['copy_output_data'] == [['out.dat', '$SHARED/out.dat']]
+    assert d['link_input_data']  == [['raw', 'raw.dat']]
+
+    t2 = Task()
+    t2.from_dict(json.loads(json.dumps(d)))
+    assert t2.copy_input_data  == t.copy_input_data
+    assert t2.link_input_data  == t.link_input_data
+    assert t2.copy_output_data[0].source == 'out.dat'
+    assert t2.to_dict()['link_input_data'] == [['raw', 'raw.dat']]
+
+    # tasks received by task managers keep the serialized form, which is not
+    # split again
+    t3 = Task()
+    t3.from_dict(json.loads(json.dumps(d)), validate=False)
+    assert t3.copy_input_data == [['in.dat', 'data/in.dat'], 'conf']
+    assert t3.to_dict()['copy_input_data'] == d['copy_input_data']
+    assert [parse(sd) for sd in t3.copy_input_data] == \
+           [parse(sd) for sd in t.copy_input_data]  == \
+           [('in.dat', 'data/in.dat'), ('conf', None)]
+
+    with pytest.raises(ree.TypeError):
+        t.copy_input_data = ['in.dat', 1]
+
+
+# ------------------------------------------------------------------------------
+